@@ -0,0 +1,114 @@
+"""bus_locations: daily RANGE partitions on timestamp
+
+Revision ID: r2s3t4u5v6w7
+Revises: q1r2s3t4u5v6
+Create Date: 2026-04-20 00:00:00.000000
+
+The plain table is renamed to bus_locations_legacy, a partitioned
+bus_locations is created with the same columns (PK becomes (id, timestamp),
+as the partition key must be part of it), and rows inside the retention
+window are copied over. Older rows would be removed by the next cleanup run
+anyway, so they are dropped together with the legacy table.
+
+Runtime maintenance (future partitions, partition-drop retention) lives in
+app/tasks/bus_location_partitions.py.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "r2s3t4u5v6w7"
+down_revision: Union[str, None] = "q1r2s3t4u5v6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+RETENTION_DAYS = 7  # app.tasks.cleanup_bus_locations.RETENTION_DAYS
+PREMAKE_DAYS = 3
+
+
+def _create_daily_partition(day) -> None:
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS bus_locations_p{day:%Y%m%d} PARTITION OF bus_locations "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE bus_locations RENAME TO bus_locations_legacy")
+    op.execute("ALTER TABLE bus_locations_legacy RENAME CONSTRAINT bus_locations_pkey TO bus_locations_legacy_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_bus_locations_bus_id_timestamp")
+    op.execute("DROP INDEX IF EXISTS ix_bus_locations_timestamp")
+
+    op.execute(
+        """
+        CREATE TABLE bus_locations (
+            id VARCHAR NOT NULL,
+            bus_id VARCHAR NOT NULL REFERENCES buses (id) ON DELETE CASCADE,
+            latitude NUMERIC(10, 8) NOT NULL,
+            longitude NUMERIC(11, 8) NOT NULL,
+            speed NUMERIC,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT bus_locations_pkey PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """
+    )
+    # Partitioned indexes: every partition gets its own copy automatically.
+    op.execute("CREATE INDEX ix_bus_locations_bus_id_timestamp ON bus_locations (bus_id, timestamp DESC)")
+    op.execute("CREATE INDEX ix_bus_locations_timestamp ON bus_locations (timestamp)")
+
+    op.execute("CREATE TABLE bus_locations_default PARTITION OF bus_locations DEFAULT")
+    today = datetime.now(timezone.utc).date()
+    for offset in range(-RETENTION_DAYS, PREMAKE_DAYS + 1):
+        _create_daily_partition(today + timedelta(days=offset))
+
+    op.execute(
+        f"""
+        INSERT INTO bus_locations (id, bus_id, latitude, longitude, speed, timestamp)
+        SELECT id, bus_id, latitude, longitude, speed, timestamp
+        FROM bus_locations_legacy
+        WHERE timestamp >= (now() AT TIME ZONE 'UTC')::date - INTERVAL '{RETENTION_DAYS} days'
+        """
+    )
+    op.execute("DROP TABLE bus_locations_legacy")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE bus_locations RENAME TO bus_locations_partitioned")
+    op.execute("ALTER TABLE bus_locations_partitioned RENAME CONSTRAINT bus_locations_pkey TO bus_locations_partitioned_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_bus_locations_bus_id_timestamp")
+    op.execute("DROP INDEX IF EXISTS ix_bus_locations_timestamp")
+
+    op.execute(
+        """
+        CREATE TABLE bus_locations (
+            id VARCHAR NOT NULL,
+            bus_id VARCHAR NOT NULL REFERENCES buses (id) ON DELETE CASCADE,
+            latitude NUMERIC(10, 8) NOT NULL,
+            longitude NUMERIC(11, 8) NOT NULL,
+            speed NUMERIC,
+            timestamp TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT bus_locations_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO bus_locations (id, bus_id, latitude, longitude, speed, timestamp)
+        SELECT id, bus_id, latitude, longitude, speed, timestamp
+        FROM bus_locations_partitioned
+        ON CONFLICT (id) DO NOTHING
+        """
+    )
+    op.execute("DROP TABLE bus_locations_partitioned CASCADE")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_bus_locations_bus_id_timestamp "
+        "ON bus_locations (bus_id, timestamp DESC)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_bus_locations_timestamp "
+        "ON bus_locations (timestamp)"
+    )
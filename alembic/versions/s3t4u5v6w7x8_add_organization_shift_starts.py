@@ -0,0 +1,26 @@
+"""organizations: morning/afternoon shift start times for route pre-computation
+
+Revision ID: s3t4u5v6w7x8
+Revises: r2s3t4u5v6w7
+Create Date: 2026-04-24 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = 's3t4u5v6w7x8'
+down_revision: Union[str, None] = 'r2s3t4u5v6w7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("organizations", sa.Column("morning_shift_start", sa.Time(), nullable=True))
+    op.add_column("organizations", sa.Column("afternoon_shift_start", sa.Time(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("organizations", "afternoon_shift_start")
+    op.drop_column("organizations", "morning_shift_start")
@@ -0,0 +1,28 @@
+"""maintenance_watermarks: durable progress of resumable maintenance jobs
+
+Revision ID: t4u5v6w7x8y9
+Revises: s3t4u5v6w7x8
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = 't4u5v6w7x8y9'
+down_revision: Union[str, None] = 's3t4u5v6w7x8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "maintenance_watermarks",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("value", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("maintenance_watermarks")
@@ -0,0 +1,246 @@
+"""
+Bounded batching queue and append-only spill file.
+
+BoundedBatchQueue hands out batches when either max_batch_size items are
+buffered or the oldest buffered item is max_latency_ms old, whichever comes
+first. Above high_water_mark producers are either blocked (backpressure) or
+their items are dropped and counted.
+
+SpillFile keeps batches that could not be written (e.g. during a DB outage)
+as JSON lines on local disk so they can be replayed later.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Iterator
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = {"block", "drop"}
+
+
+class BoundedBatchQueue:
+    def __init__(
+        self,
+        *,
+        name: str,
+        max_batch_size: int,
+        max_latency_ms: int,
+        high_water_mark: int,
+        overflow_policy: str = "drop",
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {sorted(OVERFLOW_POLICIES)}")
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.high_water_mark = high_water_mark
+        self.overflow_policy = overflow_policy
+        # (enqueued_at, item) pairs; enqueued_at drives the time trigger.
+        self._items: deque[tuple[float, Any]] = deque()
+        self._not_empty = asyncio.Event()
+        self._batch_ready = asyncio.Event()
+        self._has_space = asyncio.Event()
+        self._has_space.set()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def _append(self, item: Any) -> None:
+        self._items.append((time.monotonic(), item))
+        self._not_empty.set()
+        if len(self._items) >= self.max_batch_size:
+            self._batch_ready.set()
+        if len(self._items) >= self.high_water_mark:
+            self._has_space.clear()
+        metrics.set_gauge(f"{self.name}_depth", len(self._items))
+
+    def put_nowait(self, item: Any) -> bool:
+        """Enqueue without waiting. Drops (and counts) the item above the high-water mark."""
+        if len(self._items) >= self.high_water_mark:
+            metrics.inc(f"{self.name}_dropped_total")
+            return False
+        self._append(item)
+        return True
+
+    async def put(self, item: Any) -> bool:
+        """Enqueue, applying the overflow policy. Returns False if the item was dropped."""
+        if len(self._items) >= self.high_water_mark:
+            if self.overflow_policy == "drop":
+                metrics.inc(f"{self.name}_dropped_total")
+                return False
+            metrics.inc(f"{self.name}_blocked_total")
+            while len(self._items) >= self.high_water_mark:
+                self._has_space.clear()
+                await self._has_space.wait()
+        self._append(item)
+        return True
+
+    async def get_batch(self, timeout: float | None = None) -> list:
+        """
+        Wait for the next batch (size or age trigger). Returns [] if nothing
+        arrived within `timeout` seconds.
+        """
+        if not self._items:
+            self._not_empty.clear()
+            try:
+                await asyncio.wait_for(self._not_empty.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return []
+
+        remaining = self._items[0][0] + self.max_latency - time.monotonic()
+        if len(self._items) < self.max_batch_size and remaining > 0:
+            self._batch_ready.clear()
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        count = min(len(self._items), self.max_batch_size)
+        batch = [self._items.popleft()[1] for _ in range(count)]
+        if len(self._items) < self.high_water_mark:
+            self._has_space.set()
+        if len(self._items) < self.max_batch_size:
+            self._batch_ready.clear()
+        metrics.set_gauge(f"{self.name}_depth", len(self._items))
+        return batch
+
+    def drain_nowait(self) -> list:
+        """Take everything currently buffered (used on shutdown)."""
+        batch = [item for _, item in self._items]
+        self._items.clear()
+        self._has_space.set()
+        metrics.set_gauge(f"{self.name}_depth", 0)
+        return batch
+
+
+class SpillFile:
+    """
+    Append-only JSON-lines file for batches that could not be persisted.
+
+    Appends go to `path`. A replay first renames the file to
+    `path.replay.<pid>.<n>` so concurrent workers never replay the same lines,
+    and picks up replay files orphaned by dead processes.
+    """
+
+    def __init__(self, path: str, *, name: str, max_bytes: int):
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes
+        self._replay_seq = 0
+
+    def _replay_paths(self) -> list[str]:
+        return glob.glob(f"{glob.escape(self.path)}.replay.*")
+
+    def size_bytes(self) -> int:
+        total = 0
+        for candidate in [self.path, *self._replay_paths()]:
+            try:
+                total += os.path.getsize(candidate)
+            except OSError:
+                continue
+        return total
+
+    def _update_gauge(self) -> None:
+        metrics.set_gauge(f"{self.name}_bytes", self.size_bytes())
+
+    def append(self, records: list[dict]) -> int:
+        """Append records as JSON lines. Returns how many were written (0 when over max_bytes)."""
+        if not records:
+            return 0
+        if self.size_bytes() >= self.max_bytes:
+            metrics.inc(f"{self.name}_dropped_total", len(records))
+            logger.error(f"Spill file {self.path} is full ({self.max_bytes} bytes); dropped {len(records)} record(s)")
+            return 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        payload = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        # O_APPEND keeps concurrent appends from interleaving within a write.
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(payload)
+        metrics.inc(f"{self.name}_records_total", len(records))
+        self._update_gauge()
+        return len(records)
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _next_replay_path(self) -> str:
+        self._replay_seq += 1
+        return f"{self.path}.replay.{os.getpid()}.{self._replay_seq}"
+
+    def claim(self) -> list[str]:
+        """Take ownership of pending spill data; returns the files to replay."""
+        pid = os.getpid()
+        claimed = []
+        for replay_path in sorted(self._replay_paths()):
+            owner = replay_path[len(f"{self.path}.replay."):].split(".")[0]
+            if not owner.isdigit():
+                continue
+            if int(owner) == pid:
+                claimed.append(replay_path)
+            elif not self._pid_alive(int(owner)):
+                target = self._next_replay_path()
+                try:
+                    os.replace(replay_path, target)
+                    claimed.append(target)
+                except OSError:
+                    logger.warning(f"Could not claim orphaned spill file {replay_path}")
+        if os.path.exists(self.path):
+            target = self._next_replay_path()
+            try:
+                os.replace(self.path, target)
+                claimed.append(target)
+            except FileNotFoundError:
+                pass
+        return claimed
+
+    def retain(self, path: str, records: list[dict]) -> None:
+        """Replace a partially replayed file with the records that are still unwritten."""
+        target = self._next_replay_path()
+        with open(target, "w", encoding="utf-8") as fh:
+            fh.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        self.release(path)
+
+    @staticmethod
+    def read_chunks(path: str, chunk_size: int) -> Iterator[list[dict]]:
+        chunk: list[dict] = []
+        with open(path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    chunk.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt spill line in {path}")
+                    continue
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def release(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self._update_gauge()
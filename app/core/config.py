@@ -31,9 +31,116 @@ class Settings(BaseSettings):
     # Redis
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
-    
+
+    # Location ingest
+    # queue: süreç içi asyncio.Queue (tek worker), stream: Redis Streams + consumer group
+    LOCATION_INGEST_MODE: str = "queue"
+    LOCATION_STREAM_KEY: str = "stream:bus_locations"
+    LOCATION_STREAM_GROUP: str = "bus_location_writers"
+    # Approximate cap (XADD MAXLEN ~), ~200 B per entry: 250k ≈ 50 MB. Needs a non-evicting
+    # Redis (noeviction / volatile-*) with AOF; see app/tasks/location_writer.py
+    LOCATION_STREAM_MAXLEN: int = 250_000
+    LOCATION_STREAM_BATCH_SIZE: int = 500
+    LOCATION_STREAM_BLOCK_MS: int = 5000
+    LOCATION_STREAM_CLAIM_IDLE_MS: int = 60_000  # Reclaim entries left pending by dead consumers
+    LOCATION_STREAM_WRITER_ENABLED: bool = True  # Run the stream consumer inside the API lifespan
+    LOCATION_WRITE_METHOD: str = "copy"  # copy (asyncpg binary COPY) | insert (executemany) | orm
+    # In-process batch queue: flush at N items or T ms, whichever comes first
+    LOCATION_QUEUE_MAX_BATCH_SIZE: int = 1000
+    LOCATION_QUEUE_MAX_LATENCY_MS: int = 1000
+    LOCATION_QUEUE_HIGH_WATER_MARK: int = 50_000
+    LOCATION_QUEUE_OVERFLOW_POLICY: str = "drop"  # drop (count and discard) | block (backpressure)
+    # Batches that fail to write (DB outage) are spilled here and replayed later
+    LOCATION_SPILL_PATH: str = "/tmp/servis_takip/location_spill.jsonl"
+    LOCATION_SPILL_MAX_BYTES: int = 512 * 1024 * 1024
+    # Drop stationary / duplicate points before persistence; heartbeat keeps one per interval.
+    # State is per worker: only enable with one ingest worker or sticky per-bus routing.
+    LOCATION_SUPPRESS_ENABLED: bool = False
+    LOCATION_SUPPRESS_MIN_DISTANCE_METERS: float = 15.0
+    LOCATION_SUPPRESS_MIN_SPEED_DELTA_KMH: float = 5.0
+    LOCATION_HEARTBEAT_SECONDS: int = 60
+    # bus:{id}:latest hash; expires for buses that stop reporting (falls back to history)
+    LATEST_LOCATION_TTL_SECONDS: int = 7 * 24 * 60 * 60
+    # Live trail ring buffer per bus (memory + bus:{id}:trail). Capacity defaults to
+    # TRAIL_WINDOW_SECONDS / LOCATION_INTERVAL_MIN_SECONDS; faster fixes are downsampled
+    TRAIL_ENABLED: bool = True
+    TRAIL_WINDOW_SECONDS: int = 15 * 60
+    TRAIL_CAPACITY: Optional[int] = None
+    # Offline-sync batch upload (POST /driver/buses/me/locations/batch)
+    LOCATION_BATCH_MAX_POINTS: int = 5000
+    LOCATION_BATCH_MAX_AGE_HOURS: int = 48
+    LOCATION_BATCH_MAX_CLOCK_SKEW_SECONDS: int = 300
+    # Expired daily partitions of bus_locations: drop, or detach and keep the table
+    BUS_LOCATION_RETENTION_ACTION: str = "drop"
+    BUS_LOCATION_RETENTION_DAYS: int = 7
+    # Expired bus_locations / audit_logs rows are archived as Parquet here before deletion.
+    # Off by default: ARCHIVE_DIR must be a writable, persistent volume (see docker-compose.prod.yml);
+    # while archiving fails, retention keeps every expired row.
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "/var/lib/servis_takip/archive"
+    AUDIT_LOG_RETENTION_DAYS: Optional[int] = None  # None: audit_logs are never cleaned up
+    # Douglas-Peucker compaction of history older than the age (runs after cleanup). Irreversible:
+    # off by default; the effective age is never below LOCATION_BATCH_MAX_AGE_HOURS
+    BUS_LOCATION_COMPACTION_ENABLED: bool = False
+    BUS_LOCATION_COMPACTION_AGE_HOURS: int = 48
+    BUS_LOCATION_COMPACTION_TOLERANCE_METERS: float = 10.0
+
     # Google Maps
     GOOGLE_MAPS_API_KEY: Optional[str] = None
+
+    # Route optimization
+    # google: Directions API waypoint optimization, local optimizer as fallback
+    # local: always use the local 2-opt/Or-opt optimizer (no API cost)
+    ROUTE_OPTIMIZER_MODE: str = "google"
+    ROUTE_OPTIMIZER_TIME_BUDGET_MS: int = 200
+    # Visits derive the route from the stored plan unless it is this much longer than a fresh local order
+    ROUTE_REPLAN_TOLERANCE: float = 0.15
+    ROUTE_PLAN_TTL_SECONDS: int = 12 * 60 * 60
+    # Pre-compute to_school/from_school plans this many minutes before each shift
+    ROUTE_PRECOMPUTE_ENABLED: bool = True
+    ROUTE_PRECOMPUTE_LEAD_MINUTES: int = 30
+    ROUTE_PRECOMPUTE_CONCURRENCY: int = 4  # Parallel route computations (Maps API calls)
+    # Shift starts for organizations without their own (HH:MM, SHIFT_TIMEZONE)
+    DEFAULT_MORNING_SHIFT_START: str = "07:00"
+    DEFAULT_AFTERNOON_SHIFT_START: str = "15:30"
+    SHIFT_TIMEZONE: str = "Europe/Istanbul"
+
+    # Parent ETAs
+    # google: Distance Matrix per bus position (offline model when no API key)
+    # model: offline speed model from bus_locations history; Google only calibrates it
+    ETA_SOURCE: str = "google"
+    ETA_CALIBRATION_INTERVAL_SECONDS: int = 15 * 60  # Per bus, model mode only
+    ETA_STOP_DWELL_SECONDS: int = 45  # Added per intermediate stop on the planned order
+    ETA_MODEL_TRAIN_ENABLED: bool = True
+    ETA_MODEL_TRAIN_HOUR: int = 3  # Local hour (SHIFT_TIMEZONE) of the nightly retrain
+    ETA_MODEL_LOOKBACK_DAYS: int = 7
+    # Recompute and push ETAs to parent WebSockets on ingest, at most once per interval per bus
+    ETA_PUSH_ENABLED: bool = True
+    ETA_PUSH_INTERVAL_SECONDS: int = 15
+
+    # Geofence notifications (approach / arrival) from the location stream
+    GEOFENCE_ENABLED: bool = True
+    GEOFENCE_APPROACH_RADIUS_METERS: int = 1000
+    GEOFENCE_APPROACH_ETA_MINUTES: int = 5  # Approach also fires when the bus ETA drops to this
+    GEOFENCE_ARRIVAL_RADIUS_METERS: int = 100
+
+    # Dwell detection: stationary near a remaining stop marks it provisionally visited.
+    # Off until tuned against real stops; traffic lights near a home also dwell.
+    DWELL_DETECTION_ENABLED: bool = False
+    DWELL_RADIUS_METERS: int = 40
+    DWELL_SECONDS: int = 45
+    DWELL_MAX_SPEED_KMH: float = 5.0
+
+    # Adaptive driver reporting rate (control frames on /ws/driver/location)
+    LOCATION_RATE_CONTROL_ENABLED: bool = True
+    LOCATION_INTERVAL_MIN_SECONDS: int = 2  # Near a stop
+    LOCATION_INTERVAL_DEFAULT_SECONDS: int = 5  # Moving, watched
+    LOCATION_INTERVAL_UNWATCHED_SECONDS: int = 15  # Moving, nobody subscribed
+    LOCATION_INTERVAL_MAX_SECONDS: int = 30  # Parked
+    LOCATION_RATE_NEAR_STOP_METERS: int = 400
+    LOCATION_RATE_PARKED_SPEED_KMH: float = 3.0
+    LOCATION_RATE_EVAL_SECONDS: int = 10
+    LOCATION_RATE_LOAD_THRESHOLD: float = 0.5  # Ingest load above which intervals are doubled
     
     # Firebase Cloud Messaging
     FIREBASE_CREDENTIALS_PATH: Optional[str] = None  # Path to Firebase service account JSON
@@ -68,6 +175,58 @@ class Settings(BaseSettings):
             )
         return v
 
+    @field_validator("LOCATION_INGEST_MODE")
+    @classmethod
+    def validate_location_ingest_mode(cls, v: str) -> str:
+        if v not in {"queue", "stream"}:
+            raise ValueError("LOCATION_INGEST_MODE must be 'queue' or 'stream'")
+        return v
+
+    @field_validator("LOCATION_WRITE_METHOD")
+    @classmethod
+    def validate_location_write_method(cls, v: str) -> str:
+        if v not in {"copy", "insert", "orm"}:
+            raise ValueError("LOCATION_WRITE_METHOD must be 'copy', 'insert' or 'orm'")
+        return v
+
+    @field_validator("LOCATION_QUEUE_OVERFLOW_POLICY")
+    @classmethod
+    def validate_location_queue_overflow_policy(cls, v: str) -> str:
+        if v not in {"drop", "block"}:
+            raise ValueError("LOCATION_QUEUE_OVERFLOW_POLICY must be 'drop' or 'block'")
+        return v
+
+    @field_validator("ROUTE_OPTIMIZER_MODE")
+    @classmethod
+    def validate_route_optimizer_mode(cls, v: str) -> str:
+        if v not in {"google", "local"}:
+            raise ValueError("ROUTE_OPTIMIZER_MODE must be 'google' or 'local'")
+        return v
+
+    @field_validator("DEFAULT_MORNING_SHIFT_START", "DEFAULT_AFTERNOON_SHIFT_START")
+    @classmethod
+    def validate_shift_start(cls, v: str) -> str:
+        from datetime import time
+        try:
+            time.fromisoformat(v)
+        except ValueError:
+            raise ValueError("Shift start must be a HH:MM time")
+        return v
+
+    @field_validator("ETA_SOURCE")
+    @classmethod
+    def validate_eta_source(cls, v: str) -> str:
+        if v not in {"google", "model"}:
+            raise ValueError("ETA_SOURCE must be 'google' or 'model'")
+        return v
+
+    @field_validator("BUS_LOCATION_RETENTION_ACTION")
+    @classmethod
+    def validate_bus_location_retention_action(cls, v: str) -> str:
+        if v not in {"drop", "detach"}:
+            raise ValueError("BUS_LOCATION_RETENTION_ACTION must be 'drop' or 'detach'")
+        return v
+
     @field_validator("PASSWORD_RESET_TOKEN_EXPIRE_MINUTES")
     @classmethod
     def validate_password_reset_token_expire_minutes(cls, v: int) -> int:
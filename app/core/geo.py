@@ -0,0 +1,133 @@
+"""
+Vectorized geodesic helpers (haversine on a spherical Earth).
+
+All functions take (lat, lng) pairs in degrees and return meters. Batched
+variants evaluate a whole matrix / vector in one NumPy call, so callers should
+prefer them over looping the scalar haversine_meters in Python.
+"""
+import math
+from typing import Iterable, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+Point = Tuple[float, float]
+
+
+def _as_radians(points) -> np.ndarray:
+    arr = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return np.radians(arr)
+
+
+def haversine_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Single pair; cheaper than NumPy for one-off distances."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lng2 - lng1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_matrix(points_a: Sequence[Point], points_b: Sequence[Point] | None = None) -> np.ndarray:
+    """Distances between every point of points_a (rows) and points_b (columns; defaults to points_a)."""
+    a = _as_radians(points_a)
+    b = a if points_b is None else _as_radians(points_b)
+    lat_a, lng_a = a[:, 0:1], a[:, 1:2]
+    lat_b, lng_b = b[:, 0], b[:, 1]
+    h = (
+        np.sin((lat_b - lat_a) / 2) ** 2
+        + np.cos(lat_a) * np.cos(lat_b) * np.sin((lng_b - lng_a) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def haversine_one_to_many(point: Point, points: Sequence[Point]) -> np.ndarray:
+    """Distances from one point to each of `points`, as a 1-D array."""
+    if len(points) == 0:
+        return np.empty(0, dtype=np.float64)
+    return haversine_matrix([point], points)[0]
+
+
+def nearest_k(point: Point, points: Sequence[Point], k: int) -> np.ndarray:
+    """Indices of the k points closest to `point`, nearest first (equal distances by index)."""
+    distances = haversine_one_to_many(point, points)
+    k = min(k, distances.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < distances.size:
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(distances.size)
+    return candidates[np.lexsort((candidates, distances[candidates]))]
+
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 6) -> str:
+    """Standard base32 geohash; precision 6 is a ~1.2 km x 0.6 km cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # even bits refine longitude
+    while len(chars) < precision:
+        target, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if target >= mid:
+            bits = (bits << 1) | 1
+            bounds[0] = mid
+        else:
+            bits <<= 1
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def douglas_peucker(points: Sequence[Point], tolerance_m: float, keep: Iterable[int] = ()) -> np.ndarray:
+    """
+    Ascending indices of the points kept by Douglas-Peucker simplification:
+    every dropped point lies within tolerance_m of the simplified polyline.
+    Indices in `keep` (plus both ends) are always kept; the polyline is
+    simplified independently between them. Distances are planar on a local
+    equirectangular projection, accurate for city-scale tracks.
+    """
+    arr = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(arr)
+    if n <= 2:
+        return np.arange(n)
+    lat = np.radians(arr[:, 0])
+    y = lat * EARTH_RADIUS_M
+    x = np.radians(arr[:, 1]) * EARTH_RADIUS_M * math.cos(float(lat.mean()))
+
+    kept = np.zeros(n, dtype=bool)
+    anchors = sorted({0, n - 1, *(i for i in keep if 0 <= i < n)})
+    kept[anchors] = True
+    stack = list(zip(anchors[:-1], anchors[1:]))
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0.0:
+            distances = np.hypot(px, py)
+        else:
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            split = start + 1 + farthest
+            kept[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(kept)
@@ -0,0 +1,65 @@
+"""
+Lightweight in-process metrics.
+
+Counters, gauges and latency summaries are kept per worker process and exposed
+at GET /admin/metrics. There is no Prometheus dependency on purpose; the
+snapshot is plain JSON that can be scraped or inspected by hand.
+"""
+import os
+import threading
+from collections import defaultdict
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+        self._summaries: dict[str, dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample (e.g. latency in ms) into a count/sum/max/last summary."""
+        with self._lock:
+            summary = self._summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0, "last": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+            summary["last"] = value
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def gauge(self, name: str) -> float | None:
+        with self._lock:
+            return self._gauges.get(name)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            summaries = {
+                name: {**summary, "avg": (summary["sum"] / summary["count"]) if summary["count"] else 0.0}
+                for name, summary in self._summaries.items()
+            }
+            return {
+                "pid": os.getpid(),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": summaries,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+metrics = MetricsRegistry()
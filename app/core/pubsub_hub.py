@@ -0,0 +1,127 @@
+"""
+Shared Redis Pub/Sub hub for WebSocket fan-out.
+
+Each worker keeps a single Redis PubSub connection. The first local listener
+of a channel subscribes it, further listeners only get an in-process queue,
+and the channel is unsubscribed when the last listener leaves. Every Redis
+message is read once per worker and copied to all local listener queues.
+"""
+import asyncio
+import logging
+
+from .metrics import metrics
+from .redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+LISTENER_QUEUE_SIZE = 100
+READ_TIMEOUT_SECONDS = 1.0
+READ_ERROR_BACKOFF_SECONDS = 1.0
+
+
+class PubSubHub:
+    def __init__(self, queue_size: int = LISTENER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._pubsub = None
+        self._reader_task: asyncio.Task | None = None
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+        self._lock = asyncio.Lock()
+
+    def listener_count(self, channel: str) -> int:
+        return len(self._listeners.get(channel, ()))
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("pubsub_hub_channels", len(self._listeners))
+        metrics.set_gauge("pubsub_hub_listeners", sum(len(queues) for queues in self._listeners.values()))
+
+    async def subscribe(self, channel: str) -> asyncio.Queue:
+        """Register a local listener; returns the queue that receives the channel's messages."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        async with self._lock:
+            listeners = self._listeners.get(channel)
+            if listeners is None:
+                if self._pubsub is None:
+                    redis = await redis_manager.get_redis()
+                    self._pubsub = redis.pubsub()
+                await self._pubsub.subscribe(channel)
+                metrics.inc("pubsub_hub_redis_subscribes_total")
+                listeners = self._listeners[channel] = set()
+                logger.info(f"PubSub hub subscribed to {channel}")
+            listeners.add(queue)
+            if self._reader_task is None or self._reader_task.done():
+                self._reader_task = asyncio.create_task(self._read_loop())
+            self._update_gauges()
+        return queue
+
+    async def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        """Remove a local listener; the Redis subscription is dropped with the last one."""
+        async with self._lock:
+            listeners = self._listeners.get(channel)
+            if listeners is None:
+                return
+            listeners.discard(queue)
+            if not listeners:
+                del self._listeners[channel]
+                try:
+                    await self._pubsub.unsubscribe(channel)
+                    logger.info(f"PubSub hub unsubscribed from {channel}")
+                except Exception as e:
+                    logger.error(f"PubSub hub failed to unsubscribe from {channel}: {e}")
+            self._update_gauges()
+
+    def _dispatch(self, channel: str, data) -> None:
+        listeners = self._listeners.get(channel)
+        if not listeners:
+            return
+        metrics.inc("pubsub_hub_messages_received_total")
+        for queue in listeners:
+            if queue.full():
+                # Slow consumer: drop its oldest frame rather than stall everyone else.
+                try:
+                    queue.get_nowait()
+                    metrics.inc("pubsub_hub_messages_dropped_total")
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(data)
+        metrics.inc("pubsub_hub_messages_delivered_total", len(listeners))
+
+    async def _read_loop(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=READ_TIMEOUT_SECONDS,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # redis-py reconnects and re-subscribes on the next read.
+                logger.error(f"PubSub hub read failed: {e}")
+                await asyncio.sleep(READ_ERROR_BACKOFF_SECONDS)
+                continue
+            if message is None:
+                if not self._listeners:
+                    await asyncio.sleep(READ_TIMEOUT_SECONDS)
+                continue
+            if message.get("type") == "message":
+                self._dispatch(message["channel"], message["data"])
+
+    async def close(self) -> None:
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception as e:
+                logger.error(f"PubSub hub close failed: {e}")
+            self._pubsub = None
+        self._listeners.clear()
+        self._update_gauges()
+
+
+pubsub_hub = PubSubHub()
@@ -1,6 +1,6 @@
 import redis.asyncio as redis
 from .config import settings
-from typing import Optional, Any
+from typing import Optional, Any, Dict
 import logging
 
 logger = logging.getLogger(__name__)
@@ -46,6 +46,63 @@ class RedisManager:
             await self.connect()
         return await self.redis.delete(key)
     
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"tag:{tag}"
+
+    async def set_tagged(self, key: str, value: Any, tags: list[str], ex: Optional[int] = None) -> bool:
+        """
+        Set value and register the key in each tag's index set, atomically.
+        Tag sets keep the longest TTL of their members (EXPIRE NX + GT, Redis 7),
+        so they never expire before a key they index. They can still be evicted
+        under memory pressure; invalidate_tag's fallback_patterns cover that.
+        """
+        if not self.redis:
+            await self.connect()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, value, ex=ex)
+            for tag in tags:
+                tag_key = self._tag_key(tag)
+                pipe.sadd(tag_key, key)
+                if ex is not None:
+                    pipe.expire(tag_key, ex, nx=True)
+                    pipe.expire(tag_key, ex, gt=True)
+            results = await pipe.execute()
+        return bool(results[0])
+
+    async def invalidate_tag(self, *tags: str, fallback_patterns: Optional[Dict[str, str]] = None) -> int:
+        """
+        Delete every key registered under the given tags: SMEMBERS + pipelined UNLINK.
+
+        A tag whose set is missing (evicted, or its keys were cached before
+        they were tagged) cannot be trusted to be empty; if fallback_patterns
+        maps it to a key pattern, those keys are deleted by SCAN instead.
+        """
+        if not self.redis:
+            await self.connect()
+        # Read and drop the index in one MULTI so concurrent set_tagged calls land in a fresh set
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for tag in tags:
+                tag_key = self._tag_key(tag)
+                pipe.smembers(tag_key)
+                pipe.unlink(tag_key)
+            results = await pipe.execute()
+        keys = set()
+        scanned = 0
+        for tag, members in zip(tags, results[0::2]):
+            keys.update(members)
+            if not members and fallback_patterns and tag in fallback_patterns:
+                # Redis drops empty sets, so an empty result means the index is gone
+                scanned += await self.delete_pattern(fallback_patterns[tag])
+        if not keys:
+            return scanned
+        keys = sorted(keys)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for start in range(0, len(keys), 500):
+                pipe.unlink(*keys[start:start + 500])
+            unlinked = await pipe.execute()
+        return scanned + sum(unlinked)
+
     async def delete_pattern(self, pattern: str) -> int:
         """Delete all keys matching pattern using SCAN (non-blocking)"""
         if not self.redis:
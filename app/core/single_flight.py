@@ -0,0 +1,148 @@
+"""
+Single-flight request coalescing.
+
+On a cache miss every concurrent request for the same key would otherwise run
+the same expensive computation (Directions/Geocoding call, route optimization).
+SingleFlight lets exactly one of them do the work:
+
+- inside a worker, callers of the same key share one asyncio.Future;
+- across workers, the leader holds a short Redis lock (SET NX PX); the other
+  workers poll the result cache until the leader has written it.
+
+A follower that sees the lock vanish without a cached result (leader crashed or
+failed), or that waits longer than wait_timeout, computes the value itself, so
+coalescing never turns into an outage. Saved computations are counted in
+single_flight_coalesced_{local,remote}_total.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .metrics import metrics
+from .redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+# Release the lock only if it is still ours (it may have expired and been re-taken).
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        lock_ttl_ms: int = 10000,
+        wait_timeout: float = 10.0,
+        poll_interval: float = 0.05,
+    ):
+        self.lock_ttl_ms = lock_ttl_ms
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        return f"lock:{key}"
+
+    def inflight_count(self) -> int:
+        return len(self._inflight)
+
+    async def run(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        read_cached: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> Any:
+        """
+        Return compute()'s result, running it at most once per key at a time.
+
+        read_cached returns the value the leader stored (None while absent). It
+        is what remote followers wait on, so compute() must write the cache
+        before returning; without it only in-process coalescing applies.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            # asyncio.wait does not propagate the leader's cancellation to us.
+            await asyncio.wait({future})
+            if not future.cancelled():
+                metrics.inc("single_flight_coalesced_local_total")
+                return future.result()
+            return await self.run(key, compute, read_cached)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run_across_workers(key, compute, read_cached)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Followers re-raise it; mark it retrieved for the no-follower case.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _run_across_workers(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        read_cached: Optional[Callable[[], Awaitable[Any]]],
+    ) -> Any:
+        if read_cached is None:
+            return await self._lead(key, compute, token=None)
+
+        token = uuid.uuid4().hex
+        lock_key = self._lock_key(key)
+        try:
+            redis = await redis_manager.get_redis()
+            acquired = await redis.set(lock_key, token, nx=True, px=self.lock_ttl_ms)
+        except Exception as e:
+            logger.warning(f"Single-flight lock unavailable for {key}: {e}")
+            return await self._lead(key, compute, token=None)
+
+        if acquired:
+            return await self._lead(key, compute, token=token)
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                cached = await read_cached()
+                if cached is not None:
+                    metrics.inc("single_flight_coalesced_remote_total")
+                    return cached
+                if not await redis.exists(lock_key):
+                    # Leader finished without a result (error) or its lock expired.
+                    break
+            except Exception as e:
+                logger.warning(f"Single-flight wait failed for {key}: {e}")
+                break
+        metrics.inc("single_flight_fallback_total")
+        return await self._lead(key, compute, token=None)
+
+    async def _lead(self, key: str, compute: Callable[[], Awaitable[Any]], token: Optional[str]) -> Any:
+        metrics.inc("single_flight_leader_total")
+        try:
+            return await compute()
+        finally:
+            if token is not None:
+                try:
+                    redis = await redis_manager.get_redis()
+                    await redis.eval(_RELEASE_SCRIPT, 1, self._lock_key(key), token)
+                except Exception as e:
+                    logger.warning(f"Single-flight lock release failed for {key}: {e}")
+
+
+single_flight = SingleFlight()
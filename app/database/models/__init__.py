@@ -22,3 +22,4 @@ from .password_reset_token import PasswordResetToken
 from .email_verification_token import EmailVerificationToken
 from .trip_session import TripSession, TripType
 from .trip_student_state import TripStudentState
+from .maintenance_watermark import MaintenanceWatermark
@@ -13,12 +13,18 @@ if TYPE_CHECKING:
 
 class BusLocation(Base):
     __tablename__ = "bus_locations"
+    # Günlük RANGE partition (bkz. app/tasks/bus_location_partitions.py);
+    # partition anahtarı PK'nin parçası olmak zorunda.
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
+
     id: Mapped[str] = mapped_column(String, primary_key=True)
     bus_id: Mapped[str] = mapped_column(ForeignKey("buses.id", ondelete="CASCADE"))
     latitude: Mapped[float] = mapped_column(DECIMAL(10, 8))
     longitude: Mapped[float] = mapped_column(DECIMAL(11, 8))
     speed: Mapped[Optional[float]] = mapped_column(DECIMAL, nullable=True)
-    timestamp: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+    timestamp: Mapped[datetime] = mapped_column(
+        DateTime, primary_key=True, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None)
+    )
 
     # İlişkiler
     bus: Mapped["Bus"] = relationship(
@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database import Base
+
+
+class MaintenanceWatermark(Base):
+    """How far a resumable maintenance job (e.g. bus_locations compaction) has got."""
+    __tablename__ = "maintenance_watermarks"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[datetime] = mapped_column(DateTime, nullable=False)  # naive UTC
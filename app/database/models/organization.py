@@ -1,9 +1,9 @@
 # app/database/models/organization.py
 from __future__ import annotations
 from typing import TYPE_CHECKING
-from sqlalchemy import String, Enum, DateTime, Boolean
+from sqlalchemy import String, Enum, DateTime, Boolean, Time
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from datetime import datetime, timezone
+from datetime import datetime, time, timezone
 import enum
 
 from ..database import Base
@@ -28,6 +28,9 @@ class Organization(Base):
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     type: Mapped[OrganizationType] = mapped_column(Enum(OrganizationType), nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Local start of the pickup (to_school) / drop-off (from_school) shift; NULL -> settings default
+    morning_shift_start: Mapped[time | None] = mapped_column(Time, nullable=True)
+    afternoon_shift_start: Mapped[time | None] = mapped_column(Time, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
         default=lambda: datetime.now(timezone.utc)
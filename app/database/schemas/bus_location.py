@@ -1,6 +1,8 @@
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, Field, model_validator
+
+from ...core.config import settings
 
 class BusLocationBase(BaseModel):
     """Base schema for BusLocation"""
@@ -36,4 +38,59 @@ class BusLocation(BusLocationBase):
                 "speed": 45.5,
                 "timestamp": "2025-10-14T10:00:00"
             }
-        }
\ No newline at end of file
+        }
+
+class LocationBatchUpload(BaseModel):
+    """Offline-buffered driver fixes, column-wise (index i of every list is one fix)"""
+    timestamps: List[Annotated[int, Field(ge=0, le=2**53)]] = Field(
+        ..., min_length=1, description="Client fix time, Unix epoch milliseconds (UTC)"
+    )
+    latitudes: List[float]
+    longitudes: List[float]
+    speeds: Optional[List[Optional[float]]] = None
+
+    @model_validator(mode="after")
+    def check_columns(self):
+        size = len(self.timestamps)
+        if size > settings.LOCATION_BATCH_MAX_POINTS:
+            raise ValueError(f"At most {settings.LOCATION_BATCH_MAX_POINTS} fixes per batch")
+        columns = [self.latitudes, self.longitudes] + ([self.speeds] if self.speeds is not None else [])
+        if any(len(column) != size for column in columns):
+            raise ValueError("timestamps, latitudes, longitudes and speeds must have the same length")
+        return self
+
+
+class LocationBatchResult(BaseModel):
+    """Outcome of a batch upload"""
+    received: int
+    accepted: int
+    duplicates: int
+    rejected: int
+
+
+class TrailPoint(BaseModel):
+    """One live trail point"""
+    t: datetime
+    lat: float
+    lng: float
+    speed: Optional[float] = None
+
+
+class BusTrail(BaseModel):
+    """Recent path of a bus for live map rendering, oldest point first"""
+    bus_id: str
+    window_seconds: int
+    points: List[TrailPoint]
+
+
+class ArchivedTrip(BaseModel):
+    """One archived trip: points split at long reporting gaps"""
+    start: datetime
+    end: datetime
+    points: List[BusLocation]
+
+
+class ArchivedTrack(BaseModel):
+    """Archived history of a bus in a time window"""
+    bus_id: str
+    trips: List[ArchivedTrip]
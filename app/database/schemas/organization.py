@@ -1,7 +1,7 @@
 # app/database/schemas/organization.py
 from pydantic import BaseModel, Field, EmailStr, field_validator
 from typing import Optional
-from datetime import datetime, date
+from datetime import datetime, date, time
 from enum import Enum
 import re
 
@@ -52,11 +52,15 @@ class OrganizationCreate(OrganizationBase):
 class OrganizationUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=2, max_length=255)
     is_active: Optional[bool] = None
+    morning_shift_start: Optional[time] = None
+    afternoon_shift_start: Optional[time] = None
 
 
 class Organization(OrganizationBase):
     id: str
     is_active: bool
+    morning_shift_start: Optional[time] = None
+    afternoon_shift_start: Optional[time] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -10,15 +10,26 @@ from contextlib import asynccontextmanager
 from .database import create_tables
 from .database.database import AsyncSessionLocal
 from .database.seed import create_admin_if_not_exists
-from .routers import auth, admin, driver, parent, location_ws, notification
-from .routers.location_ws import batch_location_writer
-from .tasks import cleanup_old_bus_locations
+from .routers import auth, admin, bus, driver, parent, location_ws, notification
+from .tasks import (
+    cleanup_old_bus_locations,
+    cleanup_old_audit_logs,
+    compact_bus_locations,
+    ensure_bus_location_partitions,
+    batch_location_writer,
+    stream_location_writer,
+    route_precompute_scheduler,
+    eta_model_nightly,
+)
 from jose import JWTError
 from fastapi.middleware.cors import CORSMiddleware
 from .middleware.audit import AuditMiddleware
 from .core.config import settings
 from .core.limiter import limiter
 from .core.redis import redis_manager
+from .core.pubsub_hub import pubsub_hub
+from .services.eta_push_service import eta_push
+from .services.geofence_service import geofence_engine
 from .core.exceptions import ResourceNotFoundException, BusinessRuleException
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
@@ -37,16 +48,46 @@ logger = logging.getLogger(__name__)
 logger.info(f"Loaded BACKEND_CORS_ORIGINS: {settings.BACKEND_CORS_ORIGINS}")
 
 CLEANUP_INTERVAL_HOURS = 6  # Her 6 saatte bir çalışır
+CLEANUP_LOCK_KEY = "maintenance:periodic_cleanup"
+
+
+async def _run_cleanup_cycle() -> bool:
+    """
+    Partition bakımı, retention (+ arşiv) ve sıkıştırma. Her gunicorn worker'ı
+    bu görevi çalıştırır; session seviyesinde pg_try_advisory_lock ile aynı
+    anda yalnızca biri iş yapar (aksi halde aynı partition iki kez arşivlenir
+    ve kaybeden worker'ın DETACH'i hata verir). Kilit bağlantıya bağlı olduğu
+    için worker ölürse Postgres onu kendiliğinden bırakır. Kilit başka bir
+    worker'daysa False döner.
+    """
+    from .database.database import engine
+
+    # AUTOCOMMIT: the lock connection must not sit idle in a transaction for the whole run
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        params = {"key": CLEANUP_LOCK_KEY}
+        if not (await conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"), params)).scalar():
+            logger.info("Periodic cleanup is running in another worker; skipping this cycle.")
+            return False
+        try:
+            await ensure_bus_location_partitions()
+            logger.info("Periodic bus_locations cleanup starting...")
+            removed = await cleanup_old_bus_locations()
+            logger.info(f"Periodic cleanup finished: {removed} removed.")
+            if settings.BUS_LOCATION_COMPACTION_ENABLED:
+                await compact_bus_locations()
+            await cleanup_old_audit_logs()
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), params)
+    return True
 
 
 async def _periodic_cleanup():
-    """Background task: Her CLEANUP_INTERVAL_HOURS saatte bus_locations temizliği."""
+    """Background task: Her CLEANUP_INTERVAL_HOURS saatte bus_locations partition bakımı, temizliği ve sıkıştırması."""
     while True:
         try:
             await asyncio.sleep(CLEANUP_INTERVAL_HOURS * 3600)
-            logger.info("Periodic bus_locations cleanup starting...")
-            deleted = await cleanup_old_bus_locations()
-            logger.info(f"Periodic cleanup finished: {deleted} rows deleted.")
+            await _run_cleanup_cycle()
         except asyncio.CancelledError:
             logger.info("Periodic cleanup task cancelled.")
             break
@@ -67,6 +108,12 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("AUTO_CREATE_TABLES=false: create_tables atlandı.")
     
+    # Günlük bus_locations partition'ları (partition'sız tabloda no-op)
+    try:
+        await ensure_bus_location_partitions()
+    except Exception:
+        logger.exception("bus_locations partition maintenance failed at startup.")
+
     # Redis bağlantısı
     await redis_manager.connect()
     
@@ -80,25 +127,42 @@ async def lifespan(app: FastAPI):
     cleanup_task = asyncio.create_task(_periodic_cleanup())
     logger.info("Periodic bus_locations cleanup task scheduled (every %d hours).", CLEANUP_INTERVAL_HOURS)
 
-    # Batch location writer — flushes WS location queue to DB every 5 seconds
+    # Batch location writer — flushes the WS location queue at N items or T ms.
+    # Always started: in stream mode it drains points that fell back from a failed XADD.
     batch_writer_task = asyncio.create_task(batch_location_writer())
     logger.info("Batch location writer task started.")
+    background_tasks = [cleanup_task, batch_writer_task]
+
+    # Redis Streams consumer — can also run standalone: python -m app.tasks.location_writer
+    if settings.LOCATION_INGEST_MODE == "stream" and settings.LOCATION_STREAM_WRITER_ENABLED:
+        background_tasks.append(asyncio.create_task(stream_location_writer()))
+        logger.info("Location stream writer task started.")
+
+    # Rotaları vardiya başlamadan önce hesapla — tek sefer: python -m app.tasks.route_precompute
+    if settings.ROUTE_PRECOMPUTE_ENABLED:
+        background_tasks.append(asyncio.create_task(route_precompute_scheduler()))
+        logger.info("Route pre-computation scheduler started.")
+
+    # Offline ETA modeli her gece yeniden eğitilir — tek sefer: python -m app.tasks.eta_model_training
+    if settings.ETA_MODEL_TRAIN_ENABLED:
+        background_tasks.append(asyncio.create_task(eta_model_nightly()))
+        logger.info("ETA model training task scheduled (nightly at %02d:00).", settings.ETA_MODEL_TRAIN_HOUR)
 
     yield
 
-    # Cleanup task'ı durdur
-    cleanup_task.cancel()
-    batch_writer_task.cancel()
-    try:
-        await cleanup_task
-    except asyncio.CancelledError:
-        pass
-    try:
-        await batch_writer_task
-    except asyncio.CancelledError:
-        pass
+    # Background task'ları durdur
+    for task in background_tasks:
+        task.cancel()
+    for task in background_tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
     
-    # Redis bağlantısını kapat
+    # Redis bağlantılarını kapat
+    await eta_push.close()
+    await geofence_engine.close()
+    await pubsub_hub.close()
     await redis_manager.close()
 
 app = FastAPI(
@@ -155,6 +219,7 @@ app.include_router(driver.router, prefix=settings.API_V1_STR)
 app.include_router(parent.router, prefix=settings.API_V1_STR)
 app.include_router(admin.router, prefix=settings.API_V1_STR)
 app.include_router(notification.router, prefix=settings.API_V1_STR)
+app.include_router(bus.router, prefix=settings.API_V1_STR)
 app.include_router(location_ws.router)
 
 # Health Checks
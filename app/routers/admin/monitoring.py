@@ -1,18 +1,40 @@
-from fastapi import APIRouter, Depends, Query
-from typing import List, Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Annotated, Literal
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import date
+from datetime import date, datetime, timedelta, timezone
+import asyncio
 
 from ...database.schemas.user import User
-from ...database.schemas.bus_location import BusLocation
+from ...database.schemas.bus_location import ArchivedTrack, ArchivedTrip, BusLocation
 from ...database.schemas.attendance_log import AttendanceLog
-from ...dependencies import get_db, get_current_admin_user
+from ...dependencies import get_db, get_current_admin_user, get_current_super_admin
+from ...core.metrics import metrics
 from ...database.schemas.common import PaginatedResponse
 from ...services.bus_service import BusService
 from ...services.attendance_service import AttendanceService
+from ...services.archive_service import archived_trips, read_archived_locations
+from ...services.track_service import track_ndjson, track_polyline
 
 router = APIRouter(tags=["admin-monitoring"])
 
+
+def _naive_utc(value: datetime) -> datetime:
+    """bus_locations timestamps are naive UTC."""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+async def _ensure_bus_in_scope(db: AsyncSession, current_user: User, bus_id: str) -> None:
+    org_type = current_user.organization.type.value if current_user.organization else None
+    bus = await BusService(db).get_bus_by_id(
+        bus_id,
+        current_user_org_id=current_user.organization_id,
+        current_user_org_type=org_type,
+    )
+    if not bus:
+        raise HTTPException(status_code=404, detail="Bus not found")
+
+
 @router.get("/buses/locations", response_model=List[BusLocation])
 async def get_all_bus_locations(
     current_user: Annotated[User, Depends(get_current_admin_user)],
@@ -25,6 +47,64 @@ async def get_all_bus_locations(
         current_user_org_type=org_type
     )
 
+@router.get("/buses/{bus_id}/archive", response_model=ArchivedTrack)
+async def get_archived_bus_track(
+    bus_id: str,
+    current_user: Annotated[User, Depends(get_current_admin_user)],
+    start: datetime,
+    end: datetime,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Arşivlenmiş (Postgres'ten silinmiş) konum geçmişi, seferlere bölünmüş olarak.
+    Parquet dosyaları yerinde okunur; en fazla 31 günlük aralık.
+    """
+    start, end = _naive_utc(start), _naive_utc(end)
+    if end <= start or end - start > timedelta(days=31):
+        raise HTTPException(status_code=400, detail="end must be after start and at most 31 days later")
+    await _ensure_bus_in_scope(db, current_user, bus_id)
+    points = await asyncio.to_thread(read_archived_locations, bus_id, start, end)
+    return ArchivedTrack(
+        bus_id=bus_id,
+        trips=[
+            ArchivedTrip(start=trip[0]["timestamp"], end=trip[-1]["timestamp"], points=trip)
+            for trip in archived_trips(points)
+        ],
+    )
+
+@router.get("/buses/{bus_id}/track")
+async def stream_bus_track(
+    bus_id: str,
+    current_user: Annotated[User, Depends(get_current_admin_user)],
+    start: Annotated[datetime, Query(alias="from")],
+    end: Annotated[datetime, Query(alias="to")],
+    bucket_seconds: int = Query(default=10, ge=1, le=3600),
+    format: Literal["ndjson", "polyline"] = "ndjson",
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Bir otobüsün [from, to) aralığındaki izi; her bucket_seconds için tek nokta
+    (SQL'de hesaplanır). Sonuç server-side cursor ile satır satır akar:
+    format=ndjson her noktayı, format=polyline encoded polyline parçalarını döner
+    (bkz. services/track_service.py). En fazla 7 günlük aralık.
+    """
+    start, end = _naive_utc(start), _naive_utc(end)
+    if end <= start or end - start > timedelta(days=7):
+        raise HTTPException(status_code=400, detail="to must be after from and at most 7 days later")
+    await _ensure_bus_in_scope(db, current_user, bus_id)
+    stream = track_polyline if format == "polyline" else track_ndjson
+    return StreamingResponse(
+        stream(bus_id, start, end, bucket_seconds),
+        media_type="application/x-ndjson",
+    )
+
+@router.get("/metrics")
+async def get_metrics(
+    current_user: Annotated[User, Depends(get_current_super_admin)],
+):
+    """Bu worker sürecinin ingest/cache metrikleri (sayaçlar, gauge'lar, gecikme özetleri)."""
+    return metrics.snapshot()
+
 @router.get("/logs/attendance", response_model=PaginatedResponse[AttendanceLog])
 async def get_attendance_logs(
     current_user: Annotated[User, Depends(get_current_admin_user)],
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Annotated, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..database.schemas.bus_location import BusTrail
+from ..database.schemas.user import User
+from ..dependencies import get_db, get_current_user
+from ..services.location_service import LocationService
+from ..services.trail_service import trail_points, trail_store
+
+router = APIRouter(
+    prefix="/buses",
+    tags=["buses"]
+)
+
+@router.get("/{bus_id}/trail", response_model=BusTrail)
+async def get_bus_trail(
+    bus_id: str,
+    current_user: Annotated[User, Depends(get_current_user)],
+    window_seconds: Optional[int] = Query(default=None, ge=1),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Canlı harita için otobüsün son window_seconds (varsayılan ve üst sınır
+    TRAIL_WINDOW_SECONDS) içindeki izi, eskiden yeniye.
+    Bellekteki ring buffer'dan (veya Redis kopyasından) okunur; veritabanına gidilmez.
+    Erişim WebSocket ile aynı kurallara tabidir.
+    """
+    if not await LocationService(db).validate_ws_access(current_user, bus_id):
+        raise HTTPException(status_code=404, detail="Bus not found")
+    window = min(window_seconds or settings.TRAIL_WINDOW_SECONDS, settings.TRAIL_WINDOW_SECONDS)
+    rows = await trail_store.get(bus_id, window)
+    return BusTrail(bus_id=bus_id, window_seconds=window, points=trail_points(rows))
@@ -5,12 +5,13 @@ from typing import List, Annotated
 from ..database.schemas.user import User
 from ..database.schemas.student import Student
 from ..database.schemas.attendance_log import AttendanceLog, AttendanceLogRequest, TripType
-from ..database.schemas.bus_location import BusLocationCreate, BusLocation
+from ..database.schemas.bus_location import BusLocationCreate, BusLocation, LocationBatchResult, LocationBatchUpload
 from ..database.schemas.route import OptimizedRouteResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..dependencies import get_db, get_current_driver_user
 from ..services.driver_service import DriverService
+from ..services.location_batch_service import upload_location_batch
 from ..services.route_service import RouteService
 from ..services.route_progress_service import RouteProgressService
 from ..services.trip_session_service import TripSessionService
@@ -64,11 +65,31 @@ async def update_bus_location(
 ):
     """
     Deprecated: Servisin anlık konumunu HTTP ile kaydeder.
-    Real-time konum aktarımı için `WS /ws/driver/location` kullanılmalıdır.
+    Real-time konum aktarımı için `WS /ws/driver/location`, çevrimdışı biriken
+    konumlar için `POST /driver/buses/me/locations/batch` kullanılmalıdır.
     """
     service = DriverService(db)
     return await service.update_location(current_user.id, location)
 
+@router.post("/buses/me/locations/batch", response_model=LocationBatchResult)
+@limiter.limit("20/minute")
+async def upload_bus_location_batch(
+    request: Request,
+    upload: LocationBatchUpload,
+    current_user: Annotated[User, Depends(get_current_driver_user)],
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Bağlantı kopukken cihazda biriken konumları tek istekte yükler (offline sync).
+    Sütun bazlı gövde: timestamps (epoch ms), latitudes, longitudes, speeds.
+    Geçersiz noktalar ve aynı zaman damgasıyla daha önce kaydedilmiş noktalar atlanır;
+    kalanlar tek toplu insert ile yazılır. Canlı yayına (WebSocket) gönderilmez.
+    """
+    bus_id = await DriverService(db).get_driver_bus_id(current_user.id)
+    if not bus_id:
+        raise HTTPException(status_code=404, detail="Driver has no assigned bus")
+    return await upload_location_batch(bus_id, upload)
+
 @router.get("/buses/me/route", response_model=OptimizedRouteResponse)
 async def get_driver_bus_route(
     current_user: Annotated[User, Depends(get_current_driver_user)],
@@ -146,6 +167,25 @@ async def get_visited_students(
     return await service.get_visited_students(current_user.id)
 
 
+@router.get("/buses/me/route/visited/provisional", response_model=list[str])
+async def get_provisionally_visited_students(
+    current_user: Annotated[User, Depends(get_current_driver_user)],
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Dwell detection ile otomatik ziyaret edildi işaretlenen öğrenciler.
+    POST .../visited/{student_id} onaylar, DELETE geri açar.
+    """
+    driver_service = DriverService(db)
+    bus_id = await driver_service.get_driver_bus_id(current_user.id)
+    if not bus_id:
+        raise HTTPException(status_code=404, detail="Driver has no assigned bus")
+    trip_type = await redis_manager.get(f"bus:{bus_id}:trip_type")
+    if not trip_type:
+        return []
+    return await RouteProgressService().get_provisional(bus_id, str(trip_type))
+
+
 @router.post("/buses/me/route/visited/{student_id}", status_code=status.HTTP_200_OK)
 async def mark_student_visited(
     student_id: str,
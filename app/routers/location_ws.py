@@ -1,11 +1,17 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
-from sqlalchemy import select
 from ..database.database import AsyncSessionLocal
+from ..core.config import settings
 from ..core.redis import redis_manager
+from ..core.pubsub_hub import pubsub_hub
 from ..services.location_service import LocationService
-from ..database.models.bus_location import BusLocation
-from uuid import uuid4
+from ..services.geofence_service import geofence_engine
+from ..services.eta_push_service import eta_channel, eta_push, last_eta_frame_key, parent_eta_frame
+from ..services.latest_location_service import LatestLocationService
+from ..services.reporting_rate_service import ReportingRateController
+from ..services.trail_service import trail_points, trail_store
+from ..tasks.location_writer import enqueue_location
 from datetime import datetime, timezone
+from uuid import uuid4
 import asyncio
 import json
 import logging
@@ -14,45 +20,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# ─── Batch Location Writer ────────────────────────────────────────────────────
-# Instead of one DB commit per WS message (blocks the event loop and hammers DB),
-# push to an in-memory queue and flush every 5 seconds in a background task.
-_location_queue: asyncio.Queue = asyncio.Queue()
-
-
-async def batch_location_writer():
-    """Background task: batch-insert queued location updates every 5 seconds."""
-    while True:
-        await asyncio.sleep(5)
-        if _location_queue.empty():
-            continue
-        batch = []
-        while not _location_queue.empty():
-            try:
-                batch.append(_location_queue.get_nowait())
-            except asyncio.QueueEmpty:
-                break
-        if not batch:
-            continue
-        try:
-            async with AsyncSessionLocal() as db:
-                db.add_all([
-                    BusLocation(
-                        id=str(uuid4()),
-                        bus_id=item["bus_id"],
-                        latitude=item["latitude"],
-                        longitude=item["longitude"],
-                        speed=item.get("speed"),
-                        timestamp=item["timestamp"],
-                    )
-                    for item in batch
-                ])
-                await db.commit()
-                logger.info(f"Batch wrote {len(batch)} location record(s) to DB")
-        except Exception as e:
-            logger.error(f"Batch location write failed: {e}")
-
-
 # ─── Per-connection WS Rate Limiter ──────────────────────────────────────────
 
 def _make_ws_rate_limiter(max_messages: int = 120, window_seconds: int = 60):
@@ -92,6 +59,18 @@ def _validate_location_data(data: dict) -> bool:
         return False
 
 
+def _build_location_item(bus_id: str, data: dict) -> dict:
+    """Build the ingest payload for a validated location message."""
+    return {
+        "id": str(uuid4()),
+        "bus_id": bus_id,
+        "latitude": data["latitude"],
+        "longitude": data["longitude"],
+        "speed": data.get("speed"),
+        "timestamp": datetime.now(timezone.utc),
+    }
+
+
 def _extract_ws_token(websocket: WebSocket) -> str | None:
     """Extract token from Authorization header only. Query param is not supported —
     tokens in URLs are logged by servers and stored in browser history."""
@@ -106,6 +85,10 @@ async def driver_location_ws(websocket: WebSocket):
     """
     Şoförler için basitleştirilmiş WebSocket endpoint'i.
     Bus ID'yi token'dan bulur.
+
+    Sunucu istemciye {"type": "control", "interval_seconds": N, "reason": ...}
+    frame'leri gönderir; istemci konum gönderme aralığını buna göre ayarlar
+    (bkz. services/reporting_rate_service.py).
     """
     # Önce bağlantıyı kabul et, sonra kontrol et.
     # Bu sayede "Connection not upgraded" hatası yerine anlamlı bir WS kapanış kodu döneriz.
@@ -145,8 +128,11 @@ async def driver_location_ws(websocket: WebSocket):
         redis = await redis_manager.get_redis()
         channel_name = f"bus:{bus_id}:location"
         rate_check = _make_ws_rate_limiter()
+        reporting_rate = ReportingRateController(bus_id)
 
         try:
+            if settings.LOCATION_RATE_CONTROL_ENABLED:
+                await websocket.send_json(reporting_rate.initial_frame())
             while True:
                 data = await websocket.receive_text()
 
@@ -167,14 +153,18 @@ async def driver_location_ws(websocket: WebSocket):
                     # Publish to Redis pub/sub (real-time to subscribers)
                     await redis.publish(channel_name, json.dumps(json_data))
 
-                    # Enqueue for batch DB write (flushed every 5 seconds)
-                    _location_queue.put_nowait({
-                        "bus_id": bus_id,
-                        "latitude": json_data["latitude"],
-                        "longitude": json_data["longitude"],
-                        "speed": json_data.get("speed"),
-                        "timestamp": datetime.now(timezone.utc),
-                    })
+                    # Hand off to the ingest pipeline (in-process queue or Redis Stream)
+                    await enqueue_location(_build_location_item(bus_id, json_data))
+                    eta_push.on_location(bus_id, json_data["latitude"], json_data["longitude"])
+                    geofence_engine.on_location(
+                        bus_id, json_data["latitude"], json_data["longitude"], json_data.get("speed")
+                    )
+
+                    control = await reporting_rate.on_location(
+                        json_data["latitude"], json_data["longitude"], json_data.get("speed")
+                    )
+                    if control is not None:
+                        await websocket.send_json(control)
 
                 except json.JSONDecodeError:
                     logger.error(f"Invalid JSON received from driver {user.id}")
@@ -192,10 +182,18 @@ async def driver_location_ws(websocket: WebSocket):
             pass
 
 @router.websocket("/ws/bus/{bus_id}/location")
-async def bus_location_ws(websocket: WebSocket, bus_id: str):
+async def bus_location_ws(websocket: WebSocket, bus_id: str, eta: bool = False):
     """
     Otobüs konumu için WebSocket bağlantısı.
     Redis Pub/Sub kullanarak ölçeklenebilir yapı.
+
+    eta=true ile bağlanan veliler, konum mesajlarına ek olarak kendi çocuklarının
+    {"type": "eta", ...} frame'lerini alır (bkz. services/eta_push_service.py);
+    dashboard'u ETA için poll etmeye gerek kalmaz.
+
+    Bağlantı açılınca son konumun ardından {"type": "trail", "points": [...]}
+    frame'i ile son TRAIL_WINDOW_SECONDS'lık iz gönderilir (bkz.
+    services/trail_service.py).
     """
     logger.info(f"Bus WS Connection attempt. Bus: {bus_id}")
     await websocket.accept()
@@ -224,16 +222,19 @@ async def bus_location_ws(websocket: WebSocket, bus_id: str):
             
             logger.info(f"Bus WS Verified: User {user.id} listening to Bus {bus_id}")
 
+            eta_student_ids: list[str] = []
+            if eta and user.role.value == "veli":
+                eta_student_ids = await service.get_parent_student_ids_on_bus(user.id, bus_id)
+
             # Send last known location immediately
             try:
-                query = select(BusLocation).where(BusLocation.bus_id == bus_id).order_by(BusLocation.timestamp.desc())
-                last_location = (await db.execute(query)).scalars().first()
-                
+                last_location = await LatestLocationService(db).get(bus_id)
+
                 if last_location:
                     initial_data = {
-                        "latitude": last_location.latitude,
-                        "longitude": last_location.longitude,
-                        "speed": last_location.speed,
+                        "latitude": float(last_location.latitude),
+                        "longitude": float(last_location.longitude),
+                        "speed": float(last_location.speed) if last_location.speed is not None else None,
                         "timestamp": last_location.timestamp.isoformat() if last_location.timestamp else None
                     }
                     logger.info(f"Sending last known location to WS: {initial_data}")
@@ -241,29 +242,65 @@ async def bus_location_ws(websocket: WebSocket, bus_id: str):
             except Exception as e:
                 logger.error(f"Error sending last location: {e}")
 
+            # Haritanın son dakikalardaki izi çizebilmesi için başlangıç izi
+            try:
+                trail = await trail_store.get(bus_id)
+                if len(trail):
+                    await websocket.send_text(json.dumps({
+                        "type": "trail",
+                        "bus_id": bus_id,
+                        "points": trail_points(trail),
+                    }))
+            except Exception as e:
+                logger.error(f"Error sending trail: {e}")
+
         redis = await redis_manager.get_redis()
-        pubsub = redis.pubsub()
         channel_name = f"bus:{bus_id}:location"
-        
-        # Redis kanalına abone ol
-        await pubsub.subscribe(channel_name)
-        logger.info(f"Subscribed to Redis channel: {channel_name}")
+
+        def narrow_eta(raw: str) -> str | None:
+            frame = parent_eta_frame(json.loads(raw), eta_student_ids)
+            return json.dumps(frame) if frame else None
+
+        eta_queue = None
+        if eta_student_ids:
+            try:
+                last_frame = await redis.get(last_eta_frame_key(bus_id))
+                if last_frame and (initial_eta := narrow_eta(last_frame)):
+                    await websocket.send_text(initial_eta)
+            except Exception as e:
+                logger.error(f"Error sending last ETA: {e}")
+            eta_queue = await pubsub_hub.subscribe(eta_channel(bus_id))
+
+        # Worker başına tek Redis aboneliği; mesajlar hub üzerinden yerel kuyruğa dağıtılır
+        hub_queue = await pubsub_hub.subscribe(channel_name)
+        logger.info(f"Joined pubsub hub for channel: {channel_name}")
 
         async def forward_redis_to_ws():
-            """Redis'ten gelen mesajları WebSocket'e iletir"""
+            """Hub kuyruğundaki mesajları WebSocket'e iletir"""
             try:
-                logger.info("Starting Redis listener loop...")
-                async for message in pubsub.listen():
-                    if message["type"] == "message":
-                        # Mesajı WebSocket üzerinden istemciye gönder
-                        data = message["data"]
-                        logger.info(f"Forwarding data to WS: {data}")
-                        await websocket.send_text(data)
+                while True:
+                    data = await hub_queue.get()
+                    await websocket.send_text(data)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error forwarding Redis message: {e}")
 
+        async def forward_eta_to_ws():
+            """Otobüsün ETA frame'lerini velinin çocuklarına daraltıp iletir"""
+            try:
+                while True:
+                    frame = narrow_eta(await eta_queue.get())
+                    if frame:
+                        await websocket.send_text(frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error forwarding ETA frame: {e}")
+
         # Redis dinleyicisini arka plan görevi olarak başlat
         redis_reader_task = asyncio.create_task(forward_redis_to_ws())
+        eta_reader_task = asyncio.create_task(forward_eta_to_ws()) if eta_queue is not None else None
         rate_check = _make_ws_rate_limiter()
         try:
             while True:
@@ -288,14 +325,12 @@ async def bus_location_ws(websocket: WebSocket, bus_id: str):
                         # Publish to Redis pub/sub (real-time to subscribers)
                         await redis.publish(channel_name, json.dumps(json_data))
 
-                        # Enqueue for batch DB write (flushed every 5 seconds)
-                        _location_queue.put_nowait({
-                            "bus_id": bus_id,
-                            "latitude": json_data["latitude"],
-                            "longitude": json_data["longitude"],
-                            "speed": json_data.get("speed"),
-                            "timestamp": datetime.now(timezone.utc),
-                        })
+                        # Hand off to the ingest pipeline (in-process queue or Redis Stream)
+                        await enqueue_location(_build_location_item(bus_id, json_data))
+                        eta_push.on_location(bus_id, json_data["latitude"], json_data["longitude"])
+                        geofence_engine.on_location(
+                            bus_id, json_data["latitude"], json_data["longitude"], json_data.get("speed")
+                        )
 
                     except json.JSONDecodeError:
                         pass
@@ -307,8 +342,10 @@ async def bus_location_ws(websocket: WebSocket, bus_id: str):
         finally:
             # Temizlik işlemleri
             redis_reader_task.cancel()
-            await pubsub.unsubscribe(channel_name)
-            await pubsub.close()
+            await pubsub_hub.unsubscribe(channel_name, hub_queue)
+            if eta_reader_task is not None:
+                eta_reader_task.cancel()
+                await pubsub_hub.unsubscribe(eta_channel(bus_id), eta_queue)
             
     except Exception as e:
         logger.error(f"Unexpected error in Bus WS handler: {e}")
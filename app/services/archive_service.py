@@ -0,0 +1,308 @@
+"""
+Columnar archive of expired bus_locations and audit_logs rows.
+
+Before cleanup deletes rows, they are streamed through a server-side cursor
+(ordered by bus / user and time) into zstd-compressed Parquet files under
+ARCHIVE_DIR, Hive-partitioned by UTC date and organization:
+
+    {ARCHIVE_DIR}/bus_locations/date=2026-01-05/organization=<org_id|none>/part-<source>.parquet
+    {ARCHIVE_DIR}/audit_logs/date=2026-01-05/organization=<org_id|none>/part-audit_logs.parquet
+
+<source> is the table or partition the rows came from. Callers archive whole
+UTC days (cutoffs are midnight), so a day is archived from a given source
+exactly once. A rerun after a failed delete writes the same file name and
+overwrites its earlier output instead of adding a duplicate part.
+
+Files are written as *.tmp and renamed once closed. The archive counts as
+verified only when the footers of every written file add up to the streamed
+row count, and that equals the row count still in the database. Otherwise
+the run's files are removed and the caller keeps the rows.
+
+read_archived_locations() / archived_trips() query the files in place with
+pyarrow.dataset: partition pruning on date, predicate pushdown on bus_id and
+timestamp. No re-import is needed. The layout is also readable by DuckDB or
+Spark.
+"""
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+from ..core.config import settings
+from ..core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = 10_000
+ROW_GROUP_SIZE = 100_000
+NO_ORGANIZATION = "none"
+
+LOCATION_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("bus_id", pa.string()),
+    ("organization_id", pa.string()),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("speed", pa.float64()),
+    ("timestamp", pa.timestamp("us")),  # naive UTC, as in bus_locations
+])
+
+AUDIT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("user_id", pa.string()),
+    ("organization_id", pa.string()),
+    ("action", pa.string()),
+    ("endpoint", pa.string()),
+    ("details", pa.string()),
+    ("status_code", pa.int32()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+])
+
+_PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("organization", pa.string())]), flavor="hive")
+
+_LOCATIONS_SQL = """
+SELECT l.id, l.bus_id, b.organization_id, l.latitude, l.longitude, l.speed, l.timestamp
+FROM {source} l
+LEFT JOIN buses b ON b.id = l.bus_id
+WHERE l.timestamp < :cutoff
+ORDER BY l.bus_id, l.timestamp
+"""
+
+_AUDIT_SQL = """
+SELECT a.id, a.user_id, u.organization_id, a.action, a.endpoint, a.details, a.status_code, a.timestamp
+FROM audit_logs a
+LEFT JOIN users u ON u.id = a.user_id
+WHERE a.timestamp < :cutoff
+ORDER BY a.user_id, a.timestamp
+"""
+
+
+class ArchiveVerificationError(RuntimeError):
+    """The written archive does not match the rows it should hold; nothing may be deleted."""
+
+
+def _to_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def retention_cutoff(retention_days: int, now: Optional[datetime] = None) -> datetime:
+    """UTC midnight retention_days ago (aware): retention always removes whole days."""
+    day = ((now or datetime.now(timezone.utc)) - timedelta(days=retention_days)).date()
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _utc_date(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date().isoformat()
+
+
+class ArchiveWriter:
+    """
+    Buffers rows per (date, organization) and writes one Parquet file per
+    partition, named part-<name>.parquet (name defaults to the run id).
+    """
+
+    def __init__(
+        self,
+        table: str,
+        schema: pa.Schema,
+        root: Optional[str] = None,
+        run_id: Optional[str] = None,
+        name: Optional[str] = None,
+    ):
+        self.table = table
+        self.schema = schema
+        self.root = Path(root or settings.ARCHIVE_DIR) / table
+        self.run_id = run_id or f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid4().hex[:8]}"
+        self.name = name or self.run_id
+        self.rows = 0
+        self._buffers: Dict[Tuple[str, str], List[dict]] = {}
+        self._writers: Dict[Tuple[str, str], pq.ParquetWriter] = {}
+        self._paths: Dict[Tuple[str, str], Path] = {}
+        self.files: Dict[Path, int] = {}
+
+    def _path(self, key: Tuple[str, str]) -> Path:
+        day, organization = key
+        return self.root / f"date={day}" / f"organization={organization}" / f"part-{self.name}.parquet"
+
+    def _flush(self, key: Tuple[str, str]) -> None:
+        rows = self._buffers.pop(key, None)
+        if not rows:
+            return
+        writer = self._writers.get(key)
+        if writer is None:
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._paths[key] = path
+            writer = pq.ParquetWriter(f"{path}.tmp", self.schema, compression="zstd")
+            self._writers[key] = writer
+        writer.write_table(pa.Table.from_pylist(rows, schema=self.schema), row_group_size=ROW_GROUP_SIZE)
+
+    def write(self, rows: List[dict]) -> None:
+        for row in rows:
+            key = (_utc_date(row["timestamp"]), row.get("organization_id") or NO_ORGANIZATION)
+            buffer = self._buffers.setdefault(key, [])
+            buffer.append(row)
+            if len(buffer) >= ROW_GROUP_SIZE:
+                self._flush(key)
+        self.rows += len(rows)
+
+    def close(self) -> Dict[Path, int]:
+        """Flush, close and publish every file. Returns {path: rows written}."""
+        for key in list(self._buffers):
+            self._flush(key)
+        for key, writer in self._writers.items():
+            writer.close()
+            path = self._paths[key]
+            with open(f"{path}.tmp", "rb") as handle:
+                os.fsync(handle.fileno())
+            os.replace(f"{path}.tmp", path)
+            self.files[path] = pq.ParquetFile(path).metadata.num_rows
+        self._writers.clear()
+        return self.files
+
+    def verify(self, expected_rows: int) -> None:
+        footer_rows = sum(pq.read_metadata(path).num_rows for path in self.files)
+        if footer_rows != self.rows or self.rows != expected_rows:
+            raise ArchiveVerificationError(
+                f"{self.table} archive {self.run_id}: {footer_rows} rows in files, "
+                f"{self.rows} streamed, {expected_rows} expected"
+            )
+
+    def discard(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        for path in list(self._paths.values()):
+            for candidate in (path, Path(f"{path}.tmp")):
+                candidate.unlink(missing_ok=True)
+        self._writers.clear()
+        self.files.clear()
+
+
+@dataclass
+class ArchiveResult:
+    table: str
+    rows: int
+    files: List[Path] = field(default_factory=list)
+
+
+async def _archive(
+    table: str,
+    schema: pa.Schema,
+    sql: str,
+    count_sql: str,
+    params: dict,
+    to_row: Callable[[tuple], dict],
+    name: str,
+) -> ArchiveResult:
+    from ..database.database import engine
+
+    writer = ArchiveWriter(table, schema, name=name)
+    try:
+        async with engine.connect() as conn:
+            result = await conn.stream(text(sql).execution_options(yield_per=STREAM_BATCH_SIZE), params)
+            async for rows in result.partitions(STREAM_BATCH_SIZE):
+                writer.write([to_row(row) for row in rows])
+            await result.close()
+            writer.close()
+            expected = (await conn.execute(text(count_sql), params)).scalar() or 0
+        writer.verify(expected)
+    except BaseException:
+        writer.discard()
+        raise
+    metrics.inc(f"archive_{table}_rows_total", writer.rows)
+    logger.info(f"Archived {writer.rows} {table} row(s) into {len(writer.files)} file(s) (run {writer.run_id}).")
+    return ArchiveResult(table=table, rows=writer.rows, files=sorted(writer.files))
+
+
+async def archive_bus_locations(cutoff: datetime, source: str = "bus_locations") -> ArchiveResult:
+    """Archive source rows (the table or one of its partitions) older than cutoff (naive UTC midnight)."""
+    return await _archive(
+        "bus_locations",
+        LOCATION_SCHEMA,
+        _LOCATIONS_SQL.format(source=source),
+        f"SELECT count(*) FROM {source} WHERE timestamp < :cutoff",
+        {"cutoff": cutoff},
+        lambda row: {
+            "id": row[0],
+            "bus_id": row[1],
+            "organization_id": row[2],
+            "latitude": _to_float(row[3]),
+            "longitude": _to_float(row[4]),
+            "speed": _to_float(row[5]),
+            "timestamp": row[6],
+        },
+        name=source,
+    )
+
+
+async def archive_audit_logs(cutoff: datetime) -> ArchiveResult:
+    """Archive audit_logs rows older than cutoff (aware UTC midnight)."""
+    return await _archive(
+        "audit_logs",
+        AUDIT_SCHEMA,
+        _AUDIT_SQL,
+        "SELECT count(*) FROM audit_logs WHERE timestamp < :cutoff",
+        {"cutoff": cutoff},
+        lambda row: {
+            "id": row[0],
+            "user_id": row[1],
+            "organization_id": row[2],
+            "action": row[3],
+            "endpoint": row[4],
+            "details": row[5],
+            "status_code": row[6],
+            "timestamp": row[7],
+        },
+        name="audit_logs",
+    )
+
+
+# ─── Reader ─────────────────────────────────────────────────────────────────
+
+def read_archived_locations(
+    bus_id: str,
+    start: datetime,
+    end: datetime,
+    root: Optional[str] = None,
+) -> List[dict]:
+    """Archived points of one bus in [start, end) (naive UTC), oldest first. Blocking: run in a thread."""
+    path = Path(root or settings.ARCHIVE_DIR) / "bus_locations"
+    if not path.exists():
+        return []
+    dataset = ds.dataset(path, format="parquet", partitioning=_PARTITIONING)
+    expression = (
+        (ds.field("date") >= start.date().isoformat())
+        & (ds.field("date") <= end.date().isoformat())
+        & (ds.field("bus_id") == bus_id)
+        & (ds.field("timestamp") >= pa.scalar(start, pa.timestamp("us")))
+        & (ds.field("timestamp") < pa.scalar(end, pa.timestamp("us")))
+    )
+    table = dataset.to_table(
+        columns=["id", "bus_id", "latitude", "longitude", "speed", "timestamp"],
+        filter=expression,
+    )
+    return table.sort_by("timestamp").to_pylist()
+
+
+def archived_trips(points: List[dict], gap_seconds: Optional[float] = None) -> List[List[dict]]:
+    """Split time-ordered points into trips at gaps longer than gap_seconds."""
+    from ..tasks.compact_bus_locations import TRIP_GAP_SECONDS
+
+    gap = timedelta(seconds=gap_seconds if gap_seconds is not None else TRIP_GAP_SECONDS)
+    trips: List[List[dict]] = []
+    for point in points:
+        if trips and point["timestamp"] - trips[-1][-1]["timestamp"] <= gap:
+            trips[-1].append(point)
+        else:
+            trips.append([point])
+    return trips
@@ -13,6 +13,7 @@ from ..database.models.parent_student_relation import ParentStudentRelation
 from ..database.models.student import Student as StudentModel
 from ..database.models.student_bus_assignment import StudentBusAssignment
 from ..database.models.user import User as UserModel
+from .route_service import route_cache_fallbacks, route_cache_tag
 
 logger = logging.getLogger(__name__)
 
@@ -320,8 +321,7 @@ class AssignmentService:
 
     async def _invalidate_route_cache(self, bus_id: str) -> None:
         try:
-            pattern = f"route:{bus_id}:*"
-            await redis_manager.delete_pattern(pattern)
+            await redis_manager.invalidate_tag(route_cache_tag(bus_id), fallback_patterns=route_cache_fallbacks(bus_id))
             logger.info(f"Route cache invalidated for bus {bus_id}")
         except Exception as e:
             logger.error(f"Failed to invalidate cache for bus {bus_id}: {str(e)}")
@@ -14,6 +14,7 @@ from ..database.models.school import School as SchoolModel
 from ..database.models.school_company_contract import SchoolCompanyContract as ContractModel
 from ..database.models.user import User as UserModel
 from ..database.schemas.bus import BusCreate, BusUpdate
+from .latest_location_service import LatestLocationService
 
 
 class BusService:
@@ -260,14 +261,8 @@ class BusService:
         current_user_org_id: Optional[str] = None,
         current_user_org_type: Optional[str] = None,
     ) -> List[BusLocation]:
-        query = select(BusLocation).join(BusModel, BusModel.id == BusLocation.bus_id)
-        if current_user_org_id:
-            if current_user_org_type == "school":
-                query = query.join(SchoolModel, SchoolModel.id == BusModel.school_id).where(
-                    SchoolModel.organization_id == current_user_org_id
-                )
-            else:
-                query = query.where(BusModel.organization_id == current_user_org_id)
-        query = query.distinct(BusLocation.bus_id).order_by(BusLocation.bus_id, BusLocation.timestamp.desc())
-        result = await self.db.execute(query)
-        return result.scalars().all()
+        query = select(BusModel.id)
+        query = self._apply_bus_scope(query, current_user_org_id, current_user_org_type)
+        bus_ids = (await self.db.execute(query.order_by(BusModel.id))).scalars().all()
+        latest = await LatestLocationService(self.db).get_many(bus_ids)
+        return [latest[bus_id] for bus_id in bus_ids if bus_id in latest]
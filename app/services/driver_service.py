@@ -1,3 +1,5 @@
+import logging
+
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
@@ -10,9 +12,15 @@ from ..database.schemas.attendance_log import AttendanceLogCreate, AttendanceLog
 from ..database.schemas.bus_location import BusLocationCreate
 from ..core.redis import redis_manager
 from ..core.exceptions import ResourceNotFoundException, BusinessRuleException
+from .eta_push_service import eta_push
+from .geofence_service import geofence_engine
+from .latest_location_service import LatestLocationService
+from .trail_service import trail_store
 from .route_progress_service import RouteProgressService
 from .trip_session_service import TripSessionService
 
+logger = logging.getLogger(__name__)
+
 class DriverService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -145,6 +153,18 @@ class DriverService:
         self.db.add(new_location)
         await self.db.commit()
         await self.db.refresh(new_location)
+        try:
+            await LatestLocationService().record(new_location)
+        except Exception as e:
+            logger.error(f"Latest location update failed for bus {bus.id}: {e}")
+        try:
+            await trail_store.record(
+                bus.id, new_location.timestamp, location.latitude, location.longitude, location.speed
+            )
+        except Exception as e:
+            logger.error(f"Trail update failed for bus {bus.id}: {e}")
+        eta_push.on_location(bus.id, location.latitude, location.longitude)
+        geofence_engine.on_location(bus.id, location.latitude, location.longitude, location.speed)
         return new_location
 
     async def get_visited_students(self, driver_id: str) -> List[str]:
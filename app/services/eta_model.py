@@ -0,0 +1,167 @@
+"""
+Offline ETA model.
+
+Average bus speed per geohash cell (precision 6) and local hour of day, learnt
+from bus_locations by the nightly job in app/tasks/eta_model_training.py and
+stored in the Redis hash eta_model:speeds. Field names are "{cell}:{hour}"
+with "*" as wildcard for the fallbacks (cell over all hours, all cells in that
+hour, overall).
+
+A path (bus -> remaining stops -> destination) is split into ~SEGMENT_METERS
+pieces; each piece's great-circle length times DEFAULT_DETOUR_FACTOR is
+divided by the speed of the cell it lies in. The sum is then scaled by a
+calibration factor that Google Distance Matrix answers keep up to date (EWMA
+of google/model ratios), so no external call is needed per estimate.
+
+bus_locations.speed is km/h (the ingest validators accept 0..300).
+"""
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from ..core.config import settings
+from ..core.geo import geohash_encode, haversine_meters
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+MODEL_KEY = "eta_model:speeds"
+CALIBRATION_KEY = "eta_model:calibration"
+
+GEOHASH_PRECISION = 6
+SEGMENT_METERS = 500
+DEFAULT_SPEED_MPS = 25 / 3.6
+DEFAULT_DETOUR_FACTOR = 1.3  # Road / great-circle distance in city traffic
+MIN_SAMPLES = 20  # Buckets with fewer points fall back to a wider one
+# Stationary points (stops, parking) and GPS spikes say nothing about travel speed
+MIN_SPEED_KMH = 3
+MAX_SPEED_KMH = 130
+CALIBRATION_ALPHA = 0.2
+CALIBRATION_BOUNDS = (0.5, 3.0)
+
+Point = Tuple[float, float]
+
+
+def speed_field(cell: str, hour) -> str:
+    return f"{cell}:{hour}"
+
+
+def _fallback_fields(cell: str, hour: int) -> List[str]:
+    """Most to least specific bucket for one segment."""
+    return [speed_field(cell, hour), speed_field(cell, "*"), speed_field("*", hour), speed_field("*", "*")]
+
+
+def aggregate_speeds(
+    rows: Iterable[Tuple[str, int, int, float]],
+    min_samples: int = MIN_SAMPLES,
+) -> Dict[str, float]:
+    """
+    Fold (geohash, hour, sample_count, avg_speed_kmh) rows into m/s averages
+    for every bucket and its wildcards. Buckets below min_samples are dropped.
+    """
+    sums: Dict[str, List[float]] = {}
+    for cell, hour, count, avg_kmh in rows:
+        weighted = float(avg_kmh) * count
+        for field in (
+            speed_field(cell, hour),
+            speed_field(cell, "*"),
+            speed_field("*", hour),
+            speed_field("*", "*"),
+        ):
+            bucket = sums.setdefault(field, [0.0, 0])
+            bucket[0] += weighted
+            bucket[1] += count
+    return {
+        field: round(total / count / 3.6, 3)
+        for field, (total, count) in sums.items()
+        if count >= min_samples
+    }
+
+
+def split_path(path: Sequence[Point], segment_meters: float = SEGMENT_METERS) -> List[Tuple[Point, float]]:
+    """(midpoint, great-circle meters) of every piece of the path, pieces at most segment_meters long."""
+    pieces: List[Tuple[Point, float]] = []
+    for (lat1, lng1), (lat2, lng2) in zip(path, path[1:]):
+        meters = haversine_meters(lat1, lng1, lat2, lng2)
+        if meters == 0:
+            continue
+        parts = max(1, math.ceil(meters / segment_meters))
+        for part in range(parts):
+            t = (part + 0.5) / parts
+            midpoint = (lat1 + (lat2 - lat1) * t, lng1 + (lng2 - lng1) * t)
+            pieces.append((midpoint, meters / parts))
+    return pieces
+
+
+def local_hour(now: Optional[datetime] = None) -> int:
+    return (now or datetime.now(timezone.utc)).astimezone(ZoneInfo(settings.SHIFT_TIMEZONE)).hour
+
+
+class EtaModel:
+    """Reads the trained speed table and calibration factor from Redis."""
+
+    async def _speeds(self, fields: List[str]) -> Dict[str, float]:
+        if not fields:
+            return {}
+        redis = await redis_manager.get_redis()
+        values = await redis.hmget(MODEL_KEY, fields)
+        return {field: float(value) for field, value in zip(fields, values) if value}
+
+    async def calibration_factor(self) -> float:
+        try:
+            redis = await redis_manager.get_redis()
+            factor = await redis.hget(CALIBRATION_KEY, "factor")
+            return float(factor) if factor else 1.0
+        except Exception as e:
+            logger.warning(f"ETA calibration factor unavailable: {e}")
+            return 1.0
+
+    async def estimate_seconds(
+        self,
+        path: Sequence[Point],
+        *,
+        stops: int = 0,
+        hour: Optional[int] = None,
+        calibrated: bool = True,
+    ) -> float:
+        """Travel time along `path` plus ETA_STOP_DWELL_SECONDS for each of `stops` intermediate stops."""
+        hour = local_hour() if hour is None else hour
+        pieces = split_path(path)
+        cells = [geohash_encode(lat, lng, GEOHASH_PRECISION) for (lat, lng), _ in pieces]
+        wanted = list(dict.fromkeys(field for cell in cells for field in _fallback_fields(cell, hour)))
+        try:
+            speeds = await self._speeds(wanted)
+        except Exception as e:
+            logger.warning(f"ETA model lookup failed, using default speed: {e}")
+            speeds = {}
+
+        seconds = 0.0
+        for cell, (_, meters) in zip(cells, pieces):
+            speed = next(
+                (speeds[field] for field in _fallback_fields(cell, hour) if speeds.get(field)),
+                DEFAULT_SPEED_MPS,
+            )
+            seconds += meters * DEFAULT_DETOUR_FACTOR / speed
+        if calibrated:
+            seconds *= await self.calibration_factor()
+        metrics.inc("eta_model_estimate_total")
+        return seconds + stops * settings.ETA_STOP_DWELL_SECONDS
+
+    async def calibrate(self, model_seconds: float, google_seconds: float) -> Optional[float]:
+        """Blend one google/model ratio into the stored factor. Returns the new factor."""
+        if model_seconds <= 0 or google_seconds <= 0:
+            return None
+        ratio = min(max(google_seconds / model_seconds, CALIBRATION_BOUNDS[0]), CALIBRATION_BOUNDS[1])
+        current = await self.calibration_factor()
+        factor = round((1 - CALIBRATION_ALPHA) * current + CALIBRATION_ALPHA * ratio, 4)
+        redis = await redis_manager.get_redis()
+        await redis.hset(
+            CALIBRATION_KEY,
+            mapping={"factor": str(factor), "updated_ms": str(int(time.time() * 1000))},
+        )
+        metrics.inc("eta_model_calibration_total")
+        return factor
@@ -0,0 +1,135 @@
+"""
+Server-push ETAs.
+
+Every accepted location point calls eta_push.on_location(). At most once per
+ETA_PUSH_INTERVAL_SECONDS per bus (per worker in memory, across workers with a
+Redis SET NX PX), the bus's ETAs are recomputed in the background through
+BusEtaService and published on bus:{id}:eta. The bus WebSocket forwards them
+to parents as typed frames:
+
+    {"type": "eta", "bus_id": ..., "trip_status": "to_school" | "to_home",
+     "students": {student_id: minutes}, "computed_at": ISO-8601}
+
+Nothing is computed while nobody listens on the channel (and the geofence
+engine has no ETA-threshold fence pending for the bus), or while the driver
+has not selected a trip type. Computed ETAs are also handed to the geofence
+engine.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+from .geofence_service import geofence_engine
+
+logger = logging.getLogger(__name__)
+
+LAST_FRAME_TTL_SECONDS = 600
+
+
+def eta_channel(bus_id: str) -> str:
+    return f"bus:{bus_id}:eta"
+
+
+def last_eta_frame_key(bus_id: str) -> str:
+    return f"bus:{bus_id}:eta:last"
+
+
+def parent_eta_frame(frame: dict, student_ids: Iterable[str]) -> Optional[dict]:
+    """Narrow a bus-wide ETA frame to one parent's children; None when none of them is on it."""
+    etas: Dict[str, int] = frame.get("etas", {})
+    if frame.get("trip_status") == "to_school":
+        minutes = etas.get("school")
+        students = {student_id: minutes for student_id in student_ids} if minutes is not None else {}
+    else:
+        students = {student_id: etas[student_id] for student_id in student_ids if student_id in etas}
+    if not students:
+        return None
+    return {
+        "type": "eta",
+        "bus_id": frame.get("bus_id"),
+        "trip_status": frame.get("trip_status"),
+        "students": students,
+        "computed_at": frame.get("computed_at"),
+    }
+
+
+class EtaPushService:
+    def __init__(self, interval_seconds: Optional[float] = None):
+        self.interval_seconds = interval_seconds or settings.ETA_PUSH_INTERVAL_SECONDS
+        self._last_run: Dict[str, float] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def on_location(self, bus_id: str, latitude: float, longitude: float) -> bool:
+        """Schedule an ETA recompute for the bus unless one ran within the interval."""
+        if not settings.ETA_PUSH_ENABLED:
+            return False
+        now = time.monotonic()
+        last = self._last_run.get(bus_id)
+        if last is not None and now - last < self.interval_seconds:
+            metrics.inc("eta_push_throttled_total")
+            return False
+        self._last_run[bus_id] = now
+        task = asyncio.create_task(self._push(bus_id, (float(latitude), float(longitude))))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _push(self, bus_id: str, origin: Tuple[float, float]) -> None:
+        from ..database.database import AsyncSessionLocal
+        from .eta_service import BusEtaService
+
+        try:
+            redis = await redis_manager.get_redis()
+            channel = eta_channel(bus_id)
+            listeners = await redis.pubsub_numsub(channel)
+            has_listeners = bool(listeners and listeners[0][1])
+            if not has_listeners and not geofence_engine.wants_etas(bus_id):
+                return
+            claimed = await redis.set(
+                f"eta_push:{bus_id}", "1", nx=True, px=int(self.interval_seconds * 1000)
+            )
+            if not claimed:
+                metrics.inc("eta_push_throttled_total")
+                return
+            trip_type = await redis.get(f"bus:{bus_id}:trip_type")
+            if not trip_type:
+                return
+            trip_status = "to_school" if trip_type == "to_school" else "to_home"
+
+            async with AsyncSessionLocal() as db:
+                etas = await BusEtaService(db).compute_bus_etas(bus_id, origin, trip_status)
+            if not etas:
+                return
+            geofence_engine.on_etas(bus_id, etas)
+            if not has_listeners:
+                return
+            frame = json.dumps({
+                "type": "eta",
+                "bus_id": bus_id,
+                "trip_status": trip_status,
+                "etas": etas,
+                "computed_at": datetime.now(timezone.utc).isoformat(),
+            })
+            await redis.set(last_eta_frame_key(bus_id), frame, ex=LAST_FRAME_TTL_SECONDS)
+            await redis.publish(channel, frame)
+            metrics.inc("eta_push_frames_total")
+        except Exception:
+            logger.exception(f"ETA push failed for bus {bus_id}")
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        for task in list(self._tasks):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+eta_push = EtaPushService()
@@ -0,0 +1,365 @@
+"""
+Bus-level ETA engine.
+
+ETAs used to be one Directions call per (bus, student, trip_status). Here a
+bus position produces the ETAs of all its stops at once: a single Distance
+Matrix request (chunked by DISTANCE_MATRIX_MAX_DESTINATIONS) from the bus to
+every destination, stored in the hash bus:{id}:eta:{trip_status}. Parents are
+then served from that hash, so Google call volume follows buses, not students.
+
+The hash is recomputed lazily, when a parent asks and either the values are
+older than ETA_FRESH_SECONDS or the bus moved more than
+ETA_RECOMPUTE_DISTANCE_METERS since they were computed. A failed refresh keeps
+serving the previous values until the hash expires (ETA_STALE_SECONDS).
+
+to_school: every student's destination is the school (field "school").
+to_home: each assigned student's home (field = student id).
+
+With ETA_SOURCE=model (or no API key) the offline model in eta_model.py is
+the source instead: it estimates along the bus's planned stop order with no
+external call, and one single-element Distance Matrix request per bus every
+ETA_CALIBRATION_INTERVAL_SECONDS keeps its calibration factor honest.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.geo import haversine_meters
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+from ..core.single_flight import single_flight
+from ..database.models.bus import Bus as BusModel
+from ..database.models.school import School as SchoolModel
+from ..database.models.student import Student as StudentModel
+from ..database.models.student_bus_assignment import StudentBusAssignment
+from .eta_model import EtaModel
+from .route_progress_service import RouteProgressService
+from .route_service import route_plan_key
+
+logger = logging.getLogger(__name__)
+
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+DISTANCE_MATRIX_MAX_DESTINATIONS = 25
+
+SCHOOL_FIELD = "school"
+_META_FIELDS = ("_origin_lat", "_origin_lng", "_computed_ms")
+
+Point = Tuple[float, float]
+
+
+class BusEtaService:
+    """Per-bus ETA hash filled by one Distance Matrix call per bus position."""
+
+    ETA_FRESH_SECONDS = 120
+    ETA_STALE_SECONDS = 600
+    ETA_RECOMPUTE_DISTANCE_METERS = 200
+
+    def __init__(self, db: Optional[AsyncSession] = None):
+        self.db = db
+        self.api_key = settings.GOOGLE_MAPS_API_KEY
+        self.model = EtaModel()
+
+    @staticmethod
+    def _key(bus_id: str, trip_status: str) -> str:
+        return f"bus:{bus_id}:eta:{trip_status}"
+
+    @staticmethod
+    def _field(student, trip_status: str) -> str:
+        return SCHOOL_FIELD if trip_status == "to_school" else str(student.id)
+
+    def _is_fresh(self, snapshot: Dict[str, str], origin: Point) -> bool:
+        try:
+            age_ms = time.time() * 1000 - float(snapshot["_computed_ms"])
+            moved = haversine_meters(
+                float(snapshot["_origin_lat"]), float(snapshot["_origin_lng"]), origin[0], origin[1]
+            )
+        except (KeyError, ValueError):
+            return False
+        return age_ms <= self.ETA_FRESH_SECONDS * 1000 and moved <= self.ETA_RECOMPUTE_DISTANCE_METERS
+
+    async def _read(self, key: str) -> Dict[str, str]:
+        try:
+            redis = await redis_manager.get_redis()
+            return await redis.hgetall(key) or {}
+        except Exception as e:
+            logger.error(f"ETA hash lookup failed for {key}: {e}")
+            return {}
+
+    async def get_eta(self, bus_location, student, trip_status: str, destination: Point) -> Optional[int]:
+        """
+        Minutes from the bus to the student's destination (school or home).
+        `destination` is the caller's already validated target for this student;
+        it is used when the student is not part of the bus's stop list.
+        """
+        bus_id = str(bus_location.bus_id)
+        origin = (float(bus_location.latitude), float(bus_location.longitude))
+        if settings.ETA_SOURCE == "model" or not self.api_key:
+            return await self._model_eta(bus_id, origin, student, trip_status, destination)
+
+        key = self._key(bus_id, trip_status)
+        field = self._field(student, trip_status)
+
+        snapshot = await self._read(key)
+        if field in snapshot and self._is_fresh(snapshot, origin):
+            metrics.inc("eta_hash_hit_total")
+            return int(snapshot[field])
+
+        async def read_cached() -> Optional[Dict[str, str]]:
+            current = await self._read(key)
+            return current if self._is_fresh(current, origin) else None
+
+        async def refresh() -> Optional[Dict[str, str]]:
+            destinations = {**await self._destinations(bus_id, trip_status), field: destination}
+            return await self._refresh(bus_id, trip_status, origin, destinations)
+
+        # All parents of the bus that miss together trigger a single refresh.
+        refreshed = await single_flight.run(key, refresh, read_cached=read_cached)
+        if refreshed and field in refreshed:
+            return int(refreshed[field])
+        if field in snapshot:
+            logger.info(f"Returning stale ETA for student {student.id}")
+            return int(snapshot[field])
+        return None
+
+    async def compute_bus_etas(self, bus_id: str, origin: Point, trip_status: str) -> Dict[str, int]:
+        """
+        Minutes from `origin` to every destination of the bus, keyed like the
+        hash fields ("school" or student id). Used by the ingest-side ETA push;
+        a still-fresh hash is reused instead of calling Google again.
+        """
+        destinations = await self._destinations(bus_id, trip_status)
+        if trip_status == "to_school":
+            school = await self._school_destination(bus_id)
+            if school is not None:
+                destinations[SCHOOL_FIELD] = school
+        if not destinations:
+            return {}
+
+        if settings.ETA_SOURCE == "model" or not self.api_key:
+            if self.api_key:
+                await self._maybe_calibrate(bus_id, origin, next(iter(destinations.values())))
+            remaining = await self._remaining_plan_stops(bus_id, trip_status)
+            etas = {}
+            for field, destination in destinations.items():
+                path, stops = self._path_to(field, trip_status, origin, destination, remaining)
+                etas[field] = round(await self.model.estimate_seconds(path, stops=stops) / 60)
+            return etas
+
+        key = self._key(bus_id, trip_status)
+
+        async def read_cached() -> Optional[Dict[str, str]]:
+            current = await self._read(key)
+            return current if self._is_fresh(current, origin) else None
+
+        values = await read_cached()
+        if values is None:
+            values = await single_flight.run(
+                key,
+                lambda: self._refresh(bus_id, trip_status, origin, destinations),
+                read_cached=read_cached,
+            )
+        return {
+            field: int(minutes)
+            for field, minutes in (values or {}).items()
+            if field not in _META_FIELDS
+        }
+
+    # ─── Offline model ──────────────────────────────────────────────────────
+
+    async def _model_eta(
+        self,
+        bus_id: str,
+        origin: Point,
+        student,
+        trip_status: str,
+        destination: Point,
+    ) -> Optional[int]:
+        if self.api_key:
+            await self._maybe_calibrate(bus_id, origin, destination)
+        remaining = await self._remaining_plan_stops(bus_id, trip_status)
+        path, stops = self._path_to(self._field(student, trip_status), trip_status, origin, destination, remaining)
+        seconds = await self.model.estimate_seconds(path, stops=stops)
+        return round(seconds / 60)
+
+    async def _remaining_plan_stops(self, bus_id: str, trip_status: str) -> Optional[List[dict]]:
+        """Stops of the stored route plan not yet visited, in planned order; None without a plan."""
+        trip_type = "to_school" if trip_status == "to_school" else "from_school"
+        try:
+            raw = await redis_manager.get(route_plan_key(bus_id, trip_type))
+            plan = json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Route plan unavailable for ETA of bus {bus_id}: {e}")
+            plan = None
+        if not plan:
+            return None
+        visited = set(await RouteProgressService().get_visited(bus_id, trip_type))
+        return [stop for stop in plan.get("stops", []) if stop.get("student_id") not in visited]
+
+    @staticmethod
+    def _path_to(
+        field: str,
+        trip_status: str,
+        origin: Point,
+        destination: Point,
+        remaining: Optional[List[dict]],
+    ) -> Tuple[List[Point], int]:
+        """
+        Bus -> stops still ahead of the destination in the plan -> destination,
+        and the number of those intermediate stops. Without a plan (or when the
+        student is not on it) the bus drives straight there.
+        """
+        if not remaining:
+            return [origin, destination], 0
+        if trip_status != "to_school":
+            ids = [stop.get("student_id") for stop in remaining]
+            if field not in ids:
+                return [origin, destination], 0
+            remaining = remaining[:ids.index(field)]
+        waypoints = [(float(stop["latitude"]), float(stop["longitude"])) for stop in remaining]
+        return [origin, *waypoints, destination], len(waypoints)
+
+    async def _maybe_calibrate(self, bus_id: str, origin: Point, destination: Point) -> None:
+        """At most one Google answer per bus per interval, compared with the raw model on the same leg."""
+        try:
+            redis = await redis_manager.get_redis()
+            due = await redis.set(
+                f"eta_model:calibrate:{bus_id}", "1", nx=True, ex=settings.ETA_CALIBRATION_INTERVAL_SECONDS
+            )
+            if not due:
+                return
+            async with httpx.AsyncClient() as client:
+                durations = await self._fetch_matrix(client, origin, [destination])
+            if durations and durations[0]:
+                model_seconds = await self.model.estimate_seconds([origin, destination], calibrated=False)
+                factor = await self.model.calibrate(model_seconds, durations[0])
+                logger.info(f"ETA model calibrated on bus {bus_id}: factor={factor}")
+        except Exception as e:
+            logger.warning(f"ETA model calibration failed for bus {bus_id}: {e}")
+
+    # ─── Google Distance Matrix ─────────────────────────────────────────────
+
+    async def _destinations(self, bus_id: str, trip_status: str) -> Dict[str, Point]:
+        """Home of every assigned student with coordinates (to_home only)."""
+        if trip_status == "to_school" or self.db is None:
+            return {}
+        query = (
+            select(StudentModel.id, StudentModel.latitude, StudentModel.longitude)
+            .join(StudentBusAssignment, StudentBusAssignment.student_id == StudentModel.id)
+            .where(
+                StudentBusAssignment.bus_id == bus_id,
+                StudentModel.latitude.is_not(None),
+                StudentModel.longitude.is_not(None),
+            )
+        )
+        rows = (await self.db.execute(query)).all()
+        return {str(student_id): (float(lat), float(lng)) for student_id, lat, lng in rows}
+
+    async def _school_destination(self, bus_id: str) -> Optional[Point]:
+        if self.db is None:
+            return None
+        query = (
+            select(SchoolModel.latitude, SchoolModel.longitude)
+            .join(BusModel, BusModel.school_id == SchoolModel.id)
+            .where(BusModel.id == bus_id)
+        )
+        row = (await self.db.execute(query)).first()
+        if row is None or row[0] is None or row[1] is None:
+            return None
+        return (float(row[0]), float(row[1]))
+
+    async def _refresh(
+        self,
+        bus_id: str,
+        trip_status: str,
+        origin: Point,
+        destinations: Dict[str, Point],
+    ) -> Optional[Dict[str, str]]:
+        """Compute every destination's ETA from `origin` and store them in the bus hash."""
+        fields = list(destinations)
+        chunks = [
+            fields[start:start + DISTANCE_MATRIX_MAX_DESTINATIONS]
+            for start in range(0, len(fields), DISTANCE_MATRIX_MAX_DESTINATIONS)
+        ]
+        try:
+            async with httpx.AsyncClient() as client:
+                results = await asyncio.gather(
+                    *(self._fetch_matrix(client, origin, [destinations[f] for f in chunk]) for chunk in chunks)
+                )
+        except Exception as e:
+            logger.error(f"Failed to calculate ETAs for bus {bus_id}: {str(e)}")
+            return None
+
+        values: Dict[str, str] = {}
+        for chunk, durations in zip(chunks, results):
+            for field, seconds in zip(chunk, durations):
+                if seconds is not None:
+                    values[field] = str(round(seconds / 60))
+        if not values:
+            return None
+
+        values.update({
+            "_origin_lat": str(origin[0]),
+            "_origin_lng": str(origin[1]),
+            "_computed_ms": str(int(time.time() * 1000)),
+        })
+        metrics.inc("eta_bus_refresh_total")
+        logger.info(
+            f"ETAs refreshed for bus {bus_id} ({trip_status}): "
+            f"{len(values) - len(_META_FIELDS)} destination(s), {len(chunks)} matrix call(s)"
+        )
+        try:
+            redis = await redis_manager.get_redis()
+            async with redis.pipeline(transaction=True) as pipe:
+                # Replace, not merge: a destination whose element failed this round must
+                # not keep its old minutes under the new _computed_ms / _origin_*.
+                pipe.delete(self._key(bus_id, trip_status))
+                pipe.hset(self._key(bus_id, trip_status), mapping=values)
+                pipe.expire(self._key(bus_id, trip_status), self.ETA_STALE_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to store ETAs for bus {bus_id}: {e}")
+        return values
+
+    async def _fetch_matrix(
+        self,
+        client: httpx.AsyncClient,
+        origin: Point,
+        destinations: List[Point],
+    ) -> List[Optional[int]]:
+        """Driving seconds (traffic-aware when available) to each destination; None per failed element."""
+        metrics.inc("eta_matrix_calls_total")
+        params = {
+            "origins": f"{origin[0]},{origin[1]}",
+            "destinations": "|".join(f"{lat},{lng}" for lat, lng in destinations),
+            "mode": "driving",
+            "departure_time": "now",
+            "key": self.api_key,
+        }
+        response = await client.get(
+            DISTANCE_MATRIX_URL,
+            params=params,
+            timeout=httpx.Timeout(5.0, connect=2.0),
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Distance Matrix API error: {response.status_code} - {response.text}")
+        result = response.json()
+        if result.get("status") != "OK":
+            raise RuntimeError(
+                f"Distance Matrix API returned status: {result.get('status')} - {result.get('error_message', '')}"
+            )
+        elements = (result.get("rows") or [{}])[0].get("elements", [])
+        durations: List[Optional[int]] = []
+        for element in elements:
+            if element.get("status") != "OK":
+                durations.append(None)
+                continue
+            duration = element.get("duration_in_traffic") or element.get("duration") or {}
+            durations.append(duration.get("value"))
+        return durations
@@ -0,0 +1,433 @@
+"""
+Geofence engine on the driver location path.
+
+For each bus with an active trip session, the remaining student homes (and the
+school on to_school trips) are loaded once into a uniform grid over a local
+metric projection, with cells as large as the largest fence radius. A location
+point then checks only the 3x3 cells around it: a few dict lookups and
+haversines, no DB query, no await.
+
+to_school:   home approach -> evden_alim_eta, school arrival -> okula_varis
+from_school: home approach -> eve_varis_eta,  home arrival   -> eve_birakildi
+
+Approach fences fire at GEOFENCE_APPROACH_RADIUS_METERS, or earlier when the
+pushed bus ETAs (eta_push_service) drop to GEOFENCE_APPROACH_ETA_MINUTES.
+Arrival fences fire at GEOFENCE_ARRIVAL_RADIUS_METERS. Each fence fires once
+per trip session: it leaves the local index on the first hit, and each
+recipient student is claimed with SADD to geofence:fired:{session_id}:{fence}
+before their parents are notified, so neither a retry nor another worker
+notifies them twice. Once every recipient is done the fence joins
+geofence:fired:{session_id}. A failed send releases its claim and the fence
+is re-armed after FIRE_RETRY_BASE_SECONDS, doubling per attempt; after
+FIRE_MAX_ATTEMPTS it is given up for the session. Fence sets are reloaded
+every RELOAD_SECONDS so assignment and visit changes are picked up.
+
+Dwell detection uses the same per-bus state: a second index holds the
+remaining (not boarded, not visited) stops with DWELL_RADIUS_METERS. When
+consecutive points stay within the radius of the same stop for DWELL_SECONDS
+(and none reports a speed above DWELL_MAX_SPEED_KMH), the stop is marked
+provisionally visited in RouteProgressService. The next route read derives
+the shortened route from the stored plan, and the driver no longer has to tap
+it. Dwell timers live in the worker that receives the bus's points.
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from ..core.geo import haversine_meters
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+from ..database.models.notification import NotificationType
+
+logger = logging.getLogger(__name__)
+
+METERS_PER_DEGREE = 111320.0
+FIRED_TTL_SECONDS = 2 * 24 * 60 * 60
+FIRE_MAX_ATTEMPTS = 5
+FIRE_RETRY_BASE_SECONDS = 15
+SCHOOL_FENCE = "school"
+
+
+@dataclass(frozen=True)
+class Geofence:
+    fence_id: str
+    latitude: float
+    longitude: float
+    radius_m: float
+    notification_type: Optional[NotificationType]  # None: dwell stop
+    student_id: Optional[str] = None  # None: school fence, notifies every boarded student's parents
+    eta_threshold_minutes: Optional[float] = None
+
+
+class GeofenceIndex:
+    """Uniform grid of fences; hits() only looks at the 3x3 cells around a point."""
+
+    def __init__(self, fences: Iterable[Geofence]):
+        fences = list(fences)
+        ref_lat = sum(f.latitude for f in fences) / len(fences) if fences else 0.0
+        self._lng_scale = METERS_PER_DEGREE * max(math.cos(math.radians(ref_lat)), 0.01)
+        self.cell_m = max((f.radius_m for f in fences), default=1.0) or 1.0
+        self._cells: Dict[Tuple[int, int], List[Geofence]] = {}
+        self._fences: Dict[str, Geofence] = {}
+        for fence in fences:
+            self._fences[fence.fence_id] = fence
+            self._cells.setdefault(self._cell(fence.latitude, fence.longitude), []).append(fence)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (
+            math.floor(lat * METERS_PER_DEGREE / self.cell_m),
+            math.floor(lng * self._lng_scale / self.cell_m),
+        )
+
+    def __len__(self) -> int:
+        return len(self._fences)
+
+    def pending(self) -> List[Geofence]:
+        return list(self._fences.values())
+
+    def hits(self, lat: float, lng: float) -> List[Tuple[Geofence, float]]:
+        """Fences whose radius contains the point, with the distance in meters."""
+        row, col = self._cell(lat, lng)
+        found = []
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                for fence in self._cells.get((row + d_row, col + d_col), ()):
+                    distance = haversine_meters(lat, lng, fence.latitude, fence.longitude)
+                    if distance <= fence.radius_m:
+                        found.append((fence, distance))
+        return found
+
+    def remove(self, fence_id: str) -> Optional[Geofence]:
+        fence = self._fences.pop(fence_id, None)
+        if fence is not None:
+            cell = self._cells.get(self._cell(fence.latitude, fence.longitude), [])
+            cell.remove(fence)
+        return fence
+
+    def add(self, fence: Geofence) -> None:
+        """Put a removed fence back (e.g. its notification failed and must be retried)."""
+        if fence.fence_id in self._fences:
+            return
+        self._fences[fence.fence_id] = fence
+        self._cells.setdefault(self._cell(fence.latitude, fence.longitude), []).append(fence)
+
+
+def build_trip_fences(
+    trip_type: str,
+    homes: Dict[str, Tuple[float, float]],
+    school: Optional[Tuple[float, float]],
+) -> List[Geofence]:
+    approach = settings.GEOFENCE_APPROACH_RADIUS_METERS
+    arrival = settings.GEOFENCE_ARRIVAL_RADIUS_METERS
+    eta_threshold = settings.GEOFENCE_APPROACH_ETA_MINUTES
+    fences: List[Geofence] = []
+    if trip_type == "to_school":
+        for student_id, (lat, lng) in homes.items():
+            fences.append(Geofence(
+                f"approach:{student_id}", lat, lng, approach, NotificationType.evden_alim_eta, student_id, eta_threshold
+            ))
+        if school is not None:
+            fences.append(Geofence(f"arrival:{SCHOOL_FENCE}", school[0], school[1], arrival, NotificationType.okula_varis))
+    else:
+        for student_id, (lat, lng) in homes.items():
+            fences.append(Geofence(
+                f"approach:{student_id}", lat, lng, approach, NotificationType.eve_varis_eta, student_id, eta_threshold
+            ))
+            fences.append(Geofence(
+                f"arrival:{student_id}", lat, lng, arrival, NotificationType.eve_birakildi, student_id
+            ))
+    return fences
+
+
+def build_stop_fences(homes: Dict[str, Tuple[float, float]]) -> List[Geofence]:
+    radius = settings.DWELL_RADIUS_METERS
+    return [
+        Geofence(f"stop:{student_id}", lat, lng, radius, None, student_id)
+        for student_id, (lat, lng) in homes.items()
+    ]
+
+
+def _minutes_from_distance(distance_m: float, speed_kmh: Optional[float]) -> int:
+    from .eta_model import DEFAULT_DETOUR_FACTOR, DEFAULT_SPEED_MPS, MIN_SPEED_KMH
+
+    speed_mps = speed_kmh / 3.6 if speed_kmh and speed_kmh >= MIN_SPEED_KMH else DEFAULT_SPEED_MPS
+    return max(1, round(distance_m * DEFAULT_DETOUR_FACTOR / speed_mps / 60))
+
+
+@dataclass
+class _BusFences:
+    session_id: str
+    trip_type: str
+    index: GeofenceIndex
+    loaded_at: float
+    stops: GeofenceIndex = field(default_factory=lambda: GeofenceIndex([]))
+    dwell: Optional[Tuple[str, float]] = None  # (stop fence_id, first point inside)
+    retries: Dict[str, Tuple[int, float]] = field(default_factory=dict)  # fence_id -> (failed attempts, retry at)
+
+
+class GeofenceEngine:
+    RELOAD_SECONDS = 300
+
+    def __init__(self):
+        self._buses: Dict[str, _BusFences] = {}
+        self._loading: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _fire_all(self, bus_id: str, state: _BusFences, fired: List[Tuple[Geofence, Optional[int]]]) -> int:
+        """Spawn the notifications of the hit fences, except those waiting out a retry backoff."""
+        now = time.monotonic()
+        spawned = 0
+        for fence, eta_minutes in fired:
+            retry = state.retries.get(fence.fence_id)
+            if retry is not None and now < retry[1]:
+                continue
+            state.index.remove(fence.fence_id)
+            self._spawn(self._fire(bus_id, state, fence, eta_minutes))
+            spawned += 1
+        return spawned
+
+    def on_location(self, bus_id: str, latitude: float, longitude: float, speed: Optional[float] = None) -> int:
+        """Check one point against the bus's fences and stops. Returns how many fired; never blocks."""
+        if not (settings.GEOFENCE_ENABLED or settings.DWELL_DETECTION_ENABLED):
+            return 0
+        state = self._buses.get(bus_id)
+        if (state is None or time.monotonic() - state.loaded_at > self.RELOAD_SECONDS) and bus_id not in self._loading:
+            self._loading.add(bus_id)
+            self._spawn(self._load(bus_id))
+        if state is None:
+            return 0
+        metrics.inc("geofence_points_total")
+        latitude, longitude = float(latitude), float(longitude)
+        fired = 0
+        if settings.GEOFENCE_ENABLED:
+            hits = state.index.hits(latitude, longitude)
+            fired += self._fire_all(bus_id, state, [
+                (fence, _minutes_from_distance(distance, speed) if fence.eta_threshold_minutes is not None else None)
+                for fence, distance in hits
+            ])
+        if settings.DWELL_DETECTION_ENABLED:
+            fired += self._check_dwell(bus_id, state, latitude, longitude, speed)
+        return fired
+
+    def _check_dwell(
+        self, bus_id: str, state: _BusFences, latitude: float, longitude: float, speed: Optional[float]
+    ) -> int:
+        if speed is not None and speed > settings.DWELL_MAX_SPEED_KMH:
+            state.dwell = None
+            return 0
+        hits = state.stops.hits(latitude, longitude)
+        if not hits:
+            state.dwell = None
+            return 0
+        stop, _ = min(hits, key=lambda hit: hit[1])
+        now = time.monotonic()
+        if state.dwell is None or state.dwell[0] != stop.fence_id:
+            state.dwell = (stop.fence_id, now)
+            return 0
+        if now - state.dwell[1] < settings.DWELL_SECONDS:
+            return 0
+        state.stops.remove(stop.fence_id)
+        state.dwell = None
+        self._spawn(self._mark_visited(bus_id, state, stop.student_id))
+        return 1
+
+    def nearest_stop_meters(self, bus_id: str, latitude: float, longitude: float) -> Optional[float]:
+        """Distance to the closest remaining stop or fence point; None when unknown or none left."""
+        state = self._buses.get(bus_id)
+        if state is None:
+            return None
+        points = state.stops.pending() + state.index.pending()
+        if not points:
+            return None
+        return min(haversine_meters(latitude, longitude, f.latitude, f.longitude) for f in points)
+
+    def wants_etas(self, bus_id: str) -> bool:
+        state = self._buses.get(bus_id)
+        return state is not None and any(f.eta_threshold_minutes is not None for f in state.index.pending())
+
+    def on_etas(self, bus_id: str, etas: Dict[str, int]) -> int:
+        """Fire approach fences whose bus ETA (from the ETA push) fell under their threshold."""
+        state = self._buses.get(bus_id)
+        if state is None:
+            return 0
+        fired = []
+        for fence in state.index.pending():
+            if fence.eta_threshold_minutes is None:
+                continue
+            minutes = etas.get(fence.student_id or SCHOOL_FENCE)
+            if minutes is not None and minutes <= fence.eta_threshold_minutes:
+                fired.append((fence, minutes))
+        return self._fire_all(bus_id, state, fired)
+
+    async def _load(self, bus_id: str) -> None:
+        from sqlalchemy import select
+
+        from ..database.database import AsyncSessionLocal
+        from ..database.models.bus import Bus
+        from ..database.models.school import School
+        from ..database.models.student import Student
+        from ..database.models.student_bus_assignment import StudentBusAssignment
+        from .route_progress_service import RouteProgressService
+        from .trip_session_service import TripSessionService
+
+        try:
+            redis = await redis_manager.get_redis()
+            trip_type = await redis.get(f"bus:{bus_id}:trip_type")
+            if trip_type not in ("to_school", "from_school"):
+                self._buses.pop(bus_id, None)
+                return
+            async with AsyncSessionLocal() as db:
+                sessions = TripSessionService(db)
+                session = await sessions.get_existing_session(bus_id, trip_type)
+                if session is None:
+                    self._buses.pop(bus_id, None)
+                    return
+                completed = set(await sessions.get_route_completed_student_ids(bus_id, trip_type))
+                rows = (await db.execute(
+                    select(Student.id, Student.latitude, Student.longitude)
+                    .join(StudentBusAssignment, StudentBusAssignment.student_id == Student.id)
+                    .where(
+                        StudentBusAssignment.bus_id == bus_id,
+                        Student.latitude.is_not(None),
+                        Student.longitude.is_not(None),
+                    )
+                )).all()
+                school_row = (await db.execute(
+                    select(School.latitude, School.longitude)
+                    .join(Bus, Bus.school_id == School.id)
+                    .where(Bus.id == bus_id)
+                )).first()
+
+            homes = {
+                str(student_id): (float(lat), float(lng))
+                for student_id, lat, lng in rows
+                if str(student_id) not in completed
+            }
+            school = (
+                (float(school_row[0]), float(school_row[1]))
+                if school_row is not None and school_row[0] is not None and school_row[1] is not None
+                else None
+            )
+            already_fired = await redis.smembers(self._fired_key(session.id))
+            fences = [f for f in build_trip_fences(trip_type, homes, school) if f.fence_id not in already_fired]
+            visited = set(await RouteProgressService().get_visited(bus_id, trip_type))
+            stops = build_stop_fences({
+                student_id: home for student_id, home in homes.items() if student_id not in visited
+            })
+            previous = self._buses.get(bus_id)
+            same_session = previous is not None and previous.session_id == session.id
+            self._buses[bus_id] = _BusFences(
+                session_id=session.id,
+                trip_type=trip_type,
+                index=GeofenceIndex(fences),
+                loaded_at=time.monotonic(),
+                stops=GeofenceIndex(stops),
+                dwell=previous.dwell if same_session else None,
+                retries=previous.retries if same_session else {},
+            )
+            metrics.set_gauge("geofence_buses", len(self._buses))
+        except Exception:
+            logger.exception(f"Geofence load failed for bus {bus_id}")
+        finally:
+            self._loading.discard(bus_id)
+
+    @staticmethod
+    def _fired_key(session_id: str) -> str:
+        return f"geofence:fired:{session_id}"
+
+    async def _fire(self, bus_id: str, state: _BusFences, fence: Geofence, eta_minutes: Optional[int]) -> None:
+        from ..database.database import AsyncSessionLocal
+        from .notification_service import NotificationService
+        from .trip_session_service import TripSessionService
+
+        key = self._fired_key(state.session_id)
+        sent_key = f"{key}:{fence.fence_id}"
+        try:
+            redis = await redis_manager.get_redis()
+            if await redis.sismember(key, fence.fence_id):
+                return  # Another worker finished it for this session
+
+            async with AsyncSessionLocal() as db:
+                if fence.student_id is not None:
+                    student_ids = [fence.student_id]
+                else:
+                    # Arrival at school: parents of the students who boarded on this trip
+                    student_ids = await TripSessionService(db).get_route_completed_student_ids(bus_id, state.trip_type)
+                service = NotificationService(db)
+                for student_id in student_ids:
+                    # Claim the recipient first: a retry or another worker skips parents already notified
+                    if not await redis.sadd(sent_key, student_id):
+                        continue
+                    await redis.expire(sent_key, FIRED_TTL_SECONDS)
+                    try:
+                        await service.notify_parents_of_student(
+                            student_id,
+                            fence.notification_type,
+                            sender_user=None,
+                            eta_minutes=eta_minutes or 0,
+                        )
+                    except Exception:
+                        await redis.srem(sent_key, student_id)
+                        raise
+            await self._mark_fired(redis, key, fence.fence_id)
+            state.retries.pop(fence.fence_id, None)
+            metrics.inc("geofence_fired_total")
+            logger.info(f"Geofence {fence.fence_id} fired for bus {bus_id} ({fence.notification_type.value})")
+        except Exception:
+            metrics.inc("geofence_fire_failed_total")
+            attempts = state.retries.get(fence.fence_id, (0, 0.0))[0] + 1
+            if attempts >= FIRE_MAX_ATTEMPTS:
+                logger.exception(
+                    f"Geofence {fence.fence_id} notification failed for bus {bus_id} "
+                    f"{attempts} times; giving up for session {state.session_id}"
+                )
+                metrics.inc("geofence_fire_abandoned_total")
+                state.retries.pop(fence.fence_id, None)
+                try:
+                    await self._mark_fired(await redis_manager.get_redis(), key, fence.fence_id)
+                except Exception:
+                    logger.exception(f"Marking geofence {fence.fence_id} as given up failed")
+                return
+            delay = FIRE_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+            logger.exception(
+                f"Geofence {fence.fence_id} notification failed for bus {bus_id}; retry {attempts} in {delay}s"
+            )
+            # Re-arm the fence; _fire_all holds it back until the backoff has passed
+            state.retries[fence.fence_id] = (attempts, time.monotonic() + delay)
+            state.index.add(fence)
+
+    @staticmethod
+    async def _mark_fired(redis, key: str, fence_id: str) -> None:
+        await redis.sadd(key, fence_id)
+        await redis.expire(key, FIRED_TTL_SECONDS)
+
+    async def _mark_visited(self, bus_id: str, state: _BusFences, student_id: str) -> None:
+        from .route_progress_service import RouteProgressService
+
+        try:
+            if await RouteProgressService().add_provisional(bus_id, state.trip_type, student_id):
+                metrics.inc("dwell_auto_visited_total")
+                logger.info(f"Dwell: student {student_id} provisionally visited by bus {bus_id}")
+        except Exception:
+            logger.exception(f"Dwell visit mark failed for bus {bus_id}, student {student_id}")
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        for task in list(self._tasks):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+geofence_engine = GeofenceEngine()
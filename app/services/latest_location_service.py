@@ -0,0 +1,171 @@
+"""
+Latest bus position store.
+
+The ingest path records every accepted point into a per-bus Redis hash
+(bus:{id}:latest), so "where is the bus now" is a single HGETALL instead of an
+ORDER BY timestamp DESC over bus_locations. A miss (cold cache, evicted key)
+falls back to the history table once and backfills the hash.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.redis import redis_manager
+from ..database.models.bus_location import BusLocation
+
+logger = logging.getLogger(__name__)
+
+# Only overwrite the hash when the incoming point is not older than the stored
+# one; late/offline uploads must not move the bus backwards.
+_RECORD_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'ts_ms')
+if current and tonumber(current) > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'ts_ms', ARGV[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def _to_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _epoch_ms(value: datetime) -> int:
+    aware = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return int(aware.timestamp() * 1000)
+
+
+class LatestLocationService:
+    """Read-through latest position per bus, backed by a Redis hash."""
+
+    def __init__(self, db: Optional[AsyncSession] = None):
+        self.db = db
+        self.ttl_seconds = settings.LATEST_LOCATION_TTL_SECONDS
+
+    @staticmethod
+    def _key(bus_id: str) -> str:
+        return f"bus:{bus_id}:latest"
+
+    @staticmethod
+    def _to_fields(point) -> Dict[str, str]:
+        """Flatten a location dict or BusLocation row into hash fields."""
+        get = point.get if isinstance(point, dict) else lambda name: getattr(point, name, None)
+        speed = get("speed")
+        return {
+            "id": str(get("id") or ""),
+            "bus_id": str(get("bus_id")),
+            "latitude": str(float(get("latitude"))),
+            "longitude": str(float(get("longitude"))),
+            "speed": "" if speed is None else str(float(speed)),
+            "timestamp": _to_naive_utc(get("timestamp")).isoformat(),
+        }
+
+    @staticmethod
+    def _from_fields(fields: Dict[str, str]) -> Optional[BusLocation]:
+        """Build a transient (session-less) BusLocation from hash fields."""
+        if not fields or "latitude" not in fields:
+            return None
+        try:
+            speed = fields.get("speed")
+            return BusLocation(
+                id=fields.get("id", ""),
+                bus_id=fields["bus_id"],
+                latitude=float(fields["latitude"]),
+                longitude=float(fields["longitude"]),
+                speed=float(speed) if speed not in (None, "") else None,
+                timestamp=datetime.fromisoformat(fields["timestamp"]),
+            )
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Malformed latest location hash for bus {fields.get('bus_id')}: {e}")
+            return None
+
+    async def record(self, point) -> bool:
+        """
+        Store a point as the bus's latest position. Returns False when a newer
+        point is already stored.
+        """
+        fields = self._to_fields(point)
+        flat: List[str] = []
+        for name, value in fields.items():
+            flat.extend((name, value))
+        redis = await redis_manager.get_redis()
+        stored = await redis.eval(
+            _RECORD_SCRIPT,
+            1,
+            self._key(fields["bus_id"]),
+            _epoch_ms(datetime.fromisoformat(fields["timestamp"])),
+            self.ttl_seconds,
+            *flat,
+        )
+        return bool(stored)
+
+    async def get(self, bus_id: str) -> Optional[BusLocation]:
+        try:
+            redis = await redis_manager.get_redis()
+            cached = self._from_fields(await redis.hgetall(self._key(bus_id)))
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.error(f"Latest location lookup failed for bus {bus_id}: {e}")
+
+        if self.db is None:
+            return None
+        query = (
+            select(BusLocation)
+            .where(BusLocation.bus_id == bus_id)
+            .order_by(BusLocation.timestamp.desc())
+            .limit(1)
+        )
+        latest = (await self.db.execute(query)).scalar_one_or_none()
+        if latest is not None:
+            await self._backfill([latest])
+        return latest
+
+    async def get_many(self, bus_ids: Iterable[str]) -> Dict[str, BusLocation]:
+        """Latest position for each bus that has one, in a single pipeline round trip."""
+        bus_ids = list(dict.fromkeys(bus_ids))
+        if not bus_ids:
+            return {}
+
+        found: Dict[str, BusLocation] = {}
+        try:
+            redis = await redis_manager.get_redis()
+            async with redis.pipeline(transaction=False) as pipe:
+                for bus_id in bus_ids:
+                    pipe.hgetall(self._key(bus_id))
+                rows = await pipe.execute()
+            for bus_id, fields in zip(bus_ids, rows):
+                location = self._from_fields(fields)
+                if location is not None:
+                    found[bus_id] = location
+        except Exception as e:
+            logger.error(f"Latest location pipeline failed: {e}")
+
+        missing = [bus_id for bus_id in bus_ids if bus_id not in found]
+        if missing and self.db is not None:
+            query = (
+                select(BusLocation)
+                .where(BusLocation.bus_id.in_(missing))
+                .distinct(BusLocation.bus_id)
+                .order_by(BusLocation.bus_id, BusLocation.timestamp.desc())
+            )
+            loaded = (await self.db.execute(query)).scalars().all()
+            for location in loaded:
+                found[location.bus_id] = location
+            await self._backfill(loaded)
+        return found
+
+    async def _backfill(self, locations: Iterable[BusLocation]) -> None:
+        for location in locations:
+            try:
+                await self.record(location)
+            except Exception as e:
+                logger.warning(f"Latest location backfill failed for bus {location.bus_id}: {e}")
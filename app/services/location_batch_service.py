@@ -0,0 +1,170 @@
+"""
+Offline-sync batch upload of driver fixes.
+
+Drivers that lose connectivity buffer fixes on the device and upload them in
+one request after reconnecting, instead of replaying them one WebSocket
+message at a time. The body is column-wise (LocationBatchUpload), so a batch
+of thousands of fixes is validated with numpy rather than per point:
+
+  rejected    non-finite or out-of-range coordinates or speed, a fix older
+              than LOCATION_BATCH_MAX_AGE_HOURS, or one more than
+              LOCATION_BATCH_MAX_CLOCK_SKEW_SECONDS in the future
+  duplicates  a repeated (bus, client timestamp), within the batch or already
+              in bus_locations (millisecond precision), e.g. a retried upload
+
+The remaining fixes are written with one COPY (or one executemany INSERT when
+LOCATION_WRITE_METHOD is not "copy"). The existing-row check and the write
+share a transaction that holds a per-bus advisory lock, so two concurrent
+retries of the same batch cannot both insert it.
+
+Uploaded fixes are history and never go to the live channel. Nothing is
+published to bus:{id}:location, and ETA, geofence and trail are not fed.
+Only bus:{id}:latest is offered the newest fix, and its record script
+ignores it when a live point is already newer.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import insert, text
+
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..database.schemas.bus_location import LocationBatchResult, LocationBatchUpload
+from .latest_location_service import LatestLocationService
+
+logger = logging.getLogger(__name__)
+
+MAX_SPEED_KMH = 300  # Same bound as the WebSocket validator
+
+_EXISTING_SQL = """
+SELECT timestamp FROM bus_locations
+WHERE bus_id = :bus_id AND timestamp >= :start AND timestamp < :end
+"""
+
+
+@dataclass
+class PreparedBatch:
+    """Valid, in-batch unique fixes sorted by time, plus what was dropped."""
+    timestamps: np.ndarray  # datetime64[ms], naive UTC
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    speeds: np.ndarray  # NaN = not reported
+    rejected: int
+    duplicates: int
+
+
+def prepare_batch(upload: LocationBatchUpload, now: Optional[datetime] = None) -> PreparedBatch:
+    now = now or datetime.now(timezone.utc)
+    now_ms = int(now.timestamp() * 1000)
+    timestamps = np.asarray(upload.timestamps, dtype=np.int64)
+    latitudes = np.asarray(upload.latitudes, dtype=np.float64)
+    longitudes = np.asarray(upload.longitudes, dtype=np.float64)
+    speeds = (
+        np.asarray([np.nan if speed is None else speed for speed in upload.speeds], dtype=np.float64)
+        if upload.speeds is not None
+        else np.full(len(timestamps), np.nan)
+    )
+
+    valid = (
+        np.isfinite(latitudes) & (np.abs(latitudes) <= 90)
+        & np.isfinite(longitudes) & (np.abs(longitudes) <= 180)
+        & (np.isnan(speeds) | ((speeds >= 0) & (speeds <= MAX_SPEED_KMH)))
+        & (timestamps >= now_ms - settings.LOCATION_BATCH_MAX_AGE_HOURS * 3_600_000)
+        & (timestamps <= now_ms + settings.LOCATION_BATCH_MAX_CLOCK_SKEW_SECONDS * 1000)
+    )
+    candidates = np.flatnonzero(valid)
+    # np.unique sorts by time and keeps the first fix sent for each timestamp
+    _, first = np.unique(timestamps[candidates], return_index=True)
+    keep = candidates[first]
+    return PreparedBatch(
+        timestamps=timestamps[keep].astype("datetime64[ms]"),
+        latitudes=latitudes[keep],
+        longitudes=longitudes[keep],
+        speeds=speeds[keep],
+        rejected=int(len(timestamps) - len(candidates)),
+        duplicates=int(len(candidates) - len(keep)),
+    )
+
+
+def new_fixes(timestamps: np.ndarray, existing: List[datetime]) -> np.ndarray:
+    """Mask of timestamps (datetime64[ms]) not already stored for the bus."""
+    if not existing:
+        return np.ones(len(timestamps), dtype=bool)
+    return ~np.isin(timestamps, np.asarray(existing, dtype="datetime64[ms]"))
+
+
+def _points(bus_id: str, batch: PreparedBatch, mask: np.ndarray) -> List[dict]:
+    return [
+        {
+            "bus_id": bus_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "speed": None if np.isnan(speed) else speed,
+            "timestamp": timestamp,
+        }
+        for timestamp, latitude, longitude, speed in zip(
+            batch.timestamps[mask].astype("datetime64[us]").tolist(),
+            batch.latitudes[mask].tolist(),
+            batch.longitudes[mask].tolist(),
+            batch.speeds[mask].tolist(),
+        )
+    ]
+
+
+async def _write(bus_id: str, batch: PreparedBatch) -> List[dict]:
+    """Dedupe against bus_locations and bulk-insert the rest in one locked transaction."""
+    from ..database.database import engine
+    from ..database.models.bus_location import BusLocation
+    from ..tasks.location_writer import _COPY_COLUMNS, _location_records
+
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"bus_locations:{bus_id}"})
+        existing = (await conn.execute(text(_EXISTING_SQL), {
+            "bus_id": bus_id,
+            "start": batch.timestamps[0].astype("datetime64[us]").item(),
+            "end": (batch.timestamps[-1] + np.timedelta64(1, "ms")).astype("datetime64[us]").item(),
+        })).scalars().all()
+        points = _points(bus_id, batch, new_fixes(batch.timestamps, existing))
+        if not points:
+            return points
+        records = _location_records(points)
+        if settings.LOCATION_WRITE_METHOD == "copy":
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                "bus_locations",
+                records=records,
+                columns=_COPY_COLUMNS,
+            )
+        else:
+            await conn.execute(insert(BusLocation.__table__), [dict(zip(_COPY_COLUMNS, record)) for record in records])
+    return points
+
+
+async def upload_location_batch(bus_id: str, upload: LocationBatchUpload) -> LocationBatchResult:
+    batch = prepare_batch(upload)
+    points = await _write(bus_id, batch) if len(batch.timestamps) else []
+    duplicates = batch.duplicates + len(batch.timestamps) - len(points)
+
+    if points:
+        try:
+            await LatestLocationService().record(points[-1])
+        except Exception as e:
+            logger.warning(f"Latest location update after batch upload failed for bus {bus_id}: {e}")
+
+    metrics.inc("location_batch_uploads_total")
+    metrics.inc("location_batch_points_accepted_total", len(points))
+    metrics.inc("location_batch_points_duplicate_total", duplicates)
+    metrics.inc("location_batch_points_rejected_total", batch.rejected)
+    logger.info(
+        f"Batch upload for bus {bus_id}: {len(upload.timestamps)} received, {len(points)} accepted, "
+        f"{duplicates} duplicate, {batch.rejected} rejected."
+    )
+    return LocationBatchResult(
+        received=len(upload.timestamps),
+        accepted=len(points),
+        duplicates=duplicates,
+        rejected=batch.rejected,
+    )
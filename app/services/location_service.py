@@ -107,6 +107,17 @@ class LocationService:
             
         return False
 
+    async def get_parent_student_ids_on_bus(self, parent_id: str, bus_id: str) -> list[str]:
+        stmt = select(models.StudentBusAssignment.student_id).join(
+            models.ParentStudentRelation,
+            models.ParentStudentRelation.student_id == models.StudentBusAssignment.student_id
+        ).where(
+            models.ParentStudentRelation.parent_id == parent_id,
+            models.StudentBusAssignment.bus_id == bus_id
+        )
+        result = await self.db.execute(stmt)
+        return [str(student_id) for student_id in result.scalars().all()]
+
     async def get_driver_bus(self, driver_id: str) -> models.Bus | None:
         query = select(models.Bus).where(models.Bus.current_driver_id == driver_id)
         result = await self.db.execute(query)
@@ -297,11 +297,14 @@ class NotificationService:
         self,
         student_id: str,
         notification_type: NotificationType,
-        sender_user: UserSchema,
+        sender_user: Optional[UserSchema],
         eta_minutes: int = 0,
     ) -> List[NotificationModel]:
-        """Bir öğrencinin tüm velilerine bildirim gönder."""
-        if not await self._is_student_in_user_scope(sender_user, student_id):
+        """
+        Bir öğrencinin tüm velilerine bildirim gönder.
+        sender_user=None: sistem bildirimi (ör. geofence), kapsam kontrolü yapılmaz.
+        """
+        if sender_user is not None and not await self._is_student_in_user_scope(sender_user, student_id):
             raise HTTPException(status_code=403, detail="Student is out of your tenant scope")
 
         # Öğrenci bilgisini al
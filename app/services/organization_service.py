@@ -115,6 +115,10 @@ class OrganizationService:
             org.name = data.name
         if data.is_active is not None:
             org.is_active = data.is_active
+        if data.morning_shift_start is not None:
+            org.morning_shift_start = data.morning_shift_start
+        if data.afternoon_shift_start is not None:
+            org.afternoon_shift_start = data.afternoon_shift_start
         await self.db.commit()
         await self.db.refresh(org)
         return org
@@ -3,7 +3,6 @@ from sqlalchemy import and_, select
 from fastapi import HTTPException
 from typing import List, Optional
 from datetime import date, datetime, time, timedelta, timezone
-import httpx
 import logging
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
@@ -22,6 +21,8 @@ from ..database.schemas.attendance_log import AttendanceLog as AttendanceLogSche
 from ..database.schemas.attendance_log import AttendanceStatus as AttendanceStatusSchema
 from ..database.schemas.dashboard import DashboardResponse
 from ..database.schemas.student import StudentAddressUpdate
+from .eta_service import BusEtaService
+from .latest_location_service import LatestLocationService
 from .student_service import StudentService
 from ..core.config import settings
 from ..core.redis import redis_manager
@@ -81,10 +82,9 @@ class ParentService:
         if not assignment:
             raise HTTPException(status_code=404, detail="Student has no assigned bus")
 
-        # Get location
-        query = select(BusLocation).where(BusLocation.bus_id == assignment.bus_id).order_by(BusLocation.timestamp.desc())
-        bus_location = (await self.db.execute(query)).scalars().first()
-        
+        # Get location (latest-position hash, history only on a miss)
+        bus_location = await LatestLocationService(self.db).get(assignment.bus_id)
+
         if not bus_location:
             raise HTTPException(status_code=404, detail="Bus location not found")
             
@@ -146,8 +146,7 @@ class ParentService:
         driver = bus.current_driver
         
         # Get latest bus location
-        query = select(BusLocation).where(BusLocation.bus_id == bus.id).order_by(BusLocation.timestamp.desc())
-        location = (await self.db.execute(query)).scalars().first()
+        location = await LatestLocationService(self.db).get(bus.id)
         
         trip_status = "inactive"
         minutes_left = None
@@ -229,17 +228,14 @@ class ParentService:
         trip_status: str
     ) -> Optional[int]:
         """
-        Calculate ETA from bus to destination using Google Directions API.
+        Calculate ETA from bus to destination via BusEtaService (Google Distance
+        Matrix or the offline model, see ETA_SOURCE).
         
         - to_school: ETA from bus to school (student is waiting at home)
         - to_home: ETA from bus to student's home (student is on bus going home)
         
         Returns minutes left or None if calculation fails.
         """
-        if not self.gmaps_api_key:
-            logger.warning("Google Maps API key not available for ETA calculation")
-            return None
-        
         # Origin: Bus current location
         origin_lat = float(bus_location.latitude)
         origin_lng = float(bus_location.longitude)
@@ -260,92 +256,11 @@ class ParentService:
             dest_lng = float(student.longitude)
             logger.info(f"ETA ({trip_status}): bus ({origin_lat}, {origin_lng}) -> student home ({dest_lat}, {dest_lng})")
         
-        # Check cache first
-        cache_key = f"eta:{bus_location.bus_id}:{student.id}:{trip_status}"
-        try:
-            import json
-            cached = await redis_manager.get(cache_key)
-            if cached:
-                cached_data = json.loads(cached)
-                logger.info(f"ETA cache hit for student {student.id}: {cached_data['minutes']} minutes")
-                return cached_data['minutes']
-        except Exception:
-            pass
-        
-        # Call Google Directions API (legacy but enabled)
-        stale_cache_key = f"eta_stale:{bus_location.bus_id}:{student.id}:{trip_status}"
-        try:
-            url = "https://maps.googleapis.com/maps/api/directions/json"
-
-            params = {
-                "origin": f"{origin_lat},{origin_lng}",
-                "destination": f"{dest_lat},{dest_lng}",
-                "mode": "driving",
-                "departure_time": "now",
-                "key": self.gmaps_api_key
-            }
-
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url, params=params,
-                    timeout=httpx.Timeout(5.0, connect=2.0),
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"Directions API error: {response.status_code} - {response.text}")
-                    return None
-                
-                result = response.json()
-            
-            # Check API response status
-            if result.get('status') != 'OK':
-                logger.error(f"Directions API returned status: {result.get('status')} - {result.get('error_message', '')}")
-                return None
-            
-            if not result.get('routes') or len(result['routes']) == 0:
-                logger.error("Directions API returned empty routes")
-                return None
-            
-            # Get duration from the first route's first leg
-            leg = result['routes'][0]['legs'][0]
-            
-            # Use duration_in_traffic if available (more accurate with real-time traffic)
-            if 'duration_in_traffic' in leg:
-                duration_seconds = leg['duration_in_traffic']['value']
-            else:
-                duration_seconds = leg['duration']['value']
-            
-            minutes = round(duration_seconds / 60)
-            distance_text = leg['distance']['text']
-            
-            logger.info(
-                f"ETA calculated for student {student.id}: {minutes} minutes "
-                f"(distance: {distance_text})"
-            )
-            
-            # Cache for 2 minutes (fresh) and 10 minutes (stale fallback)
-            try:
-                import json
-                payload = json.dumps({"minutes": minutes})
-                await redis_manager.set(cache_key, payload, ex=120)
-                await redis_manager.set(stale_cache_key, payload, ex=600)
-            except Exception:
-                pass
-
-            return minutes
-
-        except Exception as e:
-            logger.error(f"Failed to calculate ETA: {str(e)}")
-            # Return stale cached value rather than None when API is slow/down
-            try:
-                import json
-                stale = await redis_manager.get(stale_cache_key)
-                if stale:
-                    logger.info(f"Returning stale ETA for student {student.id}")
-                    return json.loads(stale)["minutes"]
-            except Exception:
-                pass
-            return None
+        # Served from the bus-level ETA hash: one Distance Matrix call per bus
+        # position covers every student of the bus.
+        return await BusEtaService(self.db).get_eta(
+            bus_location, student, trip_status, destination=(dest_lat, dest_lng)
+        )
 
     async def report_absence(self, parent_id: str, student_id: str, absence_date: Optional[date] = None, reason: Optional[str] = None):
         from uuid import uuid4
@@ -0,0 +1,114 @@
+"""
+Adaptive driver reporting rate.
+
+The driver WebSocket asks the client how often to send fixes with control
+frames:
+
+    {"type": "control", "interval_seconds": 5, "reason": "moving"}
+
+Reasons, first match wins:
+  near_stop  within LOCATION_RATE_NEAR_STOP_METERS of a remaining stop -> MIN
+  parked     speed below LOCATION_RATE_PARKED_SPEED_KMH                -> MAX
+  unwatched  nobody subscribed to the bus's location or ETA channel    -> UNWATCHED
+  moving                                                               -> DEFAULT
+
+When ingest load is above LOCATION_RATE_LOAD_THRESHOLD the interval is
+doubled (capped at MAX), except near stops where geofence and dwell detection
+need dense points. The decision is re-evaluated at most every
+LOCATION_RATE_EVAL_SECONDS per connection, and a frame is sent only when the
+interval changes.
+"""
+import logging
+import time
+from typing import Optional, Tuple
+
+from ..core.config import settings
+from ..core.geo import haversine_meters
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+from .eta_push_service import eta_channel
+from .geofence_service import geofence_engine
+
+logger = logging.getLogger(__name__)
+
+
+def desired_interval(
+    speed_kmh: Optional[float],
+    stop_distance_m: Optional[float],
+    watched: bool,
+    ingest_load: float,
+) -> Tuple[int, str]:
+    """Pick the reporting interval (seconds) and the reason for it."""
+    if stop_distance_m is not None and stop_distance_m <= settings.LOCATION_RATE_NEAR_STOP_METERS:
+        return settings.LOCATION_INTERVAL_MIN_SECONDS, "near_stop"
+    if speed_kmh is not None and speed_kmh < settings.LOCATION_RATE_PARKED_SPEED_KMH:
+        interval, reason = settings.LOCATION_INTERVAL_MAX_SECONDS, "parked"
+    elif not watched:
+        interval, reason = settings.LOCATION_INTERVAL_UNWATCHED_SECONDS, "unwatched"
+    else:
+        interval, reason = settings.LOCATION_INTERVAL_DEFAULT_SECONDS, "moving"
+    if ingest_load >= settings.LOCATION_RATE_LOAD_THRESHOLD:
+        interval = min(interval * 2, settings.LOCATION_INTERVAL_MAX_SECONDS)
+        reason = f"{reason}_load"
+    return interval, reason
+
+
+def control_frame(interval_seconds: int, reason: str) -> dict:
+    return {"type": "control", "interval_seconds": interval_seconds, "reason": reason}
+
+
+class ReportingRateController:
+    """Per driver connection: decides the interval and says when to send a new control frame."""
+
+    def __init__(self, bus_id: str):
+        self.bus_id = bus_id
+        self.interval_seconds: Optional[int] = None
+        self._evaluated_at: Optional[float] = None
+        self._last_fix: Optional[Tuple[float, float, float]] = None  # (monotonic, lat, lng)
+
+    def initial_frame(self) -> dict:
+        self.interval_seconds = settings.LOCATION_INTERVAL_DEFAULT_SECONDS
+        return control_frame(self.interval_seconds, "initial")
+
+    def _speed(self, latitude: float, longitude: float, speed: Optional[float], now: float) -> Optional[float]:
+        """Reported speed, or one derived from the previous fix when the client sends none."""
+        previous, self._last_fix = self._last_fix, (now, latitude, longitude)
+        if speed is not None:
+            return float(speed)
+        if previous is None or now - previous[0] <= 0:
+            return None
+        meters = haversine_meters(previous[1], previous[2], latitude, longitude)
+        return meters / (now - previous[0]) * 3.6
+
+    async def _watched(self) -> bool:
+        try:
+            redis = await redis_manager.get_redis()
+            counts = await redis.pubsub_numsub(f"bus:{self.bus_id}:location", eta_channel(self.bus_id))
+            return any(count for _, count in counts)
+        except Exception:
+            return True  # Unknown: do not slow the bus down
+
+    async def on_location(self, latitude: float, longitude: float, speed: Optional[float] = None) -> Optional[dict]:
+        """Return a control frame when the desired interval changed, else None."""
+        if not settings.LOCATION_RATE_CONTROL_ENABLED:
+            return None
+        from ..tasks.location_writer import ingest_load
+
+        latitude, longitude = float(latitude), float(longitude)
+        now = time.monotonic()
+        speed_kmh = self._speed(latitude, longitude, speed, now)
+        if self._evaluated_at is not None and now - self._evaluated_at < settings.LOCATION_RATE_EVAL_SECONDS:
+            return None
+        self._evaluated_at = now
+
+        interval, reason = desired_interval(
+            speed_kmh,
+            geofence_engine.nearest_stop_meters(self.bus_id, latitude, longitude),
+            await self._watched(),
+            await ingest_load(),
+        )
+        if interval == self.interval_seconds:
+            return None
+        self.interval_seconds = interval
+        metrics.inc("location_rate_control_frames_total")
+        return control_frame(interval, reason)
@@ -0,0 +1,197 @@
+# app/services/route_optimizer.py
+"""
+Local route optimizer.
+
+Improves a nearest-neighbour seed with 2-opt and Or-opt moves over a
+great-circle distance matrix computed in one vectorized call (core.geo).
+RouteService uses it as the fallback when Google Directions is unavailable,
+and as the no-API-cost mode (ROUTE_OPTIMIZER_MODE=local).
+
+A route is an open path: start -> stops -> end. Start and end are the origin
+and destination when they are known. A missing endpoint is a virtual node at
+zero distance from every stop, so the path may begin or finish at any stop.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from ..core.geo import haversine_matrix
+
+OR_OPT_MAX_SEGMENT = 3
+_EPSILON = 1e-6
+
+Point = Tuple[float, float]
+
+
+@dataclass
+class TourResult:
+    """Visiting order (indices into the input stops) and its length."""
+    order: List[int]
+    distance_meters: float
+    seed_distance_meters: float
+    improvements: int
+    elapsed_ms: float
+    timed_out: bool
+
+
+def distance_matrix(points: Sequence[Optional[Point]]) -> List[List[float]]:
+    """
+    Symmetric great-circle matrix; rows/columns of None points are all zero.
+    Returned as nested lists: the local-search loops index single cells, which
+    is much faster on Python floats than on NumPy scalars.
+    """
+    real = [idx for idx, point in enumerate(points) if point is not None]
+    n = len(points)
+    if len(real) == n:
+        return haversine_matrix(points).tolist()
+    matrix = [[0.0] * n for _ in range(n)]
+    if real:
+        sub = haversine_matrix([points[idx] for idx in real]).tolist()
+        for row_pos, i in enumerate(real):
+            row = matrix[i]
+            for col_pos, j in enumerate(real):
+                row[j] = sub[row_pos][col_pos]
+    return matrix
+
+
+def path_length(path: Sequence[int], dist: List[List[float]]) -> float:
+    return sum(dist[path[k]][path[k + 1]] for k in range(len(path) - 1))
+
+
+def nearest_neighbour_order(start: int, candidates: Sequence[int], dist: List[List[float]]) -> List[int]:
+    """Greedy seed. Ties go to the earlier candidate, so callers control determinism."""
+    remaining = list(candidates)
+    order: List[int] = []
+    current = start
+    while remaining:
+        row = dist[current]
+        best_pos = min(range(len(remaining)), key=lambda pos: row[remaining[pos]])
+        current = remaining.pop(best_pos)
+        order.append(current)
+    return order
+
+
+def _two_opt_pass(path: List[int], lo: int, hi: int, dist: List[List[float]], deadline: float) -> int:
+    """Reverse path[i..j] (lo <= i < j <= hi) whenever it shortens the path."""
+    improvements = 0
+    for i in range(lo, hi):
+        if time.perf_counter() > deadline:
+            break
+        a = path[i - 1]
+        b = path[i]
+        d_a = dist[a]
+        d_ab = d_a[b]
+        d_b = dist[b]
+        for j in range(i + 1, hi + 1):
+            c = path[j]
+            d = path[j + 1]
+            delta = d_a[c] + d_b[d] - d_ab - dist[c][d]
+            if delta < -_EPSILON:
+                path[i:j + 1] = path[i:j + 1][::-1]
+                improvements += 1
+                b = path[i]
+                d_b = dist[b]
+                d_ab = d_a[b]
+    return improvements
+
+
+def _or_opt_pass(path: List[int], lo: int, hi: int, dist: List[List[float]], deadline: float) -> int:
+    """Move segments of 1..OR_OPT_MAX_SEGMENT stops (optionally reversed) to a better gap."""
+    improvements = 0
+    for seg_len in range(1, OR_OPT_MAX_SEGMENT + 1):
+        i = lo
+        while i + seg_len - 1 <= hi:
+            if time.perf_counter() > deadline:
+                return improvements
+            first = path[i]
+            last = path[i + seg_len - 1]
+            prev = path[i - 1]
+            nxt = path[i + seg_len]
+            removal_gain = dist[prev][first] + dist[last][nxt] - dist[prev][nxt]
+
+            best_delta = -_EPSILON
+            best_gap = None
+            best_reversed = False
+            # Gap k sits between path[k] and path[k + 1].
+            for k in range(lo - 1, hi + 1):
+                if i - 1 <= k <= i + seg_len - 1:
+                    continue
+                p = path[k]
+                q = path[k + 1]
+                base = dist[p][q]
+                forward = dist[p][first] + dist[last][q] - base - removal_gain
+                backward = dist[p][last] + dist[first][q] - base - removal_gain
+                if forward < best_delta:
+                    best_delta, best_gap, best_reversed = forward, k, False
+                if backward < best_delta:
+                    best_delta, best_gap, best_reversed = backward, k, True
+
+            if best_gap is None:
+                i += 1
+                continue
+
+            segment = path[i:i + seg_len]
+            if best_reversed:
+                segment.reverse()
+            del path[i:i + seg_len]
+            insert_at = best_gap + 1 if best_gap < i else best_gap + 1 - seg_len
+            path[insert_at:insert_at] = segment
+            improvements += 1
+    return improvements
+
+
+def optimize_route(
+    stops: Sequence[Point],
+    *,
+    origin: Optional[Point] = None,
+    destination: Optional[Point] = None,
+    fixed_last: Optional[int] = None,
+    time_budget_ms: float = 200,
+) -> TourResult:
+    """
+    Order `stops` to minimise the open path origin -> stops -> destination.
+
+    fixed_last pins that stop index to the end of the visiting order (e.g. the
+    farthest drop-off for from_school). The search stops when no improving
+    move remains or when time_budget_ms is used up, returning the best path
+    found so far.
+    """
+    started = time.perf_counter()
+    n = len(stops)
+    if n == 0:
+        return TourResult([], 0.0, 0.0, 0, 0.0, False)
+
+    start_node, end_node = n, n + 1
+    dist = distance_matrix([*stops, origin, destination])
+
+    movable = [idx for idx in range(n) if idx != fixed_last]
+    seed = nearest_neighbour_order(start_node, movable, dist)
+    tail = ([fixed_last] if fixed_last is not None else []) + [end_node]
+    path = [start_node, *seed, *tail]
+    seed_distance = path_length(path, dist)
+
+    # Movable stops occupy path[lo..hi]; start, fixed_last and end stay put.
+    lo, hi = 1, len(seed)
+    deadline = started + time_budget_ms / 1000
+    improvements = 0
+    timed_out = False
+    if hi - lo >= 1:
+        while True:
+            changed = _two_opt_pass(path, lo, hi, dist, deadline)
+            changed += _or_opt_pass(path, lo, hi, dist, deadline)
+            improvements += changed
+            if time.perf_counter() > deadline:
+                timed_out = True
+                break
+            if not changed:
+                break
+
+    return TourResult(
+        order=path[1:-1],
+        distance_meters=path_length(path, dist),
+        seed_distance_meters=seed_distance,
+        improvements=improvements,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        timed_out=timed_out,
+    )
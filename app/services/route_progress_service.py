@@ -3,18 +3,32 @@ from datetime import date
 from typing import List
 from ..core.redis import redis_manager
 
+PROGRESS_TTL_SECONDS = 60 * 60 * 24
+
 
 class RouteProgressService:
-    """Manages per-bus visited student state for multi-device continuity."""
+    """
+    Manages per-bus visited student state for multi-device continuity.
+
+    Two stores per bus/day/trip: the manual list the driver taps, and a Redis
+    set of provisional visits marked by dwell detection (geofence_service).
+    get_visited() returns both; add_visited() confirms a provisional visit,
+    remove_visited() reopens either.
+    """
 
     def __init__(self):
         self.prefix = "route_visited"
+        self.provisional_prefix = "route_visited_auto"
 
     def _key(self, bus_id: str, trip_type: str, service_date: date | None = None) -> str:
         resolved_date = (service_date or date.today()).isoformat()
         return f"{self.prefix}:{bus_id}:{resolved_date}:{trip_type}"
 
-    async def get_visited(self, bus_id: str, trip_type: str) -> List[str]:
+    def _provisional_key(self, bus_id: str, trip_type: str, service_date: date | None = None) -> str:
+        resolved_date = (service_date or date.today()).isoformat()
+        return f"{self.provisional_prefix}:{bus_id}:{resolved_date}:{trip_type}"
+
+    async def _get_manual(self, bus_id: str, trip_type: str) -> List[str]:
         try:
             raw = await redis_manager.get(self._key(bus_id, trip_type))
             if not raw:
@@ -26,23 +40,58 @@ class RouteProgressService:
             pass
         return []
 
+    async def get_provisional(self, bus_id: str, trip_type: str) -> List[str]:
+        try:
+            redis = await redis_manager.get_redis()
+            return sorted(await redis.smembers(self._provisional_key(bus_id, trip_type)))
+        except Exception:
+            return []
+
+    async def get_visited(self, bus_id: str, trip_type: str) -> List[str]:
+        visited = await self._get_manual(bus_id, trip_type)
+        visited.extend(
+            student_id for student_id in await self.get_provisional(bus_id, trip_type)
+            if student_id not in visited
+        )
+        return visited
+
+    async def add_provisional(self, bus_id: str, trip_type: str, student_id: str) -> bool:
+        """Mark a stop visited from dwell detection. False when it was already marked."""
+        redis = await redis_manager.get_redis()
+        key = self._provisional_key(bus_id, trip_type)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(key, student_id)
+            pipe.expire(key, PROGRESS_TTL_SECONDS)
+            added, _ = await pipe.execute()
+        return bool(added)
+
+    async def _remove_provisional(self, bus_id: str, trip_type: str, student_id: str) -> bool:
+        try:
+            redis = await redis_manager.get_redis()
+            return bool(await redis.srem(self._provisional_key(bus_id, trip_type), student_id))
+        except Exception:
+            return False
+
     async def add_visited(self, bus_id: str, trip_type: str, student_id: str) -> List[str]:
-        visited = await self.get_visited(bus_id, trip_type)
+        visited = await self._get_manual(bus_id, trip_type)
         if student_id not in visited:
             visited.append(student_id)
-        await redis_manager.set(self._key(bus_id, trip_type), json.dumps(visited), ex=60 * 60 * 24)
+        await redis_manager.set(self._key(bus_id, trip_type), json.dumps(visited), ex=PROGRESS_TTL_SECONDS)
+        await self._remove_provisional(bus_id, trip_type, student_id)
         return visited
 
     async def remove_visited(self, bus_id: str, trip_type: str, student_id: str) -> bool:
-        visited = await self.get_visited(bus_id, trip_type)
+        provisional_removed = await self._remove_provisional(bus_id, trip_type, student_id)
+        visited = await self._get_manual(bus_id, trip_type)
         if student_id not in visited:
-            return False
+            return provisional_removed
         updated = [current_id for current_id in visited if current_id != student_id]
-        await redis_manager.set(self._key(bus_id, trip_type), json.dumps(updated), ex=60 * 60 * 24)
+        await redis_manager.set(self._key(bus_id, trip_type), json.dumps(updated), ex=PROGRESS_TTL_SECONDS)
         return True
 
     async def clear(self, bus_id: str, trip_type: str) -> None:
         try:
             await redis_manager.delete(self._key(bus_id, trip_type))
+            await redis_manager.delete(self._provisional_key(bus_id, trip_type))
         except Exception:
             pass
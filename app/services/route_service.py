@@ -6,8 +6,9 @@ Optimizes the order of student pickups for a bus route
 
 import asyncio
 import hashlib
+import json
 import logging
-from typing import List, Optional, Tuple, Set
+from typing import Dict, List, Optional, Tuple, Set
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
@@ -16,20 +17,44 @@ from datetime import datetime, timezone
 
 from ..database.models.bus import Bus as BusModel
 from ..database.models.student_bus_assignment import StudentBusAssignment
-from ..database.models.bus_location import BusLocation as BusLocationModel
 from ..database.models.school import School as SchoolModel
 from ..database.schemas.route import RouteResponse, RouteStop, OptimizedRouteResponse, RoutePoint
 from ..core.config import settings
+from ..core.geo import haversine_one_to_many
+from ..core.metrics import metrics
 from ..core.redis import redis_manager
+from ..core.single_flight import single_flight
+from .latest_location_service import LatestLocationService
+from .route_optimizer import distance_matrix, optimize_route, path_length
 from .route_progress_service import RouteProgressService
 from .trip_session_service import TripSessionService
 
 logger = logging.getLogger(__name__)
 
+ALL_ROUTES_TAG = "routes"
+
+
+def route_cache_tag(bus_id: str) -> str:
+    """Tag that indexes every cached route/plan key of a bus (see RedisManager.set_tagged)."""
+    return f"routes:{bus_id}"
+
+
+def route_cache_fallbacks(*bus_ids: str) -> Dict[str, str]:
+    """SCAN patterns for invalidate_tag when a bus's tag set is missing."""
+    return {route_cache_tag(bus_id): f"route:{bus_id}:*" for bus_id in bus_ids}
+
+
+def route_plan_key(bus_id: str, trip_type: str) -> str:
+    """Last fully optimized plan of a bus (also read by the offline ETA model)."""
+    return f"route:{bus_id}:plan:{trip_type}"
+
 
 class RouteService:
     """Service for calculating and optimizing bus routes"""
-    
+
+    # Directions API hard limit on intermediate waypoints per request
+    MAX_DIRECTIONS_WAYPOINTS = 25
+
     def __init__(self, db: AsyncSession):
         self.db = db
         self.gmaps_client = None
@@ -57,12 +82,14 @@ class RouteService:
         include_all: bool = False,
         trip_type: str = "to_school",
         current_user_org_id: Optional[str] = None,
+        refresh: bool = False,
     ) -> OptimizedRouteResponse:
         """
         Get optimized route for a bus with all assigned students
         
         Args:
             bus_id: UUID of the bus
+            refresh: skip the cache and the stored plan and recompute (shift pre-computation)
             
         Returns:
             OptimizedRouteResponse with optimized stops and total distance/duration
@@ -98,12 +125,64 @@ class RouteService:
             cache_key = f"route:{bus_id}:{o_lat}:{o_lng}:{trip_type}:{exclude_fingerprint}"
         else:
             cache_key = f"route:{bus_id}:no_origin:{trip_type}:{exclude_fingerprint}"
-        cached_route = await redis_manager.get(cache_key)
+        cached_route = None if refresh else await redis_manager.get(cache_key)
         if cached_route:
             logger.info(f"Route cache hit for bus {bus_id}")
-            import json
+            metrics.inc("route_plan_hit_total")
             return OptimizedRouteResponse(**json.loads(cached_route))
-        
+
+        # Concurrent misses for the same key (many parents opening the map at
+        # once) share one computation, also across workers.
+        async def read_cached() -> Optional[OptimizedRouteResponse]:
+            raw = await redis_manager.get(cache_key)
+            return OptimizedRouteResponse(**json.loads(raw)) if raw else None
+
+        return await single_flight.run(
+            cache_key,
+            lambda: self._build_route(
+                bus_id=bus_id,
+                cache_key=cache_key,
+                origin=origin,
+                combined_excludes=combined_excludes,
+                include_all=include_all,
+                trip_type=trip_type,
+                current_user_org_id=current_user_org_id,
+                refresh=refresh,
+            ),
+            read_cached=None if refresh else read_cached,
+        )
+
+    async def _build_route(
+        self,
+        bus_id: str,
+        cache_key: str,
+        origin: Optional[Tuple[float, float]],
+        combined_excludes: Set[str],
+        include_all: bool,
+        trip_type: str,
+        current_user_org_id: Optional[str],
+        refresh: bool = False,
+    ) -> OptimizedRouteResponse:
+        """Cache-miss path of get_optimized_route: derive or recompute, then cache."""
+        # Visited/ignored students changed: derive from the last plan instead of
+        # reloading assignments and calling Directions again.
+        if not include_all and not refresh:
+            plan = await self._load_route_plan(bus_id, trip_type)
+            if plan is not None:
+                derived = await self._derive_route_from_plan(
+                    bus_id=bus_id,
+                    plan=plan,
+                    excludes=combined_excludes,
+                    origin=origin,
+                    trip_type=trip_type,
+                    current_user_org_id=current_user_org_id,
+                )
+                if derived is not None:
+                    metrics.inc("route_plan_derive_total")
+                    await self._cache_route(cache_key, derived)
+                    return derived
+        metrics.inc("route_plan_recompute_total")
+
         # Get bus with assigned students
         bus = await self._get_bus_with_students(bus_id)
         if not bus:
@@ -111,6 +190,7 @@ class RouteService:
         
         # Get student addresses with coordinates
         stops = await self._get_student_stops(bus_id, current_user_org_id=current_user_org_id)
+        assigned_student_ids = [stop.student_id for stop in stops]
 
         # Exclude visited or ignored students unless include_all=true
         if not include_all:
@@ -156,8 +236,8 @@ class RouteService:
                 destination = await self._get_farthest_student_coords(stops, school_coords)
             logger.info(f"Route (from_school): origin=school {origin}, destination=farthest student {destination}")
 
-        # Optimize route using Google Maps
-        if self.gmaps_client and len(stops) > 0 and origin is not None and destination is not None:
+        # Optimize route using Google Maps (or locally when ROUTE_OPTIMIZER_MODE=local)
+        if settings.ROUTE_OPTIMIZER_MODE == "google" and self.gmaps_client and len(stops) > 0 and origin is not None and destination is not None:
             optimized_route = await self._optimize_with_google_maps(
                 bus_id,
                 stops,
@@ -174,24 +254,203 @@ class RouteService:
                 trip_type=trip_type,
             )
         
-        # Cache the route for 30 minutes (1800 seconds)
+        await self._cache_route(cache_key, optimized_route)
+        if not include_all:
+            await self._save_route_plan(
+                bus_id=bus_id,
+                trip_type=trip_type,
+                route=optimized_route,
+                assigned_student_ids=assigned_student_ids,
+                organization_id=bus.organization_id,
+            )
+
+        return optimized_route
+
+    @staticmethod
+    def _route_to_dict(route: OptimizedRouteResponse) -> dict:
+        return {
+            "bus_id": route.bus_id,
+            "stops": [stop.dict() for stop in route.stops],
+            "origin": (route.origin.dict() if route.origin else None),
+            "destination": (route.destination.dict() if route.destination else None),
+            "total_distance_meters": route.total_distance_meters,
+            "total_duration_seconds": route.total_duration_seconds,
+            "generated_at": route.generated_at.isoformat(),
+            "overview_polyline": getattr(route, "overview_polyline", None),
+        }
+
+    async def _cache_route(self, cache_key: str, route: OptimizedRouteResponse) -> None:
+        """Cache the route for 30 minutes (1800 seconds)"""
         try:
-            import json
-            route_dict = {
-                "bus_id": optimized_route.bus_id,
-                "stops": [stop.dict() for stop in optimized_route.stops],
-                "origin": (optimized_route.origin.dict() if optimized_route.origin else None),
-                "destination": (optimized_route.destination.dict() if optimized_route.destination else None),
-                "total_distance_meters": optimized_route.total_distance_meters,
-                "total_duration_seconds": optimized_route.total_duration_seconds,
-                "generated_at": optimized_route.generated_at.isoformat(),
-                "overview_polyline": getattr(optimized_route, "overview_polyline", None),
-            }
-            await redis_manager.set(cache_key, json.dumps(route_dict), ex=1800)
+            await redis_manager.set_tagged(
+                cache_key,
+                json.dumps(self._route_to_dict(route)),
+                tags=[route_cache_tag(route.bus_id), ALL_ROUTES_TAG],
+                ex=1800,
+            )
         except Exception as e:
             logger.error(f"Failed to cache route: {str(e)}")
-        
-        return optimized_route
+
+    # ─── Incremental re-planning ─────────────────────────────────────────────
+
+    @staticmethod
+    def _route_plan_key(bus_id: str, trip_type: str) -> str:
+        return route_plan_key(bus_id, trip_type)
+
+    async def _load_route_plan(self, bus_id: str, trip_type: str) -> Optional[dict]:
+        try:
+            raw = await redis_manager.get(self._route_plan_key(bus_id, trip_type))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.error(f"Failed to load route plan for bus {bus_id}: {str(e)}")
+            return None
+
+    async def _save_route_plan(
+        self,
+        *,
+        bus_id: str,
+        trip_type: str,
+        route: OptimizedRouteResponse,
+        assigned_student_ids: List[str],
+        organization_id: Optional[str],
+    ) -> None:
+        """Keep the last fully optimized plan so later visits can be derived from it."""
+        if not route.stops:
+            return
+        points = [(stop.latitude, stop.longitude) for stop in route.stops]
+        origin = (route.origin.latitude, route.origin.longitude) if route.origin else None
+        destination = (route.destination.latitude, route.destination.longitude) if route.destination else None
+        plan = {
+            **self._route_to_dict(route),
+            "assigned_student_ids": sorted(assigned_student_ids),
+            "organization_id": organization_id,
+            # Road distance / great-circle distance; scales derived estimates
+            "detour_factor": self._detour_factor(route, points, origin, destination),
+        }
+        try:
+            # Tagged with the bus so assignment/student changes invalidate it too
+            await redis_manager.set_tagged(
+                self._route_plan_key(bus_id, trip_type),
+                json.dumps(plan),
+                tags=[route_cache_tag(bus_id), ALL_ROUTES_TAG],
+                ex=settings.ROUTE_PLAN_TTL_SECONDS,
+            )
+        except Exception as e:
+            logger.error(f"Failed to store route plan for bus {bus_id}: {str(e)}")
+
+    @staticmethod
+    def _great_circle_length(
+        points: List[Tuple[float, float]],
+        origin: Optional[Tuple[float, float]],
+        destination: Optional[Tuple[float, float]],
+    ) -> float:
+        nodes = [*points, origin, destination]
+        n = len(points)
+        return path_length([n, *range(n), n + 1], distance_matrix(nodes))
+
+    def _detour_factor(
+        self,
+        route: OptimizedRouteResponse,
+        points: List[Tuple[float, float]],
+        origin: Optional[Tuple[float, float]],
+        destination: Optional[Tuple[float, float]],
+    ) -> float:
+        straight = self._great_circle_length(points, origin, destination)
+        if straight <= 0 or route.total_distance_meters <= 0:
+            return 1.0
+        return route.total_distance_meters / straight
+
+    async def _derive_route_from_plan(
+        self,
+        *,
+        bus_id: str,
+        plan: dict,
+        excludes: Set[str],
+        origin: Optional[Tuple[float, float]],
+        trip_type: str,
+        current_user_org_id: Optional[str],
+    ) -> Optional[OptimizedRouteResponse]:
+        """
+        Drop completed stops from the stored plan and re-anchor it on the
+        current origin. Returns None when a full recomputation is needed:
+        a student came back into the route, the from_school final stop was
+        visited, or the derived order is more than ROUTE_REPLAN_TOLERANCE longer
+        than a fresh local optimization of the same stops.
+        """
+        if current_user_org_id is not None and plan.get("organization_id") != current_user_org_id:
+            return None
+
+        plan_stops = [RouteStop(**stop) for stop in plan.get("stops", [])]
+        planned_ids = {stop.student_id for stop in plan_stops}
+        expected_ids = set(plan.get("assigned_student_ids", [])) - excludes
+        if not expected_ids.issubset(planned_ids):
+            return None
+        remaining = [stop for stop in plan_stops if stop.student_id in expected_ids]
+
+        destination_point = plan.get("destination")
+        destination = (
+            (destination_point["latitude"], destination_point["longitude"]) if destination_point else None
+        )
+        if trip_type == "from_school":
+            if plan_stops and plan_stops[-1].student_id not in expected_ids:
+                return None
+            plan_origin = plan.get("origin")
+            origin = (plan_origin["latitude"], plan_origin["longitude"]) if plan_origin else None
+        elif origin is None:
+            origin = await self._get_latest_bus_location(bus_id)
+
+        if remaining:
+            points = [(stop.latitude, stop.longitude) for stop in remaining]
+            derived_length = self._great_circle_length(points, origin, destination)
+            # CPU-bound for up to the time budget: keep it off the event loop
+            best = await asyncio.to_thread(
+                optimize_route,
+                points,
+                origin=origin,
+                destination=destination,
+                fixed_last=(len(points) - 1) if trip_type == "from_school" else None,
+                time_budget_ms=settings.ROUTE_OPTIMIZER_TIME_BUDGET_MS,
+            )
+            if derived_length > best.distance_meters * (1 + settings.ROUTE_REPLAN_TOLERANCE):
+                logger.info(
+                    f"Route plan for bus {bus_id} drifted ({derived_length:.0f}m vs {best.distance_meters:.0f}m); recomputing"
+                )
+                return None
+        else:
+            derived_length = 0.0
+
+        for idx, stop in enumerate(remaining, 1):
+            stop.sequence_order = idx
+        factor = float(plan.get("detour_factor") or 1.0)
+        planned_distance = plan.get("total_distance_meters") or 0
+        planned_duration = plan.get("total_duration_seconds") or 0
+        estimated_distance = int(round(derived_length * factor))
+        estimated_duration = (
+            int(round(planned_duration * estimated_distance / planned_distance)) if planned_distance else 0
+        )
+
+        plan_origin = plan.get("origin")
+        same_origin = (
+            (plan_origin["latitude"], plan_origin["longitude"]) if plan_origin else None
+        ) == (tuple(origin) if origin else None)
+        unchanged = same_origin and len(remaining) == len(plan_stops)
+        # The plan's road polyline still runs through visited stops and from the old
+        # origin; once either changed, draw straight segments over what is left.
+        overview_polyline = (
+            plan.get("overview_polyline") if unchanged else self._straight_polyline(origin, remaining, destination)
+        )
+
+        logger.info(f"Route derived from stored plan for bus {bus_id}: {len(plan_stops)} -> {len(remaining)} stops")
+        return OptimizedRouteResponse(
+            bus_id=bus_id,
+            stops=remaining,
+            origin=(RoutePoint(latitude=origin[0], longitude=origin[1]) if origin else None),
+            destination=(RoutePoint(latitude=destination[0], longitude=destination[1]) if destination else None),
+            total_distance_meters=estimated_distance,
+            total_duration_seconds=estimated_duration,
+            generated_at=datetime.now(timezone.utc),
+            overview_polyline=overview_polyline,
+        )
     
     async def _get_bus_with_students(self, bus_id: str) -> Optional[BusModel]:
         """Get bus with related students"""
@@ -252,24 +511,6 @@ class RouteService:
             stop.student_id,
         )
 
-    @staticmethod
-    def _distance_meters(
-        lat1: float,
-        lng1: float,
-        lat2: float,
-        lng2: float,
-    ) -> float:
-        import math
-
-        earth_radius_m = 6371000
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        delta_phi = math.radians(lat2 - lat1)
-        delta_lambda = math.radians(lng2 - lng1)
-        a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return earth_radius_m * c
-
     def _build_geographic_fallback_route(
         self,
         *,
@@ -279,7 +520,7 @@ class RouteService:
         destination: Optional[Tuple[float, float]],
         trip_type: str,
     ) -> OptimizedRouteResponse:
-        ordered_stops = self._order_stops_geographically(
+        ordered_stops, distance_meters = self._optimize_stop_order(
             stops=stops,
             origin=origin,
             destination=destination,
@@ -288,32 +529,40 @@ class RouteService:
         for idx, stop in enumerate(ordered_stops, 1):
             stop.sequence_order = idx
 
-        overview_polyline = None
-        try:
-            import polyline
-
-            coords = []
-            if origin is not None:
-                coords.append(origin)
-            coords.extend((stop.latitude, stop.longitude) for stop in ordered_stops)
-            if destination is not None:
-                coords.append(destination)
-            if coords:
-                overview_polyline = polyline.encode(coords)
-        except Exception:
-            overview_polyline = None
+        overview_polyline = self._straight_polyline(origin, ordered_stops, destination)
 
         return OptimizedRouteResponse(
             bus_id=bus_id,
             stops=ordered_stops,
             origin=(RoutePoint(latitude=origin[0], longitude=origin[1]) if origin else None),
             destination=(RoutePoint(latitude=destination[0], longitude=destination[1]) if destination else None),
-            total_distance_meters=0,
+            # Great-circle length of the local route; no driving duration without the API
+            total_distance_meters=int(round(distance_meters)),
             total_duration_seconds=0,
             generated_at=datetime.now(timezone.utc),
             overview_polyline=overview_polyline,
         )
 
+    @staticmethod
+    def _straight_polyline(
+        origin: Optional[Tuple[float, float]],
+        stops: List[RouteStop],
+        destination: Optional[Tuple[float, float]],
+    ) -> Optional[str]:
+        """Encoded straight segments origin -> stops -> destination (no road geometry)."""
+        try:
+            import polyline
+
+            coords = []
+            if origin is not None:
+                coords.append(origin)
+            coords.extend((stop.latitude, stop.longitude) for stop in stops)
+            if destination is not None:
+                coords.append(destination)
+            return polyline.encode(coords) if coords else None
+        except Exception:
+            return None
+
     def _order_stops_geographically(
         self,
         *,
@@ -322,64 +571,53 @@ class RouteService:
         destination: Optional[Tuple[float, float]],
         trip_type: str,
     ) -> List[RouteStop]:
-        if len(stops) <= 1:
-            return list(stops)
+        ordered, _ = self._optimize_stop_order(
+            stops=stops,
+            origin=origin,
+            destination=destination,
+            trip_type=trip_type,
+        )
+        return ordered
+
+    def _optimize_stop_order(
+        self,
+        *,
+        stops: List[RouteStop],
+        origin: Optional[Tuple[float, float]],
+        destination: Optional[Tuple[float, float]],
+        trip_type: str,
+    ) -> Tuple[List[RouteStop], float]:
+        """
+        Order stops with the local optimizer (nearest-neighbour seed improved by
+        2-opt/Or-opt). Returns the ordered stops and the route length in meters.
+        """
+        if not stops:
+            return [], 0.0
 
         remaining = sorted(stops, key=self._stable_stop_sort_key)
-        fixed_last_stop: RouteStop | None = None
+        points = [(stop.latitude, stop.longitude) for stop in remaining]
+        fixed_last_index: Optional[int] = None
         if trip_type == "from_school" and destination is not None and len(remaining) > 1:
-            fixed_last_stop = min(
-                remaining,
-                key=lambda stop: (
-                    self._distance_meters(stop.latitude, stop.longitude, destination[0], destination[1]),
-                    self._stable_stop_sort_key(stop),
-                ),
-            )
-            remaining = [stop for stop in remaining if stop.student_id != fixed_last_stop.student_id]
+            # argmin returns the first minimum, i.e. the stable sort order breaks ties
+            fixed_last_index = int(haversine_one_to_many(destination, points).argmin())
 
-        if origin is not None:
-            current_point = origin
-        elif destination is not None and remaining:
-            anchor = max(
-                remaining,
-                key=lambda stop: (
-                    self._distance_meters(stop.latitude, stop.longitude, destination[0], destination[1]),
-                    self._stable_stop_sort_key(stop),
-                ),
-            )
-            current_point = (anchor.latitude, anchor.longitude)
-        else:
-            ordered = list(remaining)
-            if fixed_last_stop is not None:
-                ordered.append(fixed_last_stop)
-            return ordered
-
-        ordered: List[RouteStop] = []
-        while remaining:
-            next_stop = min(
-                remaining,
-                key=lambda stop: (
-                    self._distance_meters(current_point[0], current_point[1], stop.latitude, stop.longitude),
-                    self._stable_stop_sort_key(stop),
-                ),
+        tour = optimize_route(
+            points,
+            origin=origin,
+            destination=destination,
+            fixed_last=fixed_last_index,
+            time_budget_ms=settings.ROUTE_OPTIMIZER_TIME_BUDGET_MS,
+        )
+        if tour.timed_out:
+            logger.info(
+                f"Route: local optimizer hit its {settings.ROUTE_OPTIMIZER_TIME_BUDGET_MS}ms budget "
+                f"for {len(remaining)} stops"
             )
-            ordered.append(next_stop)
-            current_point = (next_stop.latitude, next_stop.longitude)
-            remaining.remove(next_stop)
+        return [remaining[idx] for idx in tour.order], tour.distance_meters
 
-        if fixed_last_stop is not None:
-            ordered.append(fixed_last_stop)
-        return ordered
-    
     async def _get_latest_bus_location(self, bus_id: str) -> Optional[Tuple[float, float]]:
         """Fetch latest reported bus location as (lat, lng)."""
-        query = (
-            select(BusLocationModel)
-            .where(BusLocationModel.bus_id == bus_id)
-            .order_by(BusLocationModel.timestamp.desc())
-        )
-        result = await self.db.execute(query)
-        latest = result.scalars().first()
+        latest = await LatestLocationService(self.db).get(bus_id)
         if latest is None:
             return None
         try:
@@ -419,7 +657,6 @@ class RouteService:
             cached = None
         if cached:
             try:
-                import json
                 obj = json.loads(cached)
                 logger.info(f"Using cached school coordinates for {school.id}")
                 return (obj.get("lat"), obj.get("lng"))
@@ -429,6 +666,21 @@ class RouteService:
         # 3. Last resort: Geocode via Google Maps if client available
         if not self.gmaps_client:
             return None
+
+        async def read_cached() -> Optional[Tuple[float, float]]:
+            raw = await redis_manager.get(cache_key)
+            if not raw:
+                return None
+            obj = json.loads(raw)
+            return (obj.get("lat"), obj.get("lng"))
+
+        return await single_flight.run(
+            cache_key,
+            lambda: self._geocode_school_address(school, cache_key),
+            read_cached=read_cached,
+        )
+
+    async def _geocode_school_address(self, school: SchoolModel, cache_key: str) -> Optional[Tuple[float, float]]:
         try:
             geocode = await asyncio.to_thread(self.gmaps_client.geocode, school.school_address)
             if geocode and len(geocode) > 0:
@@ -460,30 +712,12 @@ class RouteService:
         if school_coords is None:
             # If no school coords, just use the last stop
             return (stops[-1].latitude, stops[-1].longitude)
-        
-        import math
-        
-        def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-            """Calculate haversine distance in meters"""
-            R = 6371000  # Earth radius in meters
-            phi1 = math.radians(lat1)
-            phi2 = math.radians(lat2)
-            delta_phi = math.radians(lat2 - lat1)
-            delta_lambda = math.radians(lng2 - lng1)
-            a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-            return R * c
-        
-        school_lat, school_lng = school_coords
-        farthest_stop = None
-        max_distance = -1
-        
-        for stop in stops:
-            dist = haversine_distance(school_lat, school_lng, stop.latitude, stop.longitude)
-            if dist > max_distance:
-                max_distance = dist
-                farthest_stop = stop
-        
+
+        distances = haversine_one_to_many(school_coords, [(stop.latitude, stop.longitude) for stop in stops])
+        farthest_index = int(distances.argmax())
+        farthest_stop = stops[farthest_index]
+        max_distance = float(distances[farthest_index])
+
         if farthest_stop:
             logger.info(
                 f"Farthest student from school: {farthest_stop.full_name} "
@@ -519,7 +753,16 @@ class RouteService:
                 total_duration_seconds=0,
                 generated_at=datetime.now(timezone.utc)
             )
-        
+
+        if len(stops) > self.MAX_DIRECTIONS_WAYPOINTS:
+            return await self._optimize_chunked_with_google_maps(
+                bus_id,
+                stops,
+                origin,
+                destination,
+                trip_type,
+            )
+
         try:
             # Prepare coordinates for Google Maps API
             waypoints = [(stop.latitude, stop.longitude) for stop in stops]
@@ -627,20 +870,135 @@ class RouteService:
                 trip_type=trip_type,
             )
     
+    def _split_into_direction_segments(
+        self,
+        ordered_stops: List[RouteStop],
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+    ) -> List[List[Tuple[Tuple[float, float], Optional[RouteStop]]]]:
+        """
+        Split origin -> ordered stops -> destination into segments with at most
+        MAX_DIRECTIONS_WAYPOINTS intermediate points. Consecutive segments share
+        their boundary stop (destination of one, origin of the next).
+        """
+        nodes: List[Tuple[Tuple[float, float], Optional[RouteStop]]] = [(origin, None)]
+        nodes.extend(((stop.latitude, stop.longitude), stop) for stop in ordered_stops)
+        nodes.append((destination, None))
+
+        segments = []
+        start = 0
+        while start < len(nodes) - 1:
+            end = min(start + self.MAX_DIRECTIONS_WAYPOINTS + 1, len(nodes) - 1)
+            segments.append(nodes[start:end + 1])
+            start = end
+        return segments
+
+    async def _optimize_chunked_with_google_maps(
+        self,
+        bus_id: str,
+        stops: List[RouteStop],
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        trip_type: str,
+    ) -> OptimizedRouteResponse:
+        """
+        Routes with more stops than one Directions request accepts: order stops
+        locally (neighbouring stops end up in the same segment), split into
+        <=25-waypoint segments, let Google optimize each segment concurrently,
+        then stitch stops, legs and polylines back together.
+        """
+        import polyline
+
+        ordered_stops, _ = self._optimize_stop_order(
+            stops=stops,
+            origin=origin,
+            destination=destination,
+            trip_type=trip_type,
+        )
+        segments = self._split_into_direction_segments(ordered_stops, origin, destination)
+        logger.info(f"Route: {len(stops)} stops exceed the waypoint limit; using {len(segments)} Directions segments")
+
+        try:
+            results = await asyncio.gather(*(
+                asyncio.to_thread(
+                    self.gmaps_client.directions,
+                    origin=segment[0][0],
+                    destination=segment[-1][0],
+                    waypoints=[coords for coords, _ in segment[1:-1]],
+                    optimize_waypoints=True,
+                    mode="driving",
+                )
+                for segment in segments
+            ))
+
+            final_stops: List[RouteStop] = []
+            path: List[Tuple[float, float]] = []
+            total_distance = 0
+            total_duration = 0
+            for segment, result in zip(segments, results):
+                if not result:
+                    raise ValueError("Google Maps returned empty result for a route segment")
+                route_info = result[0]
+                inner = [stop for _, stop in segment[1:-1]]
+                waypoint_order = route_info.get("waypoint_order", list(range(len(inner))))
+                if sorted(waypoint_order) != list(range(len(inner))):
+                    raise ValueError("Google Maps returned incomplete waypoint order for a route segment")
+
+                final_stops.extend(inner[idx] for idx in waypoint_order)
+                boundary_stop = segment[-1][1]
+                if boundary_stop is not None:
+                    final_stops.append(boundary_stop)
+
+                for leg in route_info.get("legs", []):
+                    total_distance += leg.get("distance", {}).get("value", 0)
+                    total_duration += leg.get("duration", {}).get("value", 0)
+
+                points = polyline.decode(route_info.get("overview_polyline", {}).get("points", ""))
+                if path and points and tuple(points[0]) == tuple(path[-1]):
+                    points = points[1:]
+                path.extend(points)
+        except Exception as e:
+            logger.error(f"Chunked Google Maps routing failed: {str(e)}")
+            return self._build_geographic_fallback_route(
+                bus_id=bus_id,
+                stops=stops,
+                origin=origin,
+                destination=destination,
+                trip_type=trip_type,
+            )
+
+        for idx, stop in enumerate(final_stops, 1):
+            stop.sequence_order = idx
+
+        logger.info(
+            f"Route optimized for bus {bus_id} in {len(segments)} segments: {len(final_stops)} stops, "
+            f"distance: {total_distance}m, duration: {total_duration}s"
+        )
+        return OptimizedRouteResponse(
+            bus_id=bus_id,
+            stops=final_stops,
+            origin=RoutePoint(latitude=origin[0], longitude=origin[1]),
+            destination=RoutePoint(latitude=destination[0], longitude=destination[1]),
+            total_distance_meters=total_distance,
+            total_duration_seconds=total_duration,
+            generated_at=datetime.now(timezone.utc),
+            overview_polyline=polyline.encode(path) if path else None,
+        )
+
     async def invalidate_route_cache(self, bus_id: str) -> None:
-        """Invalidate all cached routes for a bus (pattern-based)"""
+        """Invalidate all cached routes for a bus (tag index, no keyspace scan)"""
         try:
-            pattern = f"route:{bus_id}:*"
-            await redis_manager.delete_pattern(pattern)
-            logger.info(f"Route cache invalidated for bus {bus_id} (pattern: {pattern})")
+            deleted = await redis_manager.invalidate_tag(
+                route_cache_tag(bus_id), fallback_patterns=route_cache_fallbacks(bus_id)
+            )
+            logger.info(f"Route cache invalidated for bus {bus_id} ({deleted} keys)")
         except Exception as e:
             logger.error(f"Failed to invalidate cache for bus {bus_id}: {str(e)}")
     
     async def invalidate_all_routes_cache(self) -> None:
         """Invalidate all cached routes"""
         try:
-            pattern = "route:*"
-            await redis_manager.delete_pattern(pattern)
-            logger.info("All route caches invalidated")
+            deleted = await redis_manager.invalidate_tag(ALL_ROUTES_TAG, fallback_patterns={ALL_ROUTES_TAG: "route:*"})
+            logger.info(f"All route caches invalidated ({deleted} keys)")
         except Exception as e:
             logger.error(f"Failed to invalidate all route caches: {str(e)}")
@@ -15,6 +15,7 @@ from ..database.models.student_bus_assignment import StudentBusAssignment
 from ..database.models.attendance_log import AttendanceLog
 from ..database.schemas.student import StudentCreate, StudentUpdate
 from ..core.redis import redis_manager
+from .route_service import route_cache_fallbacks, route_cache_tag
 
 logger = logging.getLogger(__name__)
 
@@ -246,9 +247,12 @@ class StudentService:
             result = await self.db.execute(query)
             assignments = result.scalars().all()
 
-            for assignment in assignments:
-                pattern = f"route:{assignment.bus_id}:*"
-                await redis_manager.delete_pattern(pattern)
-                logger.info(f"Route cache invalidated for bus {assignment.bus_id}")
+            bus_ids = sorted({assignment.bus_id for assignment in assignments})
+            if bus_ids:
+                await redis_manager.invalidate_tag(
+                    *(route_cache_tag(bus_id) for bus_id in bus_ids),
+                    fallback_patterns=route_cache_fallbacks(*bus_ids),
+                )
+                logger.info(f"Route cache invalidated for buses {bus_ids}")
         except Exception as e:
             logger.error(f"Failed to invalidate route caches for student {student_id}: {str(e)}")
@@ -0,0 +1,92 @@
+"""
+Historical track replay for one bus.
+
+Postgres buckets the bus's points into bucket_seconds windows and keeps the
+first point of each (DISTINCT ON over the (bus_id, timestamp) index range).
+Rows are streamed to the client through an asyncpg server-side cursor, so a
+full-day replay holds at most one cursor batch in memory and the first line
+goes out as soon as the first batch is read.
+
+Two line-delimited formats (one JSON object per line):
+
+  ndjson    {"t": "2026-01-05T07:10:05", "lat": 41.0, "lng": 29.0, "speed": 32.5}
+  polyline  {"polyline": "<encoded>", "from": ..., "to": ..., "points": n, "offsets": [s, ...]}
+            one line per POLYLINE_CHUNK_POINTS points; offsets are seconds from "from"
+"""
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Sequence
+
+import polyline
+from sqlalchemy import text
+
+STREAM_BATCH_SIZE = 500
+POLYLINE_CHUNK_POINTS = 500
+
+_TRACK_SQL = """
+SELECT DISTINCT ON (bucket) timestamp, latitude, longitude, speed
+FROM (
+    SELECT floor(extract(epoch FROM timestamp) / :bucket_seconds)::bigint AS bucket,
+           timestamp, latitude, longitude, speed
+    FROM bus_locations
+    WHERE bus_id = :bus_id AND timestamp >= :start AND timestamp < :end
+) points
+ORDER BY bucket, timestamp
+"""
+
+
+async def stream_track_rows(
+    bus_id: str,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int,
+) -> AsyncIterator[Sequence[tuple]]:
+    """Bucketed (timestamp, latitude, longitude, speed) rows in cursor-sized batches; start/end are naive UTC."""
+    from ..database.database import engine
+
+    async with engine.connect() as conn:
+        result = await conn.stream(
+            text(_TRACK_SQL).execution_options(yield_per=STREAM_BATCH_SIZE),
+            {"bus_id": bus_id, "start": start, "end": end, "bucket_seconds": bucket_seconds},
+        )
+        async for rows in result.partitions(STREAM_BATCH_SIZE):
+            yield rows
+
+
+def ndjson_lines(rows: Sequence[tuple]) -> str:
+    return "".join(
+        json.dumps({
+            "t": timestamp.isoformat(),
+            "lat": float(latitude),
+            "lng": float(longitude),
+            "speed": float(speed) if speed is not None else None,
+        }) + "\n"
+        for timestamp, latitude, longitude, speed in rows
+    )
+
+
+def polyline_line(rows: Sequence[tuple]) -> str:
+    first = rows[0][0]
+    return json.dumps({
+        "polyline": polyline.encode([(float(lat), float(lng)) for _, lat, lng, _ in rows]),
+        "from": first.isoformat(),
+        "to": rows[-1][0].isoformat(),
+        "points": len(rows),
+        "offsets": [round((timestamp - first).total_seconds(), 1) for timestamp, *_ in rows],
+    }) + "\n"
+
+
+async def track_ndjson(bus_id: str, start: datetime, end: datetime, bucket_seconds: int) -> AsyncIterator[str]:
+    async for rows in stream_track_rows(bus_id, start, end, bucket_seconds):
+        yield ndjson_lines(rows)
+
+
+async def track_polyline(bus_id: str, start: datetime, end: datetime, bucket_seconds: int) -> AsyncIterator[str]:
+    pending: List[tuple] = []
+    async for rows in stream_track_rows(bus_id, start, end, bucket_seconds):
+        pending.extend(rows)
+        while len(pending) >= POLYLINE_CHUNK_POINTS:
+            yield polyline_line(pending[:POLYLINE_CHUNK_POINTS])
+            pending = pending[POLYLINE_CHUNK_POINTS:]
+    if pending:
+        yield polyline_line(pending)
@@ -0,0 +1,213 @@
+"""
+Live trail: the last TRAIL_WINDOW_SECONDS of each active bus's path.
+
+Every ingested point goes into a fixed-size ring buffer per bus: one numpy
+structured array of TRAIL_CAPACITY rows (by default
+TRAIL_WINDOW_SECONDS / LOCATION_INTERVAL_MIN_SECONDS, i.e. 450),
+
+    t      int32    seconds since TRAIL_EPOCH (valid until 2088)
+    lat    float32  ~0.4 m resolution at Turkish latitudes
+    lng    float32
+    speed  float32  km/h, NaN when the client sent none
+
+i.e. 16 bytes per point and no per-point Python objects. With the default
+capacity of 450 points a bus costs 7,200 bytes of array data plus ~0.2 KiB
+of object overhead. That is about 7 MiB for 1,000 buses (see
+tests/unit/test_trail_service.py).
+
+Consecutive stored points are kept at least window / capacity seconds apart.
+A faster fix (1 Hz peaks, or a client ignoring its control frames) replaces
+the newest point instead of being appended, so the ring always spans the
+whole window and the head is still the latest position.
+
+Points are mirrored to a Redis list, bus:{id}:trail, one base64-packed
+16-byte row per entry. The list is LTRIM'd to the same capacity and expires
+with the window. A worker that has not seen the bus (its driver is connected
+elsewhere) serves the trail from that list. Points older than the newest one
+(late or offline uploads) are not added to the trail; it only renders the
+live path.
+"""
+import base64
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+TRAIL_DTYPE = np.dtype([("t", "<i4"), ("lat", "<f4"), ("lng", "<f4"), ("speed", "<f4")])
+TRAIL_EPOCH = datetime(2020, 1, 1)  # naive UTC
+
+
+def trail_key(bus_id: str) -> str:
+    return f"bus:{bus_id}:trail"
+
+
+def to_trail_seconds(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((value - TRAIL_EPOCH).total_seconds())
+
+
+def from_trail_seconds(value: int) -> datetime:
+    return TRAIL_EPOCH + timedelta(seconds=int(value))
+
+
+def trail_points(rows: np.ndarray) -> List[dict]:
+    """Rows (oldest first) as {"t", "lat", "lng", "speed"} dicts, the shape track ndjson uses."""
+    return [
+        {
+            "t": from_trail_seconds(t).isoformat(),
+            "lat": round(float(lat), 6),
+            "lng": round(float(lng), 6),
+            "speed": None if np.isnan(speed) else round(float(speed), 1),
+        }
+        for t, lat, lng, speed in rows.tolist()
+    ]
+
+
+class TrailBuffer:
+    """Fixed-capacity ring of TRAIL_DTYPE rows for one bus."""
+
+    __slots__ = ("rows", "head", "size", "min_spacing")
+
+    def __init__(self, capacity: int, min_spacing: float = 0.0):
+        self.rows = np.zeros(capacity, dtype=TRAIL_DTYPE)
+        self.head = 0  # next slot to write
+        self.size = 0
+        self.min_spacing = min_spacing  # seconds between stored points, except the newest
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes
+
+    @property
+    def last_t(self) -> Optional[int]:
+        return int(self.rows["t"][self.head - 1]) if self.size else None
+
+    def append(self, t: int, lat: float, lng: float, speed: Optional[float]) -> Optional[str]:
+        """
+        Add a point. Returns "append", "replace" (it overwrote the newest point,
+        which was closer than min_spacing to the one before it) or None when
+        the point is older than the newest one and was rejected.
+        """
+        last = self.last_t
+        if last is not None and t < last:
+            return None
+        row = (t, lat, lng, np.nan if speed is None else speed)
+        capacity = len(self.rows)
+        if self.size >= 2 and last - int(self.rows["t"][(self.head - 2) % capacity]) < self.min_spacing:
+            self.rows[(self.head - 1) % capacity] = row
+            return "replace"
+        self.rows[self.head] = row
+        self.head = (self.head + 1) % capacity
+        self.size = min(self.size + 1, capacity)
+        return "append"
+
+    def snapshot(self, since: Optional[int] = None) -> np.ndarray:
+        """Copy of the stored rows, oldest first, optionally only those with t >= since."""
+        if self.size < len(self.rows):
+            ordered = self.rows[:self.size].copy()
+        else:
+            ordered = np.concatenate((self.rows[self.head:], self.rows[:self.head]))
+        if since is not None:
+            ordered = ordered[ordered["t"] >= since]
+        return ordered
+
+
+def pack_row(t: int, lat: float, lng: float, speed: Optional[float]) -> str:
+    row = np.array([(t, lat, lng, np.nan if speed is None else speed)], dtype=TRAIL_DTYPE)
+    return base64.b64encode(row.tobytes()).decode("ascii")
+
+
+def unpack_rows(items: List[str]) -> np.ndarray:
+    """Mirror entries back into TRAIL_DTYPE rows, sorted by time."""
+    rows = np.frombuffer(b"".join(base64.b64decode(item) for item in items), dtype=TRAIL_DTYPE)
+    return rows[np.argsort(rows["t"], kind="stable")]
+
+
+class TrailStore:
+    """Per-worker ring buffers for the buses this worker ingests, mirrored to Redis."""
+
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = capacity or settings.TRAIL_CAPACITY or math.ceil(
+            settings.TRAIL_WINDOW_SECONDS / settings.LOCATION_INTERVAL_MIN_SECONDS
+        )
+        self.min_spacing = settings.TRAIL_WINDOW_SECONDS / self.capacity
+        self.buffers: Dict[str, TrailBuffer] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def _buffer(self, bus_id: str) -> TrailBuffer:
+        buffer = self.buffers.get(bus_id)
+        if buffer is None:
+            self.prune()
+            buffer = self.buffers[bus_id] = TrailBuffer(self.capacity, self.min_spacing)
+        return buffer
+
+    async def record(
+        self,
+        bus_id: str,
+        timestamp: datetime,
+        latitude: float,
+        longitude: float,
+        speed: Optional[float] = None,
+    ) -> None:
+        if not settings.TRAIL_ENABLED:
+            return
+        t = to_trail_seconds(timestamp)
+        latitude, longitude = float(latitude), float(longitude)
+        speed = float(speed) if speed is not None else None
+        stored = self._buffer(bus_id).append(t, latitude, longitude, speed)
+        if stored is None:
+            return
+        try:
+            redis = await redis_manager.get_redis()
+            key = trail_key(bus_id)
+            row = pack_row(t, latitude, longitude, speed)
+            async with redis.pipeline(transaction=False) as pipe:
+                if stored == "replace":
+                    pipe.lset(key, -1, row)
+                else:
+                    pipe.rpush(key, row)
+                    pipe.ltrim(key, -self.capacity, -1)
+                pipe.expire(key, settings.TRAIL_WINDOW_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Trail mirror update failed for bus {bus_id}: {e}")
+
+    async def get(self, bus_id: str, window_seconds: Optional[int] = None) -> np.ndarray:
+        """Rows of the last window_seconds, oldest first: local buffer if fresh, else the Redis mirror."""
+        window = window_seconds or settings.TRAIL_WINDOW_SECONDS
+        since = to_trail_seconds(datetime.now(timezone.utc)) - window
+        buffer = self.buffers.get(bus_id)
+        if buffer is not None and buffer.last_t is not None and buffer.last_t >= since:
+            return buffer.snapshot(since)
+        try:
+            redis = await redis_manager.get_redis()
+            rows = unpack_rows(await redis.lrange(trail_key(bus_id), 0, -1))
+        except Exception as e:
+            logger.error(f"Trail mirror read failed for bus {bus_id}: {e}")
+            return np.zeros(0, dtype=TRAIL_DTYPE)
+        return rows[rows["t"] >= since]
+
+    def prune(self) -> int:
+        """Drop buffers of buses that have not reported within the window. Returns how many."""
+        since = to_trail_seconds(datetime.now(timezone.utc)) - settings.TRAIL_WINDOW_SECONDS
+        stale = [bus_id for bus_id, buffer in self.buffers.items() if (buffer.last_t or 0) < since]
+        for bus_id in stale:
+            del self.buffers[bus_id]
+        return len(stale)
+
+
+trail_store = TrailStore()
@@ -3,6 +3,21 @@ Background tasks package.
 
 Periodic cleanup and maintenance tasks.
 """
+from .bus_location_partitions import ensure_bus_location_partitions
+from .cleanup_audit_logs import cleanup_old_audit_logs
 from .cleanup_bus_locations import cleanup_old_bus_locations
+from .compact_bus_locations import compact_bus_locations
+from .eta_model_training import eta_model_nightly
+from .location_writer import batch_location_writer, stream_location_writer
+from .route_precompute import route_precompute_scheduler
 
-__all__ = ["cleanup_old_bus_locations"]
+__all__ = [
+    "cleanup_old_bus_locations",
+    "cleanup_old_audit_logs",
+    "compact_bus_locations",
+    "ensure_bus_location_partitions",
+    "batch_location_writer",
+    "stream_location_writer",
+    "route_precompute_scheduler",
+    "eta_model_nightly",
+]
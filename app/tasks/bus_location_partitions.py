@@ -0,0 +1,236 @@
+"""
+Bus Locations Partition Maintenance
+
+bus_locations, timestamp (naive UTC) üzerinden günlük RANGE partition'lara
+bölünmüştür: bus_locations_pYYYYMMDD = [gün, gün + 1). Bu modül
+
+- önümüzdeki günlerin partition'larını önceden oluşturur (startup'ta ve
+  periyodik temizlikte çağrılır),
+- retention dışındaki günleri DETACH + DROP ile kaldırır. Maliyet günün satır
+  sayısından bağımsızdır; DELETE/VACUUM yükü oluşmaz.
+
+Henüz partition'ı olmayan günlerin noktaları (ör. saati ileri giden cihazlar)
+bus_locations_default partition'ına düşer. O günün partition'ı oluşturulurken
+bu satırlar default'tan yeni partition'a taşınır (DETACH default, CREATE,
+taşı, ATTACH default; tek transaction). Aksi halde CREATE başarısız olur ve
+gün hiç partition'lanmaz. Her gün ayrı transaction'da oluşturulur; biri
+başarısız olursa diğerleri etkilenmez. Hâlâ default'ta kalan eski satırlar
+retention'da satır bazında temizlenir.
+
+Kullanım:
+  python -m app.tasks.bus_location_partitions
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from ..core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "bus_locations"
+PARTITION_PREFIX = "bus_locations_p"
+DEFAULT_PARTITION = "bus_locations_default"
+PREMAKE_DAYS = 3  # Bugün + 3 gün hazır tutulur
+_COLUMNS = "id, bus_id, latitude, longitude, speed, timestamp"
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def partition_day(name: str) -> Optional[date]:
+    """Inverse of partition_name; None for tables that are not daily partitions."""
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def expired_partitions(names: Iterable[str], cutoff_day: date) -> List[str]:
+    """Daily partitions whose whole day is older than cutoff_day."""
+    expired = []
+    for name in names:
+        day = partition_day(name)
+        if day is not None and day < cutoff_day:
+            expired.append(name)
+    return sorted(expired)
+
+
+def _create_partition_sql(day: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+async def is_partitioned(conn) -> bool:
+    result = await conn.execute(
+        text(
+            """
+            SELECT 1
+            FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace
+            """
+        ),
+        {"table": PARENT_TABLE},
+    )
+    return result.first() is not None
+
+
+async def list_partitions(conn) -> List[str]:
+    result = await conn.execute(
+        text(
+            """
+            SELECT child.relname
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = :table AND parent.relnamespace = 'public'::regnamespace
+            """
+        ),
+        {"table": PARENT_TABLE},
+    )
+    return [row[0] for row in result]
+
+
+async def _create_day_partition(conn, day: date) -> int:
+    """
+    Create one daily partition, first moving that day's rows out of the default
+    partition (CREATE fails while the default holds rows of the new range).
+    Returns how many rows were moved.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    bounds = {"start": start, "end": start + timedelta(days=1)}
+    stray = (await conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end)"),
+        bounds,
+    )).scalar()
+    if not stray:
+        await conn.execute(text(_create_partition_sql(day)))
+        return 0
+    name = partition_name(day)
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await conn.execute(text(_create_partition_sql(day)))
+    moved = await conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end "
+            f"RETURNING {_COLUMNS}) INSERT INTO {name} ({_COLUMNS}) SELECT {_COLUMNS} FROM moved"
+        ),
+        bounds,
+    )
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    return moved.rowcount
+
+
+async def ensure_bus_location_partitions(days_ahead: int = PREMAKE_DAYS, today: Optional[date] = None) -> int:
+    """
+    Create the default partition and daily partitions for today .. today + days_ahead.
+    Each partition is created in its own transaction; a day that fails is
+    logged and retried on the next run. Returns how many partitions were
+    created. No-op when the table is not partitioned.
+    """
+    from ..database.database import engine
+
+    today = today or datetime.now(timezone.utc).date()
+    async with engine.connect() as conn:
+        if not await is_partitioned(conn):
+            logger.info("bus_locations is not partitioned; skipping partition maintenance.")
+            return 0
+        existing = set(await list_partitions(conn))
+    created = 0
+    if DEFAULT_PARTITION not in existing:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+        created += 1
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        if partition_name(day) in existing:
+            continue
+        try:
+            async with engine.begin() as conn:
+                moved = await _create_day_partition(conn, day)
+        except Exception:
+            logger.exception(f"Creating bus_locations partition {partition_name(day)} failed; retrying next run.")
+            continue
+        created += 1
+        if moved:
+            logger.info(f"Moved {moved} row(s) of {day.isoformat()} from {DEFAULT_PARTITION} into {partition_name(day)}.")
+    if created:
+        logger.info(f"Created {created} bus_locations partition(s).")
+    return created
+
+
+async def drop_expired_bus_location_partitions(
+    retention_days: int,
+    action: str = "drop",
+    archive: Optional[Callable[..., Awaitable[object]]] = None,
+) -> int:
+    """
+    Remove daily partitions older than the retention window (whole UTC days,
+    see archive_service.retention_cutoff).
+
+    action="drop" detaches and drops them; action="detach" only detaches, so the
+    tables stay around (e.g. for archiving) and can be dropped later.
+    archive(cutoff, source=<table>) runs before each partition (and the expired
+    rows of the default partition) is removed; when it raises, those rows are
+    kept for the next run. Each removal is its own short transaction, so the
+    parent table is never locked while an archive is being written.
+    Returns the number of partitions removed from bus_locations.
+    """
+    from ..database.database import engine
+
+    from ..services.archive_service import retention_cutoff
+
+    cutoff = retention_cutoff(retention_days)
+    naive_cutoff = cutoff.replace(tzinfo=None)
+    async with engine.connect() as conn:
+        partitions = await list_partitions(conn)
+    expired = expired_partitions(partitions, cutoff.date())
+
+    removed = 0
+    for name in expired:
+        if archive is not None:
+            try:
+                await archive(naive_cutoff, source=name)
+            except Exception:
+                metrics.inc("retention_blocked_by_archive_total")
+                logger.exception(f"Archiving bus_locations partition {name} failed; retention is blocked, keeping it.")
+                continue
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if action == "drop":
+                await conn.execute(text(f"DROP TABLE {name}"))
+        removed += 1
+        logger.info(f"bus_locations partition {name} {'dropped' if action == 'drop' else 'detached'}.")
+
+    # Stray points outside every daily range live in the default partition.
+    if DEFAULT_PARTITION in partitions:
+        if archive is not None:
+            try:
+                await archive(naive_cutoff, source=DEFAULT_PARTITION)
+            except Exception:
+                metrics.inc("retention_blocked_by_archive_total")
+                logger.exception(
+                    f"Archiving expired rows of {DEFAULT_PARTITION} failed; retention is blocked, keeping them."
+                )
+                return removed
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"),
+                {"cutoff": naive_cutoff},
+            )
+        if result.rowcount:
+            logger.info(f"Deleted {result.rowcount} expired row(s) from {DEFAULT_PARTITION}.")
+    return removed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(ensure_bus_location_partitions())
@@ -0,0 +1,61 @@
+"""
+Audit Logs Cleanup Task
+
+AUDIT_LOG_RETENTION_DAYS ayarlanmışsa, bu süreden eski audit_logs satırlarını
+önce Parquet arşivine yazar (bkz. services/archive_service.py), arşiv
+doğrulandıktan sonra siler. Ayar boşsa hiçbir şey yapmaz.
+
+Kullanım (cron job):
+  python -m app.tasks.cleanup_audit_logs
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import delete, select
+
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..services.archive_service import archive_audit_logs, retention_cutoff
+
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = 10000
+
+
+async def cleanup_old_audit_logs(retention_days: Optional[int] = None) -> int:
+    """Returns the number of rows deleted."""
+    from ..database.database import AsyncSessionLocal
+    from ..database.models.audit_log import AuditLog
+
+    retention_days = retention_days or settings.AUDIT_LOG_RETENTION_DAYS
+    if not retention_days:
+        return 0
+    cutoff = retention_cutoff(retention_days)
+
+    if settings.ARCHIVE_ENABLED:
+        try:
+            archived = await archive_audit_logs(cutoff)
+        except Exception:
+            metrics.inc("retention_blocked_by_archive_total")
+            logger.exception("Archiving expired audit_logs failed; retention is blocked, nothing deleted.")
+            return 0
+        if archived.rows == 0:
+            return 0
+
+    deleted_total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            subquery = select(AuditLog.id).where(AuditLog.timestamp < cutoff).limit(DELETE_BATCH_SIZE)
+            result = await db.execute(delete(AuditLog).where(AuditLog.id.in_(subquery)))
+            await db.commit()
+            deleted_total += result.rowcount
+            if result.rowcount < DELETE_BATCH_SIZE:
+                break
+    logger.info(f"Audit log cleanup complete: deleted {deleted_total} rows older than {retention_days} days.")
+    return deleted_total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(cleanup_old_audit_logs())
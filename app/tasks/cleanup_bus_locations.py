@@ -3,27 +3,56 @@ Bus Locations Cleanup Task
 
 Eski konum verilerini temizler.
 bus_locations tablosu 50 otobüs x 12 kayıt/dk = 864K satır/gün üretir.
-7 günden eski verileri silerek tablo boyutunu kontrol altında tutar.
+BUS_LOCATION_RETENTION_DAYS'ten (varsayılan 7) eski verileri silerek tablo
+boyutunu kontrol altında tutar. Sıkıştırma (compact_bus_locations) açıkken
+eski günler çok daha az satır tutar; saklama süresi buna göre uzatılabilir.
+
+Tablo günlük partition'lara bölünmüşse (bkz. bus_location_partitions) eski
+günler DETACH/DROP PARTITION ile kaldırılır; satır bazında DELETE döngüsü
+yalnızca partition'sız kurulumlar için kalır.
+
+ARCHIVE_ENABLED açıkken silinecek satırlar önce ARCHIVE_DIR altına Parquet
+olarak arşivlenir (bkz. services/archive_service.py); arşiv doğrulanamazsa
+hiçbir şey silinmez ve bir sonraki turda tekrar denenir.
 
 Kullanım (cron job):
   python -m app.tasks.cleanup_bus_locations
 """
 import asyncio
 import logging
-from datetime import datetime, timedelta, timezone
 from sqlalchemy import delete, func, select
 
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..services.archive_service import archive_bus_locations, retention_cutoff
+from .bus_location_partitions import drop_expired_bus_location_partitions, is_partitioned
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-RETENTION_DAYS = 7
+RETENTION_DAYS = settings.BUS_LOCATION_RETENTION_DAYS
 
 
 async def cleanup_old_bus_locations(retention_days: int = RETENTION_DAYS) -> int:
-    from ..database.database import AsyncSessionLocal
+    """
+    Returns the number of partitions removed on a partitioned table, or the
+    number of rows deleted otherwise.
+    """
+    from ..database.database import AsyncSessionLocal, engine
     from ..database.models.bus_location import BusLocation
-    
-    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+
+    async with engine.connect() as conn:
+        partitioned = await is_partitioned(conn)
+    if partitioned:
+        removed = await drop_expired_bus_location_partitions(
+            retention_days,
+            action=settings.BUS_LOCATION_RETENTION_ACTION,
+            archive=archive_bus_locations if settings.ARCHIVE_ENABLED else None,
+        )
+        logger.info(f"Cleanup complete: removed {removed} bus_locations partition(s).")
+        return removed
+
+    cutoff = retention_cutoff(retention_days)
     
     async with AsyncSessionLocal() as db:
         count_query = select(func.count()).select_from(BusLocation).where(BusLocation.timestamp < cutoff)
@@ -34,6 +63,14 @@ async def cleanup_old_bus_locations(retention_days: int = RETENTION_DAYS) -> int
             logger.info(f"No bus_locations older than {retention_days} days.")
             return 0
         
+        if settings.ARCHIVE_ENABLED:
+            try:
+                await archive_bus_locations(cutoff.replace(tzinfo=None))
+            except Exception:
+                metrics.inc("retention_blocked_by_archive_total")
+                logger.exception("Archiving expired bus_locations failed; retention is blocked, nothing deleted.")
+                return 0
+
         logger.info(f"Cleaning up {total} bus_locations older than {retention_days} days...")
         
         batch_size = 10000
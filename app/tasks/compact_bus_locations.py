@@ -0,0 +1,224 @@
+"""
+Bus Locations Compaction Task
+
+BUS_LOCATION_COMPACTION_AGE_HOURS'tan eski konum geçmişini Douglas-Peucker ile
+sadeleştirir: her otobüsün gün içindeki noktaları sefer aralarına
+(TRIP_GAP_SECONDS'tan uzun boşluklar) bölünür, her sefer
+BUS_LOCATION_COMPACTION_TOLERANCE_METERS hata payıyla çizgi olarak
+sadeleştirilir ve atılan satırlar silinir. Duraklama (dwell) noktaları —
+DWELL_RADIUS_METERS içinde en az DWELL_SECONDS kalınan bölümlerin ilk ve son
+noktası — ve sefer uçları her zaman korunur; böylece iz şekli ve durak
+varış/kalkış zamanları kaybolmaz.
+
+İşlenen aralık Postgres'te (maintenance_watermarks, WATERMARK_NAME) tutulur
+ve bir günün silmeleriyle aynı transaction'da ilerler; her çalıştırma kaldığı
+yerden devam eder. Watermark kaybolursa zaten sadeleştirilmiş geçmiş tekrar
+sadeleştirilir ve hata TOLERANCE'ı aşar; bu yüzden bellek baskısında
+silinebilecek Redis'te tutulmaz. Watermark'ın gerisine düşen satırlar bir daha
+işlenmez; bu yüzden yaş sınırı hiçbir zaman LOCATION_BATCH_MAX_AGE_HOURS'tan
+(çevrimdışı toplu yüklemenin kabul ettiği en eski nokta) küçük olamaz. Aynı
+anda tek worker çalışır (LOCK_KEY): kilit token'lıdır, her gün sonunda
+uzatılır ve yalnızca hâlâ bizimse silinir.
+
+Sıkıştırma geri alınamaz ve varsayılan olarak kapalıdır
+(BUS_LOCATION_COMPACTION_ENABLED). ETA modeli nokta sayısıyla değil segment
+süresiyle ağırlıklandırıldığı için sıkıştırılmış geçmişten de eğitilebilir
+(bkz. eta_model_training).
+
+Kullanım (cron job):
+  python -m app.tasks.compact_bus_locations
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+
+import numpy as np
+from sqlalchemy import delete, func, select
+
+from ..core.config import settings
+from ..core.geo import EARTH_RADIUS_M, douglas_peucker
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+from ..core.single_flight import _RELEASE_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+TRIP_GAP_SECONDS = 10 * 60
+CHUNK = timedelta(days=1)
+DELETE_BATCH_SIZE = 5000
+WATERMARK_NAME = "bus_locations_compaction"
+LEGACY_WATERMARK_KEY = "bus_locations:compacted_until"  # Redis, before maintenance_watermarks
+LOCK_KEY = "bus_locations:compaction_lock"
+LOCK_TTL_SECONDS = 60 * 60
+
+# Extend the lock only if it is still ours.
+_EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def dwell_anchors(
+    points: Sequence[tuple],
+    seconds: Sequence[float],
+    radius_m: float,
+    min_seconds: float,
+) -> list[int]:
+    """First and last index of every run that stays within radius_m of its first point for min_seconds."""
+    arr = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(arr) == 0:
+        return []
+    lat = np.radians(arr[:, 0])
+    y = (lat * EARTH_RADIUS_M).tolist()
+    x = (np.radians(arr[:, 1]) * EARTH_RADIUS_M * np.cos(lat.mean())).tolist()
+    radius_sq = radius_m * radius_m
+    anchors = []
+    n = len(y)
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and (x[j + 1] - x[i]) ** 2 + (y[j + 1] - y[i]) ** 2 <= radius_sq:
+            j += 1
+        if j > i and seconds[j] - seconds[i] >= min_seconds:
+            anchors.extend((i, j))
+        i = j + 1
+    return anchors
+
+
+def compaction_keep_indices(
+    points: Sequence[tuple],
+    seconds: Sequence[float],
+    tolerance_m: float,
+    dwell_radius_m: float,
+    dwell_seconds: float,
+    trip_gap_seconds: float = TRIP_GAP_SECONDS,
+) -> np.ndarray:
+    """Indices to keep for one bus's time-ordered points: trip ends, dwell ends and the DP skeleton."""
+    if len(points) <= 2:
+        return np.arange(len(points))
+    gaps = np.flatnonzero(np.diff(np.asarray(seconds, dtype=np.float64)) > trip_gap_seconds)
+    anchors = set(gaps.tolist()) | set((gaps + 1).tolist())
+    anchors.update(dwell_anchors(points, seconds, dwell_radius_m, dwell_seconds))
+    return douglas_peucker(points, tolerance_m, keep=anchors)
+
+
+async def _window_start(db, redis) -> Optional[datetime]:
+    from ..database.models.bus_location import BusLocation
+    from ..database.models.maintenance_watermark import MaintenanceWatermark
+
+    watermark = (await db.execute(
+        select(MaintenanceWatermark.value).where(MaintenanceWatermark.name == WATERMARK_NAME)
+    )).scalar()
+    if watermark is not None:
+        return watermark
+    legacy = await redis.get(LEGACY_WATERMARK_KEY)
+    if legacy:
+        return datetime.fromisoformat(legacy)
+    return (await db.execute(select(func.min(BusLocation.timestamp)))).scalar()
+
+
+async def _save_watermark(db, value: datetime) -> None:
+    from sqlalchemy.dialects.postgresql import insert
+
+    from ..database.models.maintenance_watermark import MaintenanceWatermark
+
+    statement = insert(MaintenanceWatermark).values(name=WATERMARK_NAME, value=value)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[MaintenanceWatermark.name],
+        set_={"value": statement.excluded.value},
+    ))
+
+
+async def _compact_bus(db, bus_id: str, start: datetime, end: datetime, tolerance_m: float) -> int:
+    from ..database.models.bus_location import BusLocation
+
+    rows = (await db.execute(
+        select(BusLocation.id, BusLocation.latitude, BusLocation.longitude, BusLocation.timestamp)
+        .where(BusLocation.bus_id == bus_id, BusLocation.timestamp >= start, BusLocation.timestamp < end)
+        .order_by(BusLocation.timestamp)
+    )).all()
+    if len(rows) <= 2:
+        return 0
+    keep = compaction_keep_indices(
+        [(float(row[1]), float(row[2])) for row in rows],
+        [(row[3] - start).total_seconds() for row in rows],
+        tolerance_m,
+        settings.DWELL_RADIUS_METERS,
+        settings.DWELL_SECONDS,
+    )
+    kept = np.zeros(len(rows), dtype=bool)
+    kept[keep] = True
+    drop_ids = [row[0] for row, is_kept in zip(rows, kept) if not is_kept]
+    for offset in range(0, len(drop_ids), DELETE_BATCH_SIZE):
+        await db.execute(
+            delete(BusLocation).where(
+                BusLocation.bus_id == bus_id,
+                BusLocation.timestamp >= start,
+                BusLocation.timestamp < end,
+                BusLocation.id.in_(drop_ids[offset:offset + DELETE_BATCH_SIZE]),
+            )
+        )
+    return len(drop_ids)
+
+
+async def compact_bus_locations(
+    age_hours: Optional[int] = None,
+    tolerance_m: Optional[float] = None,
+) -> int:
+    """Simplify history older than age_hours, bus by bus and day by day. Returns the number of rows removed."""
+    from ..database.database import AsyncSessionLocal
+    from ..database.models.bus_location import BusLocation
+
+    age_hours = age_hours if age_hours is not None else settings.BUS_LOCATION_COMPACTION_AGE_HOURS
+    # Late offline uploads land behind the watermark otherwise and are never compacted
+    age_hours = max(age_hours, settings.LOCATION_BATCH_MAX_AGE_HOURS)
+    tolerance_m = tolerance_m if tolerance_m is not None else settings.BUS_LOCATION_COMPACTION_TOLERANCE_METERS
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=age_hours)
+
+    redis = await redis_manager.get_redis()
+    token = uuid.uuid4().hex
+    if not await redis.set(LOCK_KEY, token, nx=True, ex=LOCK_TTL_SECONDS):
+        logger.info("bus_locations compaction already running elsewhere; skipping.")
+        return 0
+    removed_total = 0
+    try:
+        async with AsyncSessionLocal() as db:
+            start = await _window_start(db, redis)
+            while start is not None and start < cutoff:
+                end = min(start + CHUNK, cutoff)
+                bus_ids = (await db.execute(
+                    select(BusLocation.bus_id)
+                    .where(BusLocation.timestamp >= start, BusLocation.timestamp < end)
+                    .distinct()
+                )).scalars().all()
+                removed = 0
+                for bus_id in bus_ids:
+                    removed += await _compact_bus(db, bus_id, start, end, tolerance_m)
+                # The day's deletes and its watermark commit together: a day is never simplified twice
+                await _save_watermark(db, end)
+                await db.commit()
+                metrics.inc("bus_locations_compacted_rows_total", removed)
+                logger.info(f"Compacted bus_locations {start.isoformat()} - {end.isoformat()}: {removed} rows removed.")
+                removed_total += removed
+                start = end
+                if not await redis.eval(_EXTEND_SCRIPT, 1, LOCK_KEY, token, LOCK_TTL_SECONDS):
+                    logger.warning("bus_locations compaction lock was lost; stopping, the watermark is saved.")
+                    break
+    finally:
+        await redis.eval(_RELEASE_SCRIPT, 1, LOCK_KEY, token)
+    logger.info(f"Compaction complete: removed {removed_total} rows.")
+    return removed_total
+
+
+async def _main() -> None:
+    await compact_bus_locations()
+    await redis_manager.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,181 @@
+"""
+ETA Model Training
+
+bus_locations geçmişinden geohash hücresi ve yerel saat bazında ortalama
+otobüs hızını hesaplar ve Redis'teki eta_model:speeds hash'ine yazar (bkz.
+app/services/eta_model.py). Ağır kısım Postgres'te yapılır: her otobüsün
+ardışık iki noktası bir segmenttir; segment hızı mesafe / süre olarak
+hesaplanır ve ortalama segment süresiyle ağırlıklandırılır. Noktanın anlık
+hızı ve satır sayısı kullanılmaz. Böylece sıkıştırılmış (Douglas-Peucker)
+geçmişte köşe ve duraklama noktalarının aşırı temsili modeli yavaşlatmaz.
+Segmentler başlangıç noktasının GRID_DEGREES'lik ızgara hücresine ve saatine
+göre gruplanır, Python yalnızca ızgara hücrelerini geohash'e katlar. Yeni tablo geçici bir anahtara yazılıp RENAME
+ile atomik olarak yerine konur.
+
+Her gece ETA_MODEL_TRAIN_HOUR'da (SHIFT_TIMEZONE) çalışır; model hiç yoksa
+ilk turda hemen eğitilir. Günlük işaret (gece ve bootstrap için ayrı anahtar)
+yalnızca başarılı eğitimden sonra konur. Aynı anda tek worker eğitir
+(TRAIN_LOCK_KEY); başarısız bir eğitim kilidi bırakmaz, kilit
+TRAIN_RETRY_SECONDS sonra düşer ve eğitim tekrar denenir.
+
+Kullanım:
+  python -m app.tasks.eta_model_training
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+
+from ..core.config import settings
+from ..core.geo import EARTH_RADIUS_M, geohash_encode
+from ..core.redis import redis_manager
+from ..core.single_flight import _RELEASE_SCRIPT
+from ..services.eta_model import (
+    GEOHASH_PRECISION,
+    MAX_SPEED_KMH,
+    MIN_SPEED_KMH,
+    MODEL_KEY,
+    aggregate_speeds,
+)
+from .compact_bus_locations import TRIP_GAP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+GRID_DEGREES = 0.001  # ~110 m; well inside a precision-6 geohash cell
+SAMPLE_SECONDS = 5  # One "sample" = 5 s of driving (the default fix interval), for MIN_SAMPLES
+POLL_INTERVAL_SECONDS = 10 * 60
+TRAIN_LOCK_KEY = "eta_model:training_lock"
+TRAIN_RETRY_SECONDS = 30 * 60  # Lock TTL: longest run, and the backoff after a failed one
+_WRITE_CHUNK = 1000
+
+_AGGREGATE_SQL = """
+WITH segments AS (
+    SELECT latitude, longitude, timestamp,
+           lead(latitude) OVER w AS next_lat,
+           lead(longitude) OVER w AS next_lng,
+           extract(epoch FROM lead(timestamp) OVER w - timestamp)::float8 AS seconds
+    FROM bus_locations
+    WHERE timestamp >= :since
+    WINDOW w AS (PARTITION BY bus_id ORDER BY timestamp)
+), speeds AS (
+    SELECT latitude, longitude, timestamp, seconds,
+           3.6 * :earth_radius * sqrt(
+               power(radians(next_lat - latitude), 2)
+               + power(radians(next_lng - longitude) * cos(radians(latitude)), 2)
+           ) / seconds AS speed
+    FROM segments
+    WHERE seconds > 0 AND seconds <= :max_segment_seconds  -- longer gaps are between trips
+)
+SELECT floor(latitude / :grid)::bigint AS grid_lat,
+       floor(longitude / :grid)::bigint AS grid_lng,
+       extract(hour FROM (timestamp AT TIME ZONE 'UTC') AT TIME ZONE :tz)::int AS hour,
+       sum(seconds) / :sample_seconds AS samples,
+       sum(speed * seconds) / sum(seconds) AS avg_speed
+FROM speeds
+WHERE speed BETWEEN :min_speed AND :max_speed
+GROUP BY 1, 2, 3
+"""
+
+
+async def train_eta_model(lookback_days: Optional[int] = None) -> int:
+    """Rebuild the speed table from the last lookback_days of points. Returns the number of buckets stored."""
+    from ..database.database import engine
+
+    lookback_days = lookback_days or settings.ETA_MODEL_LOOKBACK_DAYS
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=lookback_days)
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(_AGGREGATE_SQL),
+            {
+                "grid": GRID_DEGREES,
+                "tz": settings.SHIFT_TIMEZONE,
+                "since": since,
+                "earth_radius": EARTH_RADIUS_M,
+                "max_segment_seconds": TRIP_GAP_SECONDS,
+                "sample_seconds": SAMPLE_SECONDS,
+                "min_speed": MIN_SPEED_KMH,
+                "max_speed": MAX_SPEED_KMH,
+            },
+        )
+        grid_rows = result.all()
+
+    speeds = aggregate_speeds(
+        (
+            geohash_encode((grid_lat + 0.5) * GRID_DEGREES, (grid_lng + 0.5) * GRID_DEGREES, GEOHASH_PRECISION),
+            hour,
+            samples,
+            avg_speed,
+        )
+        for grid_lat, grid_lng, hour, samples, avg_speed in grid_rows
+    )
+    if not speeds:
+        logger.warning(f"No usable bus_locations speeds in the last {lookback_days} days; ETA model kept as is.")
+        return 0
+
+    redis = await redis_manager.get_redis()
+    staging_key = f"{MODEL_KEY}:next"
+    items = list(speeds.items())
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.delete(staging_key)
+        for start in range(0, len(items), _WRITE_CHUNK):
+            pipe.hset(staging_key, mapping=dict(items[start:start + _WRITE_CHUNK]))
+        pipe.rename(staging_key, MODEL_KEY)
+        await pipe.execute()
+    logger.info(f"ETA model trained from {len(grid_rows)} grid bucket(s): {len(speeds)} speed bucket(s) stored.")
+    return len(speeds)
+
+
+async def train_if_due(now_local: datetime) -> bool:
+    """
+    Train when it is the nightly hour, or when there is no model yet (bootstrap).
+    Each has its own daily marker, set only after a successful run, so a
+    bootstrap earlier in the day does not use up the nightly retrain. Returns
+    True when this worker trained.
+    """
+    redis = await redis_manager.get_redis()
+    if now_local.hour == settings.ETA_MODEL_TRAIN_HOUR:
+        kind = "trained"
+    elif not await redis.exists(MODEL_KEY):
+        kind = "bootstrapped"
+    else:
+        return False
+    done_key = f"eta_model:{kind}:{now_local.date().isoformat()}"
+    if await redis.exists(done_key):
+        return False
+    token = uuid.uuid4().hex
+    if not await redis.set(TRAIN_LOCK_KEY, token, nx=True, ex=TRAIN_RETRY_SECONDS):
+        return False
+    # On failure the lock is left to expire: the retry waits TRAIN_RETRY_SECONDS
+    await train_eta_model()
+    await redis.set(done_key, "1", ex=24 * 60 * 60)
+    await redis.eval(_RELEASE_SCRIPT, 1, TRAIN_LOCK_KEY, token)
+    return True
+
+
+async def eta_model_nightly() -> None:
+    """Background task: retrains once per night, and right away while there is no model."""
+    while True:
+        try:
+            now_local = datetime.now(timezone.utc).astimezone(ZoneInfo(settings.SHIFT_TIMEZONE))
+            await train_if_due(now_local)
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        except asyncio.CancelledError:
+            logger.info("ETA model training task cancelled.")
+            break
+        except Exception:
+            logger.exception("ETA model training failed, will retry next cycle.")
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+async def _main() -> None:
+    await train_eta_model()
+    await redis_manager.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
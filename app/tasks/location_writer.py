@@ -0,0 +1,602 @@
+"""
+Bus Location Writer
+
+Şoför WebSocket'lerinden gelen konum noktalarını bus_locations tablosuna yazar.
+LOCATION_INGEST_MODE ile iki ingest modu desteklenir:
+
+- queue:  Noktalar süreç içi sınırlı bir kuyruğa (BoundedBatchQueue) alınır,
+          batch_location_writer N kayıt ya da T ms dolduğunda toplu yazar.
+          Yazma başarısız olursa batch yerel spill dosyasına eklenir ve DB
+          geri geldiğinde tekrar oynatılır. Kuyruk tek worker'a bağlıdır.
+- stream: Noktalar Redis Stream'e eklenir (XADD). stream_location_writer bir
+          consumer group üzerinden okur ve yalnızca DB commit'inden sonra XACK
+          eder. Commit edilmeyen kayıtlar pending listesinde kalır ve yeniden
+          başlatmada (veya XAUTOCLAIM ile başka bir consumer tarafından) tekrar
+          işlenir. Ingest ve yazma worker/node bazında bağımsız ölçeklenir.
+
+          Bu garanti yalnızca stream'in tutulduğu Redis anahtarları çıkarmıyorsa
+          geçerlidir: maxmemory-policy allkeys-* ise stream ve consumer group
+          XACK'ten önce silinebilir. Stream modunda Redis noeviction ya da
+          volatile-* (stream'in TTL'i yok, çıkarılmaz) ve AOF (appendonly yes)
+          ile çalışmalıdır; compose dosyaları volatile-lru + AOF kullanır.
+          Writer başlarken policy'yi kontrol eder ve allkeys-* ise hata loglar.
+          LOCATION_STREAM_MAXLEN bellek bütçesidir: bir kayıt ~200 byte, yani
+          varsayılan 250.000 kayıt ~50 MB (prod maxmemory 256mb'nin altında).
+          MAXLEN ~ kırpması pending kayıtları da siler; DB uzun süre kapalı
+          kalırsa (200 nokta/sn'de ~20 dk) en eski noktalar kaybolur.
+
+Yazma idempotenttir: nokta id'leri yeniden teslimde ve spill tekrarında
+korunur; daha önce commit edilmiş satırlar ON CONFLICT (id, timestamp) DO
+NOTHING ile atlanır, böylece XACK'ten önce çöken bir writer takılıp kalmaz.
+
+Her iki modda da, kalıcı yazmadan önce duran / tekrar eden noktalar
+(LOCATION_SUPPRESS_*) ayıklanır; canlı yayın ve bus:{id}:latest her noktayı
+görmeye devam eder.
+
+Kullanım (bağımsız stream consumer):
+  python -m app.tasks.location_writer
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+from redis.exceptions import ResponseError
+
+from ..core.batch_queue import BoundedBatchQueue, SpillFile
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+SPILL_RETRY_INTERVAL_SECONDS = 10
+STREAM_RETRY_BACKOFF_SECONDS = 2
+INGEST_LOAD_CACHE_SECONDS = 5
+
+# In-process queue used by LOCATION_INGEST_MODE=queue, and as a fallback when
+# XADD fails in stream mode (e.g. Redis briefly unavailable).
+_location_queue = BoundedBatchQueue(
+    name="location_queue",
+    max_batch_size=settings.LOCATION_QUEUE_MAX_BATCH_SIZE,
+    max_latency_ms=settings.LOCATION_QUEUE_MAX_LATENCY_MS,
+    high_water_mark=settings.LOCATION_QUEUE_HIGH_WATER_MARK,
+    overflow_policy=settings.LOCATION_QUEUE_OVERFLOW_POLICY,
+)
+_location_spill = SpillFile(
+    settings.LOCATION_SPILL_PATH,
+    name="location_spill",
+    max_bytes=settings.LOCATION_SPILL_MAX_BYTES,
+)
+
+
+def _serialize_point(item: dict) -> dict:
+    """Flatten a location item into string fields for XADD."""
+    return {
+        "id": item.get("id") or "",
+        "bus_id": item["bus_id"],
+        "latitude": str(item["latitude"]),
+        "longitude": str(item["longitude"]),
+        "speed": "" if item.get("speed") is None else str(item["speed"]),
+        "timestamp": item["timestamp"].isoformat(),
+    }
+
+
+def _deserialize_point(fields: dict) -> dict:
+    """Inverse of _serialize_point. Raises KeyError/ValueError on malformed entries."""
+    speed = fields.get("speed")
+    return {
+        "id": fields.get("id") or str(uuid4()),
+        "bus_id": fields["bus_id"],
+        "latitude": float(fields["latitude"]),
+        "longitude": float(fields["longitude"]),
+        "speed": float(speed) if speed not in (None, "") else None,
+        "timestamp": datetime.fromisoformat(fields["timestamp"]),
+    }
+
+
+def _to_db_naive_utc(value: datetime) -> datetime:
+    """bus_locations.timestamp is TIMESTAMP WITHOUT TIME ZONE; store naive UTC."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# ─── Stationary / duplicate point suppression ───────────────────────────────
+
+class PointSuppressor:
+    """
+    Per-bus persistence filter. A point is kept when, compared to the last kept
+    point of the bus, it moved at least LOCATION_SUPPRESS_MIN_DISTANCE_METERS,
+    its speed changed by at least LOCATION_SUPPRESS_MIN_SPEED_DELTA_KMH, or
+    LOCATION_HEARTBEAT_SECONDS passed. The last suppressed point is held
+    back and written just before the next moving point, so a stop collapses
+    into its first and last fix and the departure time is preserved.
+
+    The last kept and held points live in this worker's memory. With several
+    workers a bus's fixes land on different filters, which then compare
+    against stale points, and a held point is lost when the bus stops
+    reporting or the process exits. LOCATION_SUPPRESS_ENABLED is therefore
+    off by default.
+    """
+
+    def __init__(self):
+        self._kept: dict[str, dict] = {}
+        self._held: dict[str, dict] = {}
+
+    @staticmethod
+    def _moved(last: dict, item: dict) -> bool:
+        from ..core.geo import haversine_meters
+
+        distance = haversine_meters(
+            float(last["latitude"]), float(last["longitude"]),
+            float(item["latitude"]), float(item["longitude"]),
+        )
+        if distance >= settings.LOCATION_SUPPRESS_MIN_DISTANCE_METERS:
+            return True
+        last_speed, speed = last.get("speed"), item.get("speed")
+        if (last_speed is None) != (speed is None):
+            return True
+        return (
+            speed is not None
+            and abs(float(speed) - float(last_speed)) >= settings.LOCATION_SUPPRESS_MIN_SPEED_DELTA_KMH
+        )
+
+    def filter(self, item: dict) -> list[dict]:
+        """Points to persist for this fix: [], [item] or [held, item]."""
+        metrics.inc("location_points_received_total")
+        bus_id = item["bus_id"]
+        last = self._kept.get(bus_id)
+        if last is None:
+            self._kept[bus_id] = item
+            return [item]
+        elapsed = (item["timestamp"] - last["timestamp"]).total_seconds()
+        if elapsed >= settings.LOCATION_HEARTBEAT_SECONDS:
+            self._drop_held(bus_id)
+            self._kept[bus_id] = item
+            return [item]
+        if elapsed < 0 or not self._moved(last, item):
+            self._drop_held(bus_id)
+            self._held[bus_id] = item
+            return []
+        held = self._held.pop(bus_id, None)
+        self._kept[bus_id] = item
+        return [item] if held is None else [held, item]
+
+    def _drop_held(self, bus_id: str) -> None:
+        if self._held.pop(bus_id, None) is None:
+            return
+        metrics.inc("location_points_suppressed_total")
+        received = metrics.counter("location_points_received_total")
+        metrics.set_gauge(
+            "location_suppression_ratio",
+            metrics.counter("location_points_suppressed_total") / received,
+        )
+
+
+_point_suppressor = PointSuppressor()
+
+
+async def _record_latest(item: dict) -> None:
+    """Keep bus:{id}:latest current so readers never scan history for "now"."""
+    from ..services.latest_location_service import LatestLocationService
+
+    try:
+        await LatestLocationService().record(item)
+    except Exception as e:
+        logger.error(f"Latest location update failed for bus {item.get('bus_id')}: {e}")
+
+
+async def _record_trail(item: dict) -> None:
+    """Feed the live trail ring buffer (every point, before suppression)."""
+    from ..services.trail_service import trail_store
+
+    try:
+        await trail_store.record(
+            item["bus_id"], item["timestamp"], item["latitude"], item["longitude"], item.get("speed")
+        )
+    except Exception as e:
+        logger.error(f"Trail update failed for bus {item.get('bus_id')}: {e}")
+
+
+async def enqueue_location(item: dict) -> None:
+    """Hand a validated location point to the configured ingest pipeline."""
+    item.setdefault("id", str(uuid4()))
+    await _record_latest(item)
+    await _record_trail(item)
+    if not settings.LOCATION_SUPPRESS_ENABLED:
+        await _persist_location(item)
+        return
+    for point in _point_suppressor.filter(item):
+        await _persist_location(point)
+
+
+async def _persist_location(item: dict) -> None:
+    if settings.LOCATION_INGEST_MODE == "stream":
+        try:
+            redis = await redis_manager.get_redis()
+            await redis.xadd(
+                settings.LOCATION_STREAM_KEY,
+                _serialize_point(item),
+                maxlen=settings.LOCATION_STREAM_MAXLEN,
+                approximate=True,
+            )
+            return
+        except Exception as e:
+            logger.error(f"XADD to location stream failed, falling back to in-process queue: {e}")
+    await _location_queue.put(item)
+
+
+_ingest_load_cache: tuple[float, float] = (0.0, 0.0)  # (monotonic time, load)
+
+
+async def ingest_load() -> float:
+    """
+    Ingest backlog as a fraction of LOCATION_QUEUE_HIGH_WATER_MARK (0 = idle,
+    >= 1 = saturated): the local queue depth, and in stream mode the consumer
+    group lag. Cached for INGEST_LOAD_CACHE_SECONDS.
+    """
+    global _ingest_load_cache
+    now = time.monotonic()
+    cached_at, cached = _ingest_load_cache
+    if cached_at and now - cached_at < INGEST_LOAD_CACHE_SECONDS:
+        return cached
+    backlog = _location_queue.qsize()
+    if settings.LOCATION_INGEST_MODE == "stream":
+        try:
+            redis = await redis_manager.get_redis()
+            for group in await redis.xinfo_groups(settings.LOCATION_STREAM_KEY):
+                if group.get("name") == settings.LOCATION_STREAM_GROUP:
+                    backlog = max(backlog, int(group.get("lag") or 0))
+        except Exception as e:
+            logger.debug(f"Stream lag unavailable: {e}")
+    load = backlog / max(settings.LOCATION_QUEUE_HIGH_WATER_MARK, 1)
+    _ingest_load_cache = (now, load)
+    metrics.set_gauge("location_ingest_load", load)
+    return load
+
+
+_COPY_COLUMNS = ("id", "bus_id", "latitude", "longitude", "speed", "timestamp")
+
+# Writes must be idempotent: point ids survive stream redelivery and spill
+# replay, so a batch committed just before a crash (and before XACK) comes back.
+# COPY cannot skip conflicts, so it lands in a per-connection staging table and
+# is merged with ON CONFLICT DO NOTHING on the (id, timestamp) primary key.
+_STAGING_TABLE = "bus_locations_incoming"
+_CREATE_STAGING_SQL = (
+    f"CREATE TEMP TABLE IF NOT EXISTS {_STAGING_TABLE} "
+    f"(LIKE bus_locations INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+)
+_MERGE_STAGING_SQL = (
+    f"INSERT INTO bus_locations ({', '.join(_COPY_COLUMNS)}) "
+    f"SELECT {', '.join(_COPY_COLUMNS)} FROM {_STAGING_TABLE} "
+    f"ON CONFLICT (id, timestamp) DO NOTHING"
+)
+
+
+def _to_decimal(value) -> Decimal | None:
+    """asyncpg's binary numeric codec wants Decimal; go through str() to avoid float noise."""
+    if value is None:
+        return None
+    return Decimal(str(value))
+
+
+def _location_records(batch: list[dict]) -> list[tuple]:
+    """Build bus_locations rows (in _COPY_COLUMNS order) for a batch of points."""
+    return [
+        (
+            item.get("id") or str(uuid4()),
+            item["bus_id"],
+            _to_decimal(item["latitude"]),
+            _to_decimal(item["longitude"]),
+            _to_decimal(item.get("speed")),
+            _to_db_naive_utc(item["timestamp"]),
+        )
+        for item in batch
+    ]
+
+
+def _count_duplicates(written: int, status: str) -> None:
+    """Count redelivered rows skipped by ON CONFLICT, from an "INSERT 0 <n>" status."""
+    try:
+        inserted = int(status.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError):
+        return
+    if inserted < written:
+        metrics.inc("location_duplicate_rows_skipped_total", written - inserted)
+
+
+async def _copy_location_batch(batch: list[dict]) -> None:
+    """Binary COPY into the staging table, then one INSERT ... SELECT that skips rows already stored."""
+    from ..database.database import engine
+
+    records = _location_records(batch)
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        async with driver.transaction():
+            await driver.execute(_CREATE_STAGING_SQL)
+            await driver.copy_records_to_table(_STAGING_TABLE, records=records, columns=_COPY_COLUMNS)
+            status = await driver.execute(_MERGE_STAGING_SQL)
+    _count_duplicates(len(records), status)
+
+
+async def _insert_location_batch(batch: list[dict]) -> None:
+    """Core multi-row INSERT (executemany) — fallback when COPY is not available. Skips rows already stored."""
+    from sqlalchemy.dialects.postgresql import insert
+    from ..database.database import engine
+    from ..database.models.bus_location import BusLocation
+
+    rows = [dict(zip(_COPY_COLUMNS, record)) for record in _location_records(batch)]
+    statement = insert(BusLocation.__table__).on_conflict_do_nothing(index_elements=["id", "timestamp"])
+    async with engine.begin() as conn:
+        await conn.execute(statement, rows)
+
+
+async def _orm_location_batch(batch: list[dict]) -> None:
+    """
+    Original ORM unit-of-work path, kept for comparison and as a last resort.
+    A redelivered batch hits the primary key; it is then rewritten with the
+    ON CONFLICT insert so stored rows are skipped.
+    """
+    from sqlalchemy.exc import IntegrityError
+    from ..database.database import AsyncSessionLocal
+    from ..database.models.bus_location import BusLocation
+
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            BusLocation(
+                id=item.get("id") or str(uuid4()),
+                bus_id=item["bus_id"],
+                latitude=item["latitude"],
+                longitude=item["longitude"],
+                speed=item.get("speed"),
+                timestamp=_to_db_naive_utc(item["timestamp"]),
+            )
+            for item in batch
+        ])
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+        else:
+            return
+    await _insert_location_batch(batch)
+
+
+_WRITE_METHODS = {
+    "copy": _copy_location_batch,
+    "insert": _insert_location_batch,
+    "orm": _orm_location_batch,
+}
+
+
+async def write_location_batch(batch: list[dict], method: str | None = None) -> None:
+    """Persist a batch of location points atomically. Raises on failure."""
+    if not batch:
+        return
+    writer = _WRITE_METHODS[method or settings.LOCATION_WRITE_METHOD]
+    await writer(batch)
+
+
+async def _flush_batch(batch: list[dict]) -> bool:
+    """Write one queue batch; spill it to disk if the DB write fails."""
+    started = time.perf_counter()
+    try:
+        await write_location_batch(batch)
+    except Exception as e:
+        logger.error(f"Batch location write failed, spilling {len(batch)} record(s) to disk: {e}")
+        await asyncio.to_thread(_location_spill.append, [_serialize_point(item) for item in batch])
+        return False
+    metrics.observe("location_flush_latency_ms", (time.perf_counter() - started) * 1000)
+    metrics.inc("location_flush_rows_total", len(batch))
+    logger.info(f"Batch wrote {len(batch)} location record(s) to DB")
+    return True
+
+
+def _deserialize_spilled(records: list[dict]) -> list[dict]:
+    points = []
+    for record in records:
+        try:
+            points.append(_deserialize_point(record))
+        except (KeyError, TypeError, ValueError):
+            metrics.inc("location_spill_corrupt_total")
+    return points
+
+
+async def _replay_spill() -> None:
+    """Re-insert spilled batches; whatever fails again stays on disk for the next attempt."""
+    paths = await asyncio.to_thread(_location_spill.claim)
+    for path in paths:
+        chunks = _location_spill.read_chunks(path, settings.LOCATION_QUEUE_MAX_BATCH_SIZE)
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            try:
+                await write_location_batch(_deserialize_spilled(chunk))
+            except Exception as e:
+                logger.warning(f"Spill replay paused, DB still unavailable: {e}")
+                remaining = await asyncio.to_thread(lambda: chunk + [r for rest in chunks for r in rest])
+                await asyncio.to_thread(_location_spill.retain, path, remaining)
+                return
+            metrics.inc("location_spill_replayed_total", len(chunk))
+        await asyncio.to_thread(_location_spill.release, path)
+        logger.info(f"Replayed spilled location batches from {path}")
+
+
+async def batch_location_writer():
+    """Background task: flush queued points at N items or T ms and replay spilled batches."""
+    try:
+        while True:
+            batch = await _location_queue.get_batch(timeout=SPILL_RETRY_INTERVAL_SECONDS)
+            if batch and not await _flush_batch(batch):
+                continue
+            if _location_spill.size_bytes():
+                await _replay_spill()
+    except asyncio.CancelledError:
+        # Shutdown: keep whatever is still buffered for the next process to replay.
+        leftover = _location_queue.drain_nowait()
+        if leftover:
+            _location_spill.append([_serialize_point(item) for item in leftover])
+            logger.info(f"Spilled {len(leftover)} buffered location record(s) on shutdown")
+        raise
+
+
+# ─── Redis Streams consumer ──────────────────────────────────────────────────
+
+async def _check_eviction_policy(redis) -> None:
+    """Log loudly when Redis may evict the stream (allkeys-* policy) before it is acked."""
+    try:
+        policy = (await redis.config_get("maxmemory-policy")).get("maxmemory-policy", "")
+    except Exception as e:
+        # CONFIG is disabled on some managed Redis services
+        logger.debug(f"maxmemory-policy unavailable: {e}")
+        return
+    if policy.startswith("allkeys"):
+        metrics.inc("location_stream_evictable_total")
+        logger.error(
+            f"Redis maxmemory-policy is {policy}: the location stream and its consumer group can be "
+            f"evicted before XACK. Use noeviction or volatile-lru with appendonly yes in stream mode."
+        )
+
+
+async def _ensure_consumer_group(redis) -> None:
+    try:
+        await redis.xgroup_create(
+            settings.LOCATION_STREAM_KEY,
+            settings.LOCATION_STREAM_GROUP,
+            id="0",
+            mkstream=True,
+        )
+        logger.info(
+            f"Created consumer group {settings.LOCATION_STREAM_GROUP} on {settings.LOCATION_STREAM_KEY}"
+        )
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _stream_messages(response) -> list:
+    """Normalize XREADGROUP output (RESP2 list or RESP3 dict) to [(id, fields), ...]."""
+    if not response:
+        return []
+    entries = response.items() if isinstance(response, dict) else response
+    messages = []
+    for _stream, stream_messages in entries:
+        messages.extend(stream_messages or [])
+    return messages
+
+
+async def _process_stream_messages(redis, messages: list) -> bool:
+    """Write a batch of stream entries to DB and ack them. Returns False if the DB write failed."""
+    batch: list[dict] = []
+    ids: list[str] = []
+    malformed: list[str] = []
+    for message_id, fields in messages:
+        if not fields:
+            # Entry was trimmed from the stream while pending; nothing to write.
+            malformed.append(message_id)
+            continue
+        try:
+            batch.append(_deserialize_point(fields))
+            ids.append(message_id)
+        except (KeyError, TypeError, ValueError):
+            malformed.append(message_id)
+
+    if malformed:
+        logger.warning(f"Dropping {len(malformed)} malformed location stream entries")
+        await redis.xack(settings.LOCATION_STREAM_KEY, settings.LOCATION_STREAM_GROUP, *malformed)
+
+    if not batch:
+        return True
+
+    try:
+        await write_location_batch(batch)
+    except Exception as e:
+        logger.error(f"Stream location write failed, {len(batch)} entries stay pending: {e}")
+        return False
+
+    # Ack only after the commit succeeded — unacked entries are redelivered.
+    await redis.xack(settings.LOCATION_STREAM_KEY, settings.LOCATION_STREAM_GROUP, *ids)
+    logger.info(f"Stream wrote {len(batch)} location record(s) to DB")
+    return True
+
+
+async def _claim_stale_entries(redis, consumer_name: str) -> list:
+    """Take over entries left pending by consumers that died before acking."""
+    response = await redis.xautoclaim(
+        settings.LOCATION_STREAM_KEY,
+        settings.LOCATION_STREAM_GROUP,
+        consumer_name,
+        min_idle_time=settings.LOCATION_STREAM_CLAIM_IDLE_MS,
+        start_id="0-0",
+        count=settings.LOCATION_STREAM_BATCH_SIZE,
+    )
+    # [next_start_id, messages, deleted_ids] (deleted_ids only on Redis >= 7)
+    return list(response[1]) if response and len(response) > 1 else []
+
+
+async def stream_location_writer(consumer_name: str | None = None):
+    """Background task: consume the location stream and persist it in batches."""
+    consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+    redis = await redis_manager.get_redis()
+    await _check_eviction_policy(redis)
+    await _ensure_consumer_group(redis)
+    logger.info(f"Location stream writer started (consumer={consumer_name})")
+
+    # "0" re-reads this consumer's own pending entries first, ">" reads new ones.
+    read_id = "0"
+    claim_interval = settings.LOCATION_STREAM_CLAIM_IDLE_MS / 1000
+    last_claim_at = 0.0
+
+    while True:
+        try:
+            now = time.monotonic()
+            if now - last_claim_at >= claim_interval:
+                last_claim_at = now
+                claimed = await _claim_stale_entries(redis, consumer_name)
+                if claimed:
+                    logger.info(f"Claimed {len(claimed)} stale location stream entries")
+                    if not await _process_stream_messages(redis, claimed):
+                        await asyncio.sleep(STREAM_RETRY_BACKOFF_SECONDS)
+                        continue
+
+            response = await redis.xreadgroup(
+                settings.LOCATION_STREAM_GROUP,
+                consumer_name,
+                {settings.LOCATION_STREAM_KEY: read_id},
+                count=settings.LOCATION_STREAM_BATCH_SIZE,
+                block=settings.LOCATION_STREAM_BLOCK_MS,
+            )
+            messages = _stream_messages(response)
+            if not messages:
+                read_id = ">"
+                continue
+
+            if not await _process_stream_messages(redis, messages):
+                read_id = "0"
+                await asyncio.sleep(STREAM_RETRY_BACKOFF_SECONDS)
+        except asyncio.CancelledError:
+            logger.info("Location stream writer cancelled.")
+            raise
+        except Exception:
+            logger.exception("Location stream writer loop failed, retrying.")
+            await asyncio.sleep(STREAM_RETRY_BACKOFF_SECONDS)
+
+
+async def _run_standalone():
+    await redis_manager.connect()
+    try:
+        await stream_location_writer()
+    finally:
+        await redis_manager.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run_standalone())
@@ -0,0 +1,211 @@
+"""
+Route Pre-computation
+
+Rotalar ilk GET /driver/buses/me/route isteğinde hesaplanıyordu; günün ilk
+isteği tam DB + Google gecikmesini tam şoförler yola çıkarken ödüyordu. Bu
+görev her organizasyonun vardiya başlangıcından ROUTE_PRECOMPUTE_LEAD_MINUTES
+önce aktif otobüslerin rotasını hesaplar:
+
+- sabah vardiyası (morning_shift_start) -> to_school
+- öğleden sonra vardiyası (afternoon_shift_start) -> from_school
+
+Otobüs, okulu bir okul organizasyonuna bağlıysa o okulun vardiyasıyla,
+değilse taşıma şirketinin (Bus.organization_id) vardiyasıyla hesaplanır; ikisi
+de yoksa varsayılan saatler kullanılır. Organizasyonda saat tanımlı değilse
+DEFAULT_*_SHIFT_START kullanılır (saatler SHIFT_TIMEZONE'a göre yereldir).
+
+Rota refresh=True ile hesaplanır: eski plan ve cache atlanır, yeni plan
+kaydedilir. Konumsuz istek (veli/yönetici görünümü) cache hit olur; şoförün
+origin_lat/origin_lng ile yaptığı istek farklı cache anahtarına düşer ama
+Google'a gitmeden bu plandan türetilir. Maps API'ye aynı anda en fazla
+ROUTE_PRECOMPUTE_CONCURRENCY istek gider. Her (organizasyon, yön, gün) için
+Redis'te SET NX işareti tutulduğundan birden fazla worker aynı işi tekrarlamaz.
+
+Kullanım (tüm aktif otobüsler, tek sefer):
+  python -m app.tasks.route_precompute [to_school|from_school]
+"""
+import asyncio
+import logging
+import sys
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import exists, select
+
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+from ..database.models.organization import OrganizationType
+
+logger = logging.getLogger(__name__)
+
+TRIP_TYPES = ("to_school", "from_school")
+POLL_INTERVAL_SECONDS = 60
+_MARKER_TTL_SECONDS = 24 * 60 * 60
+
+
+def shift_starts(
+    morning: Optional[time],
+    afternoon: Optional[time],
+) -> Dict[str, time]:
+    """Shift start per trip type, falling back to the configured defaults."""
+    return {
+        "to_school": morning or time.fromisoformat(settings.DEFAULT_MORNING_SHIFT_START),
+        "from_school": afternoon or time.fromisoformat(settings.DEFAULT_AFTERNOON_SHIFT_START),
+    }
+
+
+def due_trip_types(starts: Dict[str, time], now_local: datetime, lead_minutes: int) -> List[str]:
+    """Trip types whose shift starts within the next lead_minutes (start itself excluded)."""
+    due = []
+    for trip_type, start in starts.items():
+        start_at = datetime.combine(now_local.date(), start, tzinfo=now_local.tzinfo)
+        if start_at - timedelta(minutes=lead_minutes) <= now_local < start_at:
+            due.append(trip_type)
+    return due
+
+
+def _marker_key(organization_id: str, trip_type: str, day: date) -> str:
+    return f"route_precompute:{organization_id}:{trip_type}:{day.isoformat()}"
+
+
+async def _claim(organization_id: str, trip_type: str, day: date) -> bool:
+    """First worker to claim (organization, trip_type, day) runs it."""
+    redis = await redis_manager.get_redis()
+    claimed = await redis.set(
+        _marker_key(organization_id, trip_type, day), "1", nx=True, ex=_MARKER_TTL_SECONDS
+    )
+    return bool(claimed)
+
+
+_NO_ORGANIZATION = "none"
+
+
+async def _active_bus_ids(
+    organization_id: Optional[str] = None,
+    organization_type: Optional[OrganizationType] = None,
+) -> List[str]:
+    """
+    Buses with at least one assigned student whose shift is set by the given
+    organization, scoped like BusService._apply_bus_scope: a school
+    organization owns the buses of its schools; a transport company owns its
+    buses whose school has no organization. _NO_ORGANIZATION selects buses
+    with neither. Without organization_id every active bus is returned.
+    """
+    from ..database.database import AsyncSessionLocal
+    from ..database.models.bus import Bus
+    from ..database.models.school import School
+    from ..database.models.student_bus_assignment import StudentBusAssignment
+
+    query = select(Bus.id).where(exists().where(StudentBusAssignment.bus_id == Bus.id))
+    if organization_id is not None:
+        query = query.join(School, School.id == Bus.school_id)
+        if organization_type == OrganizationType.school:
+            query = query.where(School.organization_id == organization_id)
+        elif organization_id == _NO_ORGANIZATION:
+            query = query.where(School.organization_id.is_(None), Bus.organization_id.is_(None))
+        else:
+            query = query.where(School.organization_id.is_(None), Bus.organization_id == organization_id)
+    async with AsyncSessionLocal() as db:
+        return list((await db.execute(query.order_by(Bus.id))).scalars().all())
+
+
+async def precompute_routes(
+    bus_ids: Iterable[str],
+    trip_type: str,
+    concurrency: Optional[int] = None,
+) -> int:
+    """
+    Compute and cache the route of each bus for trip_type, at most `concurrency`
+    at a time. Returns the number of routes computed.
+    """
+    from ..database.database import AsyncSessionLocal
+    from ..services.route_service import RouteService
+
+    semaphore = asyncio.Semaphore(concurrency or settings.ROUTE_PRECOMPUTE_CONCURRENCY)
+
+    async def precompute_one(bus_id: str) -> bool:
+        async with semaphore:
+            try:
+                # Each bus gets its own session; AsyncSession is not safe to share across tasks.
+                async with AsyncSessionLocal() as db:
+                    await RouteService(db).get_optimized_route(bus_id=bus_id, trip_type=trip_type, refresh=True)
+                metrics.inc("route_precompute_total")
+                return True
+            except Exception:
+                metrics.inc("route_precompute_failed_total")
+                logger.exception(f"Route pre-computation failed for bus {bus_id} ({trip_type})")
+                return False
+
+    results = await asyncio.gather(*(precompute_one(bus_id) for bus_id in bus_ids))
+    return sum(results)
+
+
+async def run_due_precomputations(now: Optional[datetime] = None) -> int:
+    """One scheduler tick: pre-compute every (organization, trip_type) whose window is open."""
+    from ..database.database import AsyncSessionLocal
+    from ..database.models.organization import Organization
+
+    tz = ZoneInfo(settings.SHIFT_TIMEZONE)
+    now_local = (now or datetime.now(timezone.utc)).astimezone(tz)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(
+                Organization.id,
+                Organization.type,
+                Organization.morning_shift_start,
+                Organization.afternoon_shift_start,
+            ).where(Organization.is_active.is_(True))
+        )
+        organizations: List[Tuple[str, OrganizationType, Optional[time], Optional[time]]] = list(result.all())
+    # Buses without any organization run on the default shift starts
+    organizations.append((_NO_ORGANIZATION, None, None, None))
+
+    computed = 0
+    for organization_id, organization_type, morning, afternoon in organizations:
+        starts = shift_starts(morning, afternoon)
+        for trip_type in due_trip_types(starts, now_local, settings.ROUTE_PRECOMPUTE_LEAD_MINUTES):
+            if not await _claim(organization_id, trip_type, now_local.date()):
+                continue
+            bus_ids = await _active_bus_ids(organization_id, organization_type)
+            if not bus_ids:
+                continue
+            done = await precompute_routes(bus_ids, trip_type)
+            computed += done
+            logger.info(
+                f"Pre-computed {done}/{len(bus_ids)} {trip_type} route(s) for organization {organization_id}."
+            )
+    return computed
+
+
+async def route_precompute_scheduler() -> None:
+    """Background task: checks the shift windows every POLL_INTERVAL_SECONDS."""
+    while True:
+        try:
+            await run_due_precomputations()
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        except asyncio.CancelledError:
+            logger.info("Route pre-computation scheduler cancelled.")
+            break
+        except Exception:
+            logger.exception("Route pre-computation tick failed, will retry.")
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+async def _precompute_all(trip_types: Iterable[str]) -> None:
+    bus_ids = await _active_bus_ids()
+    for trip_type in trip_types:
+        done = await precompute_routes(bus_ids, trip_type)
+        logger.info(f"Pre-computed {done}/{len(bus_ids)} {trip_type} route(s).")
+    await redis_manager.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    requested = sys.argv[1:] or list(TRIP_TYPES)
+    unknown = [trip_type for trip_type in requested if trip_type not in TRIP_TYPES]
+    if unknown:
+        sys.exit(f"Unknown trip type(s): {', '.join(unknown)}")
+    asyncio.run(_precompute_all(requested))
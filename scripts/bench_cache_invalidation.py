@@ -0,0 +1,87 @@
+"""
+Route cache invalidation benchmark: SCAN + DEL (delete_pattern) vs tag index
+(set_tagged / invalidate_tag), as the unrelated keyspace grows.
+
+For each keyspace size the script fills Redis with filler keys (ETA,
+blacklist, rate-limit style), writes --route-keys route keys for one bus,
+then times a single invalidation with each method (median of --runs).
+
+Needs a reachable Redis (REDIS_HOST / REDIS_PORT settings). Uses the bench:*
+key prefix and deletes it afterwards — do not point it at production.
+
+  python scripts/bench_cache_invalidation.py --keyspace 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.redis import redis_manager  # noqa: E402
+
+BUS_ID = "bench-bus"
+TAG = f"bench-routes:{BUS_ID}"
+
+
+async def _fill(redis, count: int) -> None:
+    batch = 10_000
+    for start in range(0, count, batch):
+        async with redis.pipeline(transaction=False) as pipe:
+            for i in range(start, min(start + batch, count)):
+                pipe.set(f"bench:filler:{i}", "x", ex=3600)
+            await pipe.execute()
+
+
+async def _write_routes(redis, count: int, tagged: bool) -> None:
+    for i in range(count):
+        key = f"bench:route:{BUS_ID}:{i}"
+        if tagged:
+            await redis_manager.set_tagged(key, "{}", tags=[TAG], ex=1800)
+        else:
+            await redis.set(key, "{}", ex=1800)
+
+
+async def _cleanup(redis) -> None:
+    async for key in redis.scan_iter(match="bench:*", count=10_000):
+        await redis.unlink(key)
+    await redis.unlink(f"tag:{TAG}")
+
+
+async def _run(keyspace_sizes: list[int], route_keys: int, runs: int) -> None:
+    redis = await redis_manager.get_redis()
+    print(f"route_keys={route_keys} runs={runs}")
+    print(f"{'filler keys':>12} {'delete_pattern ms':>18} {'invalidate_tag ms':>18} {'speedup':>8}")
+    for size in keyspace_sizes:
+        await _cleanup(redis)
+        await _fill(redis, size)
+        scan_ms, tag_ms = [], []
+        for _ in range(runs):
+            await _write_routes(redis, route_keys, tagged=False)
+            started = time.perf_counter()
+            await redis_manager.delete_pattern(f"bench:route:{BUS_ID}:*")
+            scan_ms.append((time.perf_counter() - started) * 1000)
+
+            await _write_routes(redis, route_keys, tagged=True)
+            started = time.perf_counter()
+            await redis_manager.invalidate_tag(TAG)
+            tag_ms.append((time.perf_counter() - started) * 1000)
+        scan, tag = statistics.median(scan_ms), statistics.median(tag_ms)
+        print(f"{size:>12} {scan:>18.2f} {tag:>18.2f} {scan / tag if tag else float('inf'):>7.0f}x")
+    await _cleanup(redis)
+    await redis_manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keyspace", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--route-keys", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(_run(args.keyspace, args.route_keys, args.runs))
+
+
+if __name__ == "__main__":
+    main()
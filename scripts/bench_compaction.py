@@ -0,0 +1,171 @@
+"""
+bus_locations compaction benchmark: Douglas-Peucker (compact_bus_locations)
+on a synthetic table of --rows points.
+
+Tracks are generated per bus-day as 5-second fixes: straight road legs with
+turns every few hundred metres, 3 m GPS noise, 30-90 s stops and a midday gap
+between the morning and afternoon trips. Every bus-day goes through
+compaction_keep_indices exactly as the task does; the script reports rows
+kept, the reduction, throughput, and the worst deviation of a dropped point
+from the simplified track (sampled).
+
+With --database the raw and compacted rows are also COPY'd into two UNLOGGED
+scratch tables (bench_locations_raw / bench_locations_compact) with the
+bus_locations (bus_id, timestamp) index, and their table and index sizes are
+printed. Needs the regular POSTGRES_* settings; the scratch tables are dropped
+afterwards.
+
+  python scripts/bench_compaction.py
+  python scripts/bench_compaction.py --rows 10000000 --tolerance 10 --database
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.geo import EARTH_RADIUS_M  # noqa: E402
+from app.tasks.compact_bus_locations import compaction_keep_indices  # noqa: E402
+
+FIX_SECONDS = 5
+TRIP_FIXES = 2 * 60 * 60 // FIX_SECONDS  # two 2-hour trips per bus-day
+DAY_START = datetime(2026, 1, 5, 6, 30)
+
+
+def _trip(rng: np.random.Generator, origin: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """(points, speeds km/h) for one trip of TRIP_FIXES fixes."""
+    lat, lng = origin
+    heading = rng.uniform(0, 2 * np.pi)
+    points, speeds = [], []
+    while len(points) < TRIP_FIXES:
+        if rng.random() < 0.15:  # stop: 30-90 s in place
+            for _ in range(int(rng.integers(6, 19))):
+                points.append((lat, lng))
+                speeds.append(0.0)
+            continue
+        heading += rng.choice([-np.pi / 2, 0.0, np.pi / 2]) + rng.normal(0, 0.05)
+        speed_mps = rng.uniform(6, 14)
+        for _ in range(int(rng.integers(20, 60)) // FIX_SECONDS + 1):
+            step = speed_mps * FIX_SECONDS
+            lat += np.degrees(step * np.cos(heading) / EARTH_RADIUS_M)
+            lng += np.degrees(step * np.sin(heading) / (EARTH_RADIUS_M * np.cos(np.radians(lat))))
+            points.append((lat, lng))
+            speeds.append(speed_mps * 3.6)
+    noise = rng.normal(0, 3 / 111_320, (TRIP_FIXES, 2))
+    return np.asarray(points[:TRIP_FIXES]) + noise, np.asarray(speeds[:TRIP_FIXES])
+
+
+def _bus_day(rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    origin = (41.0 + rng.uniform(0, 0.1), 28.9 + rng.uniform(0, 0.2))
+    morning, morning_speeds = _trip(rng, origin)
+    afternoon, afternoon_speeds = _trip(rng, origin)
+    seconds = np.concatenate([
+        np.arange(TRIP_FIXES) * FIX_SECONDS,
+        8 * 3600 + np.arange(TRIP_FIXES) * FIX_SECONDS,
+    ]).astype(np.float64)
+    return np.vstack([morning, afternoon]), np.concatenate([morning_speeds, afternoon_speeds]), seconds
+
+
+def _max_deviation(points: np.ndarray, keep: np.ndarray) -> float:
+    y = np.radians(points[:, 0]) * EARTH_RADIUS_M
+    x = np.radians(points[:, 1]) * EARTH_RADIUS_M * np.cos(np.radians(points[:, 0].mean()))
+    worst = 0.0
+    for start, end in zip(keep[:-1], keep[1:]):
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        t = np.clip((px * dx + py * dy) / max(dx * dx + dy * dy, 1e-12), 0, 1)
+        worst = max(worst, float(np.hypot(px - t * dx, py - t * dy).max()))
+    return worst
+
+
+def _records(bus_id: str, points: np.ndarray, speeds: np.ndarray, seconds: np.ndarray, day: int):
+    base = DAY_START + timedelta(days=day)
+    return [
+        (str(uuid4()), bus_id, float(lat), float(lng), float(speed), base + timedelta(seconds=float(second)))
+        for (lat, lng), speed, second in zip(points, speeds, seconds)
+    ]
+
+
+async def _create_scratch_tables(conn) -> None:
+    for table in ("bench_locations_raw", "bench_locations_compact"):
+        await conn.execute(f"DROP TABLE IF EXISTS {table}")
+        await conn.execute(
+            f"CREATE UNLOGGED TABLE {table} (id varchar PRIMARY KEY, bus_id varchar, "
+            f"latitude numeric(10, 8), longitude numeric(11, 8), speed numeric, timestamp timestamp)"
+        )
+        await conn.execute(f"CREATE INDEX ix_{table}_bus_ts ON {table} (bus_id, timestamp)")
+
+
+async def _report_sizes(conn) -> None:
+    print(f"{'table':<24} {'rows':>12} {'table MB':>9} {'index MB':>9}")
+    for table in ("bench_locations_raw", "bench_locations_compact"):
+        rows = await conn.fetchval(f"SELECT count(*) FROM {table}")
+        table_mb = await conn.fetchval(f"SELECT pg_table_size('{table}')") / 2**20
+        index_mb = await conn.fetchval(f"SELECT pg_indexes_size('{table}')") / 2**20
+        print(f"{table:<24} {rows:>12,} {table_mb:>9.1f} {index_mb:>9.1f}")
+        await conn.execute(f"DROP TABLE {table}")
+
+
+async def _run(args) -> None:
+    rng = np.random.default_rng(args.seed)
+    bus_days = max(1, args.rows // (2 * TRIP_FIXES))
+    conn = None
+    if args.database:
+        from app.database.database import engine
+
+        sa_conn = await engine.connect()
+        conn = (await sa_conn.get_raw_connection()).driver_connection
+        await _create_scratch_tables(conn)
+
+    total = kept_total = 0
+    elapsed = 0.0
+    worst = 0.0
+    columns = ("id", "bus_id", "latitude", "longitude", "speed", "timestamp")
+    for index in range(bus_days):
+        points, speeds, seconds = _bus_day(rng)
+        started = time.perf_counter()
+        keep = compaction_keep_indices(points, seconds, args.tolerance, args.dwell_radius, args.dwell_seconds)
+        elapsed += time.perf_counter() - started
+        total += len(points)
+        kept_total += len(keep)
+        if index % max(1, bus_days // 20) == 0:
+            worst = max(worst, _max_deviation(points, keep))
+        if conn is not None:
+            records = _records(f"bus-{index % args.buses}", points, speeds, seconds, index // args.buses)
+            await conn.copy_records_to_table("bench_locations_raw", records=records, columns=columns)
+            await conn.copy_records_to_table(
+                "bench_locations_compact", records=[records[i] for i in keep], columns=columns
+            )
+
+    print(f"bus-days={bus_days} tolerance={args.tolerance:g} m dwell={args.dwell_radius:g} m/{args.dwell_seconds:g} s")
+    print(f"{'rows':>12} {'kept':>10} {'kept %':>7} {'rows/sec':>12} {'max dev m':>10}")
+    print(f"{total:>12,} {kept_total:>10,} {100 * kept_total / total:>7.2f} {total / elapsed:>12,.0f} {worst:>10.2f}")
+    if conn is not None:
+        await _report_sizes(conn)
+        await sa_conn.close()
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--buses", type=int, default=100)
+    parser.add_argument("--tolerance", type=float, default=10.0)
+    parser.add_argument("--dwell-radius", type=float, default=40.0)
+    parser.add_argument("--dwell-seconds", type=float, default=45.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
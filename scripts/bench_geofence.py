@@ -0,0 +1,66 @@
+"""
+Geofence check benchmark: grid index (GeofenceIndex.hits) vs a brute-force
+haversine over every fence, per location point.
+
+For each fence count, homes are drawn in a ~20 x 25 km box (Istanbul) with
+approach and arrival fences; --points random bus positions are checked with
+both methods. Reports per-point latency and verifies both return the same hits.
+
+  python scripts/bench_geofence.py
+  python scripts/bench_geofence.py --fences 50 500 5000 50000 --points 20000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.geo import haversine_meters  # noqa: E402
+from app.services.geofence_service import GeofenceIndex, build_trip_fences  # noqa: E402
+
+
+def _point(rng: random.Random):
+    return 40.98 + rng.uniform(0, 0.18), 28.85 + rng.uniform(0, 0.28)
+
+
+def _brute(fences, lat, lng):
+    return [f for f in fences if haversine_meters(lat, lng, f.latitude, f.longitude) <= f.radius_m]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fences", type=int, nargs="+", default=[50, 500, 5000, 50000])
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"points={args.points}")
+    print(f"{'fences':>7} {'brute us/pt':>12} {'grid us/pt':>11} {'speedup':>8} {'hits':>7}")
+    for count in args.fences:
+        homes = {str(i): _point(rng) for i in range(count // 2)}
+        fences = build_trip_fences("from_school", homes, None)
+        index = GeofenceIndex(fences)
+        points = [_point(rng) for _ in range(args.points)]
+
+        started = time.perf_counter()
+        brute = [_brute(fences, lat, lng) for lat, lng in points]
+        brute_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        grid = [index.hits(lat, lng) for lat, lng in points]
+        grid_s = time.perf_counter() - started
+
+        for expected, found in zip(brute, grid):
+            assert {f.fence_id for f in expected} == {f.fence_id for f, _ in found}
+        hits = sum(len(found) for found in grid)
+        print(
+            f"{len(fences):>7} {brute_s / args.points * 1e6:>12.1f} {grid_s / args.points * 1e6:>11.1f} "
+            f"{brute_s / grid_s:>7.1f}x {hits:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+bus_locations flush benchmark: ORM add_all vs Core executemany vs asyncpg COPY.
+
+Writes synthetic points for one bus at 1k / 10k / 100k rows per flush through
+each write method of app.tasks.location_writer and prints rows/sec. Inserted
+rows are removed after every run.
+
+Needs a migrated database reachable with the regular POSTGRES_* settings and an
+existing bus dedicated to testing (its rows inside the benchmark window are deleted):
+
+  python scripts/bench_location_flush.py --bus-id <test-bus-id>
+  python scripts/bench_location_flush.py --bus-id <id> --sizes 1000 10000 --methods copy insert
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.database.database import engine  # noqa: E402
+from app.tasks.location_writer import write_location_batch  # noqa: E402
+
+
+def _synthetic_batch(bus_id: str, size: int, start: datetime) -> list[dict]:
+    lat, lng = 41.0082, 28.9784
+    batch = []
+    for i in range(size):
+        lat += random.uniform(-0.0002, 0.0002)
+        lng += random.uniform(-0.0002, 0.0002)
+        batch.append({
+            "bus_id": bus_id,
+            "latitude": round(lat, 7),
+            "longitude": round(lng, 7),
+            "speed": round(random.uniform(0, 60), 1),
+            "timestamp": start + timedelta(milliseconds=i),
+        })
+    return batch
+
+
+async def _delete_window(bus_id: str, start: datetime, end: datetime) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM bus_locations WHERE bus_id = :bus_id AND timestamp >= :start AND timestamp <= :end"),
+            {"bus_id": bus_id, "start": start.replace(tzinfo=None), "end": end.replace(tzinfo=None)},
+        )
+
+
+async def _run(bus_id: str, sizes: list[int], methods: list[str], repeat: int) -> None:
+    print(f"{'method':<8} {'rows':>8} {'best s':>9} {'rows/sec':>12}")
+    for size in sizes:
+        for method in methods:
+            best = float("inf")
+            for _ in range(repeat):
+                start = datetime.now(timezone.utc)
+                batch = _synthetic_batch(bus_id, size, start)
+                t0 = time.perf_counter()
+                await write_location_batch(batch, method=method)
+                elapsed = time.perf_counter() - t0
+                best = min(best, elapsed)
+                await _delete_window(bus_id, start, batch[-1]["timestamp"])
+            print(f"{method:<8} {size:>8} {best:>9.3f} {size / best:>12,.0f}")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bus-id", required=True)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--methods", nargs="+", default=["orm", "insert", "copy"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(_run(args.bus_id, args.sizes, args.methods, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
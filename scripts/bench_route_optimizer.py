@@ -0,0 +1,57 @@
+"""
+Local route optimizer benchmark: greedy nearest-neighbour vs 2-opt/Or-opt.
+
+For each stop count, random stops are drawn in a ~20 x 25 km box (Istanbul),
+with the origin at one corner and the school at the other. Reports median
+route length for the greedy seed and the optimized route, the improvement,
+and optimizer latency (median / max) under the configured time budget.
+
+  python scripts/bench_route_optimizer.py
+  python scripts/bench_route_optimizer.py --sizes 10 25 60 150 --runs 20 --budget-ms 200
+"""
+import argparse
+import random
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.route_optimizer import optimize_route  # noqa: E402
+
+ORIGIN = (40.98, 28.85)
+SCHOOL = (41.16, 29.13)
+
+
+def _stops(count: int, rng: random.Random):
+    return [(40.98 + rng.uniform(0, 0.18), 28.85 + rng.uniform(0, 0.28)) for _ in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 60, 150])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"runs={args.runs} budget={args.budget_ms:g}ms")
+    print(f"{'stops':>5} {'greedy km':>10} {'2opt+oropt km':>14} {'gain %':>7} {'p50 ms':>8} {'max ms':>8} {'timeouts':>8}")
+    for size in args.sizes:
+        greedy, optimized, gains, latencies, timeouts = [], [], [], [], 0
+        for _ in range(args.runs):
+            tour = optimize_route(_stops(size, rng), origin=ORIGIN, destination=SCHOOL, time_budget_ms=args.budget_ms)
+            greedy.append(tour.seed_distance_meters / 1000)
+            optimized.append(tour.distance_meters / 1000)
+            gains.append(100 * (1 - tour.distance_meters / tour.seed_distance_meters))
+            latencies.append(tour.elapsed_ms)
+            timeouts += tour.timed_out
+        print(
+            f"{size:>5} {statistics.median(greedy):>10.1f} {statistics.median(optimized):>14.1f} "
+            f"{statistics.median(gains):>7.1f} {statistics.median(latencies):>8.1f} {max(latencies):>8.1f} {timeouts:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+WebSocket fan-out benchmark: one Redis PubSub per socket vs the shared PubSubHub.
+
+Simulates N parent sockets watching the same bus (their "send" is a no-op
+coroutine), publishes M location frames and reports, per mode:
+
+- Redis connected_clients while all listeners are subscribed
+- worker CPU seconds spent receiving/dispatching, normalized per 1,000 sockets
+
+Needs a reachable Redis (REDIS_HOST / REDIS_PORT settings):
+
+  python scripts/bench_ws_fanout.py --sockets 1000 --messages 200
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.pubsub_hub import PubSubHub  # noqa: E402
+from app.core.redis import redis_manager  # noqa: E402
+
+CHANNEL = "bench:bus:location"
+
+
+async def _connected_clients(redis) -> int:
+    return int((await redis.info("clients"))["connected_clients"])
+
+
+async def _wait_delivered(counter: list[int], expected: int, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while counter[0] < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def _publish(redis, messages: int) -> None:
+    frame = json.dumps({"latitude": 41.0, "longitude": 29.0, "speed": 30})
+    for _ in range(messages):
+        await redis.publish(CHANNEL, frame)
+
+
+async def _bench_per_socket(redis, sockets: int, messages: int) -> tuple[int, float]:
+    delivered = [0]
+    pubsubs = []
+    for _ in range(sockets):
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(CHANNEL)
+        pubsubs.append(pubsub)
+
+    async def reader(pubsub):
+        async for message in pubsub.listen():
+            if message["type"] == "message":
+                delivered[0] += 1
+
+    tasks = [asyncio.create_task(reader(p)) for p in pubsubs]
+    clients = await _connected_clients(redis)
+    cpu0 = time.process_time()
+    await _publish(redis, messages)
+    await _wait_delivered(delivered, sockets * messages)
+    cpu = time.process_time() - cpu0
+    for task in tasks:
+        task.cancel()
+    for pubsub in pubsubs:
+        await pubsub.aclose()
+    return clients, cpu
+
+
+async def _bench_hub(redis, sockets: int, messages: int) -> tuple[int, float]:
+    delivered = [0]
+    hub = PubSubHub(queue_size=messages + 1)
+    queues = [await hub.subscribe(CHANNEL) for _ in range(sockets)]
+
+    async def reader(queue):
+        while True:
+            await queue.get()
+            delivered[0] += 1
+
+    tasks = [asyncio.create_task(reader(q)) for q in queues]
+    clients = await _connected_clients(redis)
+    cpu0 = time.process_time()
+    await _publish(redis, messages)
+    await _wait_delivered(delivered, sockets * messages)
+    cpu = time.process_time() - cpu0
+    for task in tasks:
+        task.cancel()
+    await hub.close()
+    return clients, cpu
+
+
+async def _run(sockets: int, messages: int) -> None:
+    redis = await redis_manager.get_redis()
+    baseline = await _connected_clients(redis)
+    print(f"sockets={sockets} messages={messages} baseline_clients={baseline}")
+    print(f"{'mode':<12} {'redis clients':>14} {'cpu s':>8} {'cpu s / 1k sockets':>20}")
+    for name, bench in (("per-socket", _bench_per_socket), ("hub", _bench_hub)):
+        clients, cpu = await bench(redis, sockets, messages)
+        print(f"{name:<12} {clients - baseline:>14} {cpu:>8.2f} {cpu * 1000 / sockets:>20.2f}")
+        await asyncio.sleep(0.5)
+    await redis_manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(_run(args.sockets, args.messages))
+
+
+if __name__ == "__main__":
+    main()
@@ -228,6 +228,8 @@ def fake_redis():
         set=AsyncMock(return_value=True),
         delete=AsyncMock(return_value=1),
         delete_pattern=AsyncMock(return_value=1),
+        set_tagged=AsyncMock(return_value=True),
+        invalidate_tag=AsyncMock(return_value=1),
         ping=AsyncMock(return_value=True),
     )
 
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.archive_service import (
+    LOCATION_SCHEMA,
+    ArchiveVerificationError,
+    ArchiveWriter,
+    archived_trips,
+    read_archived_locations,
+    retention_cutoff,
+)
+
+
+pytestmark = pytest.mark.unit
+
+START = datetime(2026, 1, 5, 6, 30)
+
+
+def _rows(bus_id, organization_id, day_offset, count, gap_after=None):
+    rows = []
+    t = START + timedelta(days=day_offset)
+    for i in range(count):
+        rows.append({
+            "id": f"{bus_id}-{day_offset}-{i}",
+            "bus_id": bus_id,
+            "organization_id": organization_id,
+            "latitude": 41.0 + i * 0.0001,
+            "longitude": 29.0,
+            "speed": 30.0,
+            "timestamp": t,
+        })
+        t += timedelta(hours=8) if i == gap_after else timedelta(seconds=5)
+    return rows
+
+
+def test_writer_partitions_by_date_and_organization_and_verifies(tmp_path):
+    writer = ArchiveWriter("bus_locations", LOCATION_SCHEMA, root=str(tmp_path), run_id="run1")
+    writer.write(_rows("bus-1", "org-a", 0, 10) + _rows("bus-2", None, 0, 5) + _rows("bus-1", "org-a", 1, 7))
+    files = writer.close()
+
+    relative = sorted(str(path.relative_to(tmp_path)) for path in files)
+    assert relative == [
+        "bus_locations/date=2026-01-05/organization=none/part-run1.parquet",
+        "bus_locations/date=2026-01-05/organization=org-a/part-run1.parquet",
+        "bus_locations/date=2026-01-06/organization=org-a/part-run1.parquet",
+    ]
+    assert sum(files.values()) == 22
+    writer.verify(22)
+    with pytest.raises(ArchiveVerificationError):
+        writer.verify(23)  # a row appeared in the DB meanwhile: do not delete
+
+    writer.discard()
+    assert not list(tmp_path.rglob("*.parquet"))
+
+
+def test_reader_filters_by_bus_and_window_and_splits_trips(tmp_path):
+    writer = ArchiveWriter("bus_locations", LOCATION_SCHEMA, root=str(tmp_path))
+    writer.write(_rows("bus-1", "org-a", 0, 6, gap_after=2) + _rows("bus-2", "org-a", 0, 4) + _rows("bus-1", "org-a", 2, 3))
+    writer.close()
+
+    points = read_archived_locations("bus-1", START, START + timedelta(days=1), root=str(tmp_path))
+
+    assert [p["id"] for p in points] == [f"bus-1-0-{i}" for i in range(6)]
+    assert [len(trip) for trip in archived_trips(points)] == [3, 3]
+    assert read_archived_locations("bus-1", START, START + timedelta(days=1), root=str(tmp_path / "missing")) == []
+
+
+def test_rerun_for_the_same_source_overwrites_instead_of_duplicating(tmp_path):
+    rows = _rows("bus-1", "org-a", 0, 10)
+    for run_id in ("run1", "run2"):  # e.g. the delete after the first archive failed
+        writer = ArchiveWriter("bus_locations", LOCATION_SCHEMA, root=str(tmp_path), run_id=run_id, name="bus_locations_p20260105")
+        writer.write(rows)
+        writer.close()
+
+    assert [path.name for path in tmp_path.rglob("*.parquet")] == ["part-bus_locations_p20260105.parquet"]
+    points = read_archived_locations("bus-1", START, START + timedelta(days=1), root=str(tmp_path))
+    assert len(points) == 10
+
+
+def test_retention_cutoff_is_utc_midnight():
+    now = datetime(2026, 1, 12, 21, 30, tzinfo=timezone.utc)
+
+    assert retention_cutoff(7, now=now) == datetime(2026, 1, 5, tzinfo=timezone.utc)
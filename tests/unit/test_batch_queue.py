@@ -0,0 +1,111 @@
+import asyncio
+import os
+
+import pytest
+
+from app.core.batch_queue import BoundedBatchQueue, SpillFile
+from app.core.metrics import metrics
+
+
+pytestmark = pytest.mark.unit
+
+
+def _queue(**overrides):
+    options = {
+        "name": "test_queue",
+        "max_batch_size": 3,
+        "max_latency_ms": 50,
+        "high_water_mark": 5,
+        "overflow_policy": "drop",
+    }
+    options.update(overrides)
+    return BoundedBatchQueue(**options)
+
+
+@pytest.fixture(autouse=True)
+def _reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.mark.asyncio
+async def test_get_batch_returns_immediately_when_size_trigger_is_hit():
+    queue = _queue(max_latency_ms=10_000)
+    for i in range(4):
+        await queue.put(i)
+
+    batch = await asyncio.wait_for(queue.get_batch(), timeout=1)
+
+    assert batch == [0, 1, 2]
+    assert queue.qsize() == 1
+
+
+@pytest.mark.asyncio
+async def test_get_batch_flushes_partial_batch_after_max_latency():
+    queue = _queue(max_latency_ms=20)
+    await queue.put("only")
+
+    batch = await asyncio.wait_for(queue.get_batch(), timeout=1)
+
+    assert batch == ["only"]
+
+
+@pytest.mark.asyncio
+async def test_get_batch_returns_empty_list_on_idle_timeout():
+    assert await _queue().get_batch(timeout=0.01) == []
+
+
+@pytest.mark.asyncio
+async def test_put_drops_and_counts_above_high_water_mark():
+    queue = _queue()
+    results = [await queue.put(i) for i in range(7)]
+
+    assert results == [True] * 5 + [False] * 2
+    assert metrics.counter("test_queue_dropped_total") == 2
+    assert metrics.gauge("test_queue_depth") == 5
+
+
+@pytest.mark.asyncio
+async def test_put_blocks_until_consumer_makes_room():
+    queue = _queue(overflow_policy="block", max_latency_ms=0)
+    for i in range(5):
+        await queue.put(i)
+
+    producer = asyncio.create_task(queue.put("late"))
+    await asyncio.sleep(0.01)
+    assert not producer.done()
+
+    await queue.get_batch()
+    assert await asyncio.wait_for(producer, timeout=1) is True
+    assert metrics.counter("test_queue_blocked_total") == 1
+
+
+def test_spill_file_claim_replay_and_retain(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.jsonl"), name="test_spill", max_bytes=1_000_000)
+    spill.append([{"n": 1}, {"n": 2}])
+    spill.append([{"n": 3}])
+    assert metrics.gauge("test_spill_bytes") > 0
+
+    claimed = spill.claim()
+    assert len(claimed) == 1
+    assert not os.path.exists(spill.path)
+
+    chunks = list(SpillFile.read_chunks(claimed[0], chunk_size=2))
+    assert chunks == [[{"n": 1}, {"n": 2}], [{"n": 3}]]
+
+    spill.retain(claimed[0], [{"n": 3}])
+    retained = spill.claim()
+    assert [list(SpillFile.read_chunks(path, 10)) for path in retained] == [[[{"n": 3}]]]
+
+    for path in retained:
+        spill.release(path)
+    assert spill.size_bytes() == 0
+
+
+def test_spill_file_drops_when_over_max_bytes(tmp_path):
+    spill = SpillFile(str(tmp_path / "spill.jsonl"), name="test_spill", max_bytes=10)
+    spill.append([{"payload": "x" * 20}])
+
+    assert spill.append([{"n": 1}]) == 0
+    assert metrics.counter("test_spill_dropped_total") == 1
@@ -0,0 +1,130 @@
+from contextlib import asynccontextmanager
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.database import database
+from app.tasks import bus_location_partitions as partitions
+from app.tasks import cleanup_bus_locations
+
+
+pytestmark = pytest.mark.unit
+
+
+def test_partition_name_round_trip():
+    name = partitions.partition_name(date(2026, 3, 9))
+
+    assert name == "bus_locations_p20260309"
+    assert partitions.partition_day(name) == date(2026, 3, 9)
+    assert partitions.partition_day(partitions.DEFAULT_PARTITION) is None
+    assert partitions.partition_day("bus_locations_pbogus") is None
+
+
+def test_expired_partitions_keeps_cutoff_day_and_default():
+    names = [
+        "bus_locations_p20260101",
+        "bus_locations_p20260107",
+        "bus_locations_p20260108",
+        "bus_locations_p20260109",
+        partitions.DEFAULT_PARTITION,
+    ]
+
+    assert partitions.expired_partitions(names, date(2026, 1, 8)) == [
+        "bus_locations_p20260101",
+        "bus_locations_p20260107",
+    ]
+
+
+def test_create_partition_sql_uses_half_open_day_range():
+    sql = partitions._create_partition_sql(date(2026, 12, 31))
+
+    assert "bus_locations_p20261231 PARTITION OF bus_locations" in sql
+    assert "FROM ('2026-12-31') TO ('2027-01-01')" in sql
+
+
+def _fake_engine():
+    @asynccontextmanager
+    async def connect():
+        yield SimpleNamespace()
+
+    return SimpleNamespace(connect=connect)
+
+
+@pytest.mark.asyncio
+async def test_cleanup_drops_partitions_when_table_is_partitioned(monkeypatch):
+    drop = AsyncMock(return_value=2)
+    monkeypatch.setattr(database, "engine", _fake_engine())
+    monkeypatch.setattr(cleanup_bus_locations, "is_partitioned", AsyncMock(return_value=True))
+    monkeypatch.setattr(cleanup_bus_locations, "drop_expired_bus_location_partitions", drop)
+    monkeypatch.setattr(cleanup_bus_locations.settings, "BUS_LOCATION_RETENTION_ACTION", "detach")
+    monkeypatch.setattr(cleanup_bus_locations.settings, "ARCHIVE_ENABLED", True)
+
+    removed = await cleanup_bus_locations.cleanup_old_bus_locations(retention_days=7)
+
+    assert removed == 2
+    drop.assert_awaited_once_with(7, action="detach", archive=cleanup_bus_locations.archive_bus_locations)
+
+
+@pytest.mark.asyncio
+async def test_failed_archive_keeps_partition_and_counts_blocked_retention(monkeypatch):
+    executed = []
+
+    @asynccontextmanager
+    async def begin():
+        yield SimpleNamespace(execute=AsyncMock(side_effect=lambda statement, *args: executed.append(str(statement))))
+
+    engine = _fake_engine()
+    engine.begin = begin
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(partitions, "list_partitions", AsyncMock(return_value=["bus_locations_p20200101"]))
+    before = partitions.metrics.counter("retention_blocked_by_archive_total")
+
+    removed = await partitions.drop_expired_bus_location_partitions(
+        7, archive=AsyncMock(side_effect=PermissionError("/var/lib/servis_takip/archive"))
+    )
+
+    assert removed == 0
+    assert executed == []
+    assert partitions.metrics.counter("retention_blocked_by_archive_total") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_ensure_partitions_moves_default_rows_and_isolates_failures(monkeypatch):
+    today = date(2026, 3, 9)
+    transactions = []
+
+    async def execute(statement, params=None):
+        sql = str(statement)
+        transactions[-1].append(sql)
+        if "bus_locations_p20260311" in sql and sql.startswith("CREATE"):
+            raise RuntimeError("lock timeout")
+        stray = params is not None and params["start"].day == 10
+        return SimpleNamespace(scalar=lambda: stray, rowcount=4)
+
+    @asynccontextmanager
+    async def begin():
+        transactions.append([])
+        yield SimpleNamespace(execute=execute)
+
+    engine = _fake_engine()
+    engine.begin = begin
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(partitions, "is_partitioned", AsyncMock(return_value=True))
+    monkeypatch.setattr(
+        partitions,
+        "list_partitions",
+        AsyncMock(return_value=[partitions.DEFAULT_PARTITION, "bus_locations_p20260309"]),
+    )
+
+    created = await partitions.ensure_bus_location_partitions(days_ahead=2, today=today)
+
+    # Day 10 had stray rows in the default partition; day 11 failed on its own.
+    assert created == 1
+    assert len(transactions) == 2
+    day10 = transactions[0]
+    assert "DETACH PARTITION bus_locations_default" in day10[1]
+    assert day10[2].startswith("CREATE TABLE IF NOT EXISTS bus_locations_p20260310")
+    assert "DELETE FROM bus_locations_default" in day10[3] and "INSERT INTO bus_locations_p20260310" in day10[3]
+    assert "ATTACH PARTITION bus_locations_default DEFAULT" in day10[4]
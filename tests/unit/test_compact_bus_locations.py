@@ -0,0 +1,114 @@
+import importlib
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+
+from app.core.geo import EARTH_RADIUS_M
+from app.database import database
+from app.tasks.compact_bus_locations import compaction_keep_indices, dwell_anchors
+
+# app.tasks re-exports the compact_bus_locations function under the module's name
+compaction = importlib.import_module("app.tasks.compact_bus_locations")
+
+
+pytestmark = pytest.mark.unit
+
+
+def _track():
+    """Drive ~2 km north, wait 2 min at a stop, drive on; a 30 min gap; a second short trip."""
+    rng = np.random.default_rng(5)
+    points, seconds = [], []
+    t = 0.0
+    for i in range(40):  # ~56 m per 5 s fix
+        points.append((41.0 + i * 0.0005, 29.0 + rng.normal(0, 0.000005)))
+        seconds.append(t)
+        t += 5
+    stop = points[-1]
+    for _ in range(24):  # 2 minutes at the stop
+        points.append((stop[0] + rng.normal(0, 0.00003), stop[1] + rng.normal(0, 0.00003)))
+        seconds.append(t)
+        t += 5
+    for i in range(1, 40):
+        points.append((stop[0] + i * 0.0005, 29.0))
+        seconds.append(t)
+        t += 5
+    t += 30 * 60
+    for i in range(20):
+        points.append((41.0, 29.01 + i * 0.0005))
+        seconds.append(t)
+        t += 5
+    return points, seconds
+
+
+def _max_deviation(points, keep):
+    arr = np.radians(np.asarray(points))
+    y = arr[:, 0] * EARTH_RADIUS_M
+    x = arr[:, 1] * EARTH_RADIUS_M * np.cos(arr[:, 0].mean())
+    worst = 0.0
+    for start, end in zip(keep[:-1], keep[1:]):
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        for i in range(start + 1, end):
+            px, py = x[i] - x[start], y[i] - y[start]
+            t = np.clip((px * dx + py * dy) / max(dx * dx + dy * dy, 1e-12), 0, 1)
+            worst = max(worst, float(np.hypot(px - t * dx, py - t * dy)))
+    return worst
+
+
+def test_dwell_anchors_mark_stop_arrival_and_departure():
+    points, seconds = _track()
+
+    anchors = dwell_anchors(points, seconds, radius_m=40, min_seconds=45)
+
+    assert anchors[0] in (39, 40) and anchors[1] == 63
+
+
+def test_compaction_keeps_trip_ends_dwells_and_shape():
+    points, seconds = _track()
+
+    keep = compaction_keep_indices(points, seconds, tolerance_m=10, dwell_radius_m=40, dwell_seconds=45)
+    kept = set(keep.tolist())
+
+    assert len(keep) < len(points) / 5
+    assert {0, 63, 102, 103, len(points) - 1} <= kept  # dwell departure, gap sides, ends
+    assert _max_deviation(points, keep) <= 10
+
+
+class _Session:
+    def __init__(self, *scalars):
+        self.scalars = list(scalars)
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        self.statements.append(str(statement))
+        return SimpleNamespace(scalar=lambda: self.scalars.pop(0))
+
+
+@pytest.mark.asyncio
+async def test_watermark_is_read_from_postgres_before_the_legacy_redis_key():
+    redis = SimpleNamespace(get=AsyncMock(return_value="2026-01-01T00:00:00"))
+    stored = datetime(2026, 1, 3)
+
+    assert await compaction._window_start(_Session(stored), redis) == stored
+    redis.get.assert_not_awaited()
+    assert await compaction._window_start(_Session(None), redis) == datetime(2026, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_lock_is_released_only_with_its_token(monkeypatch):
+    redis = SimpleNamespace(set=AsyncMock(return_value=True), get=AsyncMock(return_value=None), eval=AsyncMock(return_value=0))
+    monkeypatch.setattr(compaction.redis_manager, "get_redis", AsyncMock(return_value=redis))
+    monkeypatch.setattr(database, "AsyncSessionLocal", lambda: _Session(None, None))  # empty table
+
+    assert await compaction.compact_bus_locations() == 0
+
+    token = redis.set.await_args.args[1]
+    assert redis.eval.await_args.args[1:] == (1, compaction.LOCK_KEY, token)
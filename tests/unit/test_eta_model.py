@@ -0,0 +1,170 @@
+import json
+
+import pytest
+
+from app.core.geo import geohash_encode
+from app.services import eta_model as eta_model_module
+from app.services.eta_model import (
+    DEFAULT_DETOUR_FACTOR,
+    EtaModel,
+    aggregate_speeds,
+    speed_field,
+    split_path,
+)
+from app.services.eta_service import BusEtaService
+
+
+pytestmark = pytest.mark.unit
+
+
+class ModelRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.values = {}
+
+    async def hmget(self, key, fields):
+        stored = self.hashes.get(key, {})
+        return [stored.get(field) for field in fields]
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def get(self, key):
+        return self.values.get(key)
+
+
+@pytest.fixture
+def model_redis(monkeypatch):
+    redis = ModelRedis()
+
+    async def get_redis():
+        return redis
+
+    async def get(key):
+        return redis.values.get(key)
+
+    monkeypatch.setattr(eta_model_module.redis_manager, "get_redis", get_redis)
+    monkeypatch.setattr(eta_model_module.redis_manager, "get", get)
+    return redis
+
+
+def test_geohash_encode_matches_reference():
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_aggregate_speeds_weights_by_samples_and_drops_thin_buckets():
+    speeds = aggregate_speeds(
+        [("sxk973", 8, 30, 36.0), ("sxk973", 8, 10, 18.0), ("sxk974", 9, 5, 54.0)],
+        min_samples=20,
+    )
+
+    assert speeds[speed_field("sxk973", 8)] == pytest.approx((36 * 30 + 18 * 10) / 40 / 3.6, abs=1e-3)
+    assert speed_field("sxk974", 9) not in speeds
+    assert speed_field("*", "*") in speeds
+
+
+def test_split_path_keeps_total_length():
+    path = [(41.0, 29.0), (41.02, 29.0), (41.02, 29.01)]
+    pieces = split_path(path, segment_meters=500)
+
+    assert all(meters <= 500 for _, meters in pieces)
+    assert sum(meters for _, meters in pieces) == pytest.approx(2224 + 839, rel=0.01)
+
+
+@pytest.mark.asyncio
+async def test_estimate_uses_cell_speed_with_fallbacks_and_calibration(model_redis):
+    origin, destination = (41.0, 29.0), (41.0, 29.002)
+    cell = geohash_encode(41.0, 29.001, 6)
+    model_redis.hashes[eta_model_module.MODEL_KEY] = {
+        speed_field(cell, 8): "10.0",
+        speed_field("*", "*"): "5.0",
+    }
+    model = EtaModel()
+    meters = sum(m for _, m in split_path([origin, destination]))
+
+    raw = await model.estimate_seconds([origin, destination], hour=8, calibrated=False)
+    assert raw == pytest.approx(meters * DEFAULT_DETOUR_FACTOR / 10.0)
+
+    # Other hour: falls back to the overall speed.
+    other = await model.estimate_seconds([origin, destination], hour=3, calibrated=False)
+    assert other == pytest.approx(meters * DEFAULT_DETOUR_FACTOR / 5.0)
+
+    factor = await model.calibrate(raw, raw * 2)
+    assert factor == pytest.approx(1.2)
+    assert await model.estimate_seconds([origin, destination], hour=8) == pytest.approx(raw * 1.2)
+
+
+@pytest.mark.asyncio
+async def test_planned_path_follows_remaining_stop_order(model_redis, monkeypatch):
+    plan = {
+        "stops": [
+            {"student_id": "a", "latitude": 41.01, "longitude": 29.0},
+            {"student_id": "b", "latitude": 41.02, "longitude": 29.0},
+            {"student_id": "c", "latitude": 41.03, "longitude": 29.0},
+        ]
+    }
+    model_redis.values["route:bus-1:plan:from_school"] = json.dumps(plan)
+
+    async def visited(self, bus_id, trip_type):
+        return ["a"]
+
+    monkeypatch.setattr("app.services.eta_service.RouteProgressService.get_visited", visited)
+    service = BusEtaService()
+
+    remaining = await service._remaining_plan_stops("bus-1", "to_home")
+    path, stops = service._path_to("c", "to_home", (41.0, 29.0), (41.03, 29.0), remaining)
+
+    assert path == [(41.0, 29.0), (41.02, 29.0), (41.03, 29.0)]
+    assert stops == 1
+
+
+class ClaimRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def exists(self, key):
+        return int(key in self.values)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        if self.values.get(key) == token:
+            del self.values[key]
+            return 1
+        return 0
+
+
+@pytest.mark.asyncio
+async def test_training_marker_is_set_only_after_success_and_bootstrap_keeps_nightly(monkeypatch):
+    from datetime import datetime
+    from unittest.mock import AsyncMock
+
+    from app.tasks import eta_model_training as training
+
+    redis = ClaimRedis()
+    train = AsyncMock(side_effect=lambda: redis.values.__setitem__(training.MODEL_KEY, "model"))
+    monkeypatch.setattr(training.redis_manager, "get_redis", AsyncMock(return_value=redis))
+    monkeypatch.setattr(training, "train_eta_model", train)
+    monkeypatch.setattr(training.settings, "ETA_MODEL_TRAIN_HOUR", 3)
+
+    assert await training.train_if_due(datetime(2026, 3, 2, 1, 0)) is True  # bootstrap: no model yet
+    assert await training.train_if_due(datetime(2026, 3, 2, 2, 0)) is False
+
+    train.side_effect = RuntimeError("db down")
+    with pytest.raises(RuntimeError):
+        await training.train_if_due(datetime(2026, 3, 2, 3, 0))
+    assert await training.train_if_due(datetime(2026, 3, 2, 3, 10)) is False  # backing off on the lock
+    del redis.values[training.TRAIN_LOCK_KEY]  # TRAIN_RETRY_SECONDS later
+    train.side_effect = None
+    assert await training.train_if_due(datetime(2026, 3, 2, 3, 40)) is True
+    assert await training.train_if_due(datetime(2026, 3, 2, 3, 50)) is False
+
+    assert train.await_count == 3
+    assert training.TRAIN_LOCK_KEY not in redis.values
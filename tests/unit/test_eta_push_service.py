@@ -0,0 +1,54 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.eta_push_service import EtaPushService, parent_eta_frame
+
+
+pytestmark = pytest.mark.unit
+
+
+def test_parent_frame_only_contains_own_children():
+    frame = {
+        "type": "eta",
+        "bus_id": "bus-1",
+        "trip_status": "to_home",
+        "etas": {"s1": 4, "s2": 9, "s3": 12},
+        "computed_at": "2026-04-20T12:00:00+00:00",
+    }
+
+    narrowed = parent_eta_frame(frame, ["s2", "s9"])
+
+    assert narrowed == {
+        "type": "eta",
+        "bus_id": "bus-1",
+        "trip_status": "to_home",
+        "students": {"s2": 9},
+        "computed_at": "2026-04-20T12:00:00+00:00",
+    }
+    assert parent_eta_frame(frame, ["s9"]) is None
+
+
+def test_to_school_frame_applies_school_eta_to_every_child():
+    frame = {"bus_id": "bus-1", "trip_status": "to_school", "etas": {"school": 17}}
+
+    assert parent_eta_frame(frame, ["s1", "s2"])["students"] == {"s1": 17, "s2": 17}
+
+
+@pytest.mark.asyncio
+async def test_on_location_recomputes_at_most_once_per_interval(monkeypatch):
+    service = EtaPushService(interval_seconds=30)
+    service._push = AsyncMock()
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.eta_push_service.time.monotonic", lambda: clock[0])
+
+    assert service.on_location("bus-1", 41.0, 29.0) is True
+    clock[0] += 10
+    assert service.on_location("bus-1", 41.001, 29.0) is False
+    assert service.on_location("bus-2", 41.0, 29.0) is True
+    clock[0] += 25
+    assert service.on_location("bus-1", 41.002, 29.0) is True
+    await asyncio.sleep(0)
+
+    assert [call.args[0] for call in service._push.await_args_list] == ["bus-1", "bus-2", "bus-1"]
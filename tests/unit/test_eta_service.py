@@ -0,0 +1,142 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services import eta_service as eta_module
+from app.services.eta_service import BusEtaService
+
+
+pytestmark = pytest.mark.unit
+
+
+class HashRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.values = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def exists(self, key):
+        return int(key in self.values)
+
+    async def eval(self, script, numkeys, key, token):
+        return int(self.values.pop(key, None) is not None)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        return HashPipeline(self)
+
+
+class HashPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def delete(self, key):
+        self.ops.append(lambda: self.redis.hashes.pop(key, None))
+
+    def hset(self, key, mapping):
+        self.ops.append(lambda: self.redis.hashes.setdefault(key, {}).update(mapping))
+
+    def expire(self, key, seconds):
+        self.ops.append(lambda: None)
+
+    async def execute(self):
+        return [op() for op in self.ops]
+
+
+@pytest.fixture
+def hash_redis(monkeypatch):
+    redis = HashRedis()
+
+    async def get_redis():
+        return redis
+
+    monkeypatch.setattr(eta_module.redis_manager, "get_redis", get_redis)
+    return redis
+
+
+def _location(lat=41.0, lng=29.0):
+    return SimpleNamespace(bus_id="bus-1", latitude=lat, longitude=lng)
+
+
+def _service(mock_db_session, homes):
+    rows = [(f"s{i}", lat, lng) for i, (lat, lng) in enumerate(homes)]
+    mock_db_session.execute = AsyncMock(return_value=SimpleNamespace(all=lambda: rows))
+    service = BusEtaService(mock_db_session)
+    service.api_key = "test-key"
+
+    async def fake_matrix(client, origin, destinations):
+        return [600 + idx * 60 for idx in range(len(destinations))]
+
+    service._fetch_matrix = AsyncMock(side_effect=fake_matrix)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_one_matrix_chunk_per_25_students_then_served_from_hash(hash_redis, mock_db_session):
+    homes = [(41.0 + i * 0.001, 29.0) for i in range(30)]
+    service = _service(mock_db_session, homes)
+
+    first = await service.get_eta(_location(), SimpleNamespace(id="s0"), "to_home", destination=homes[0])
+    assert first == 10
+    assert service._fetch_matrix.await_count == 2  # 25 + 5 destinations
+
+    for idx in range(30):
+        student = SimpleNamespace(id=f"s{idx}")
+        assert await service.get_eta(_location(), student, "to_home", destination=homes[idx]) is not None
+    assert service._fetch_matrix.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_recomputes_when_bus_moved_and_keeps_stale_on_failure(hash_redis, mock_db_session):
+    homes = [(41.01, 29.0)]
+    service = _service(mock_db_session, homes)
+    student = SimpleNamespace(id="s0")
+
+    assert await service.get_eta(_location(), student, "to_home", destination=homes[0]) == 10
+    # ~1 km further: stored ETAs no longer describe this position.
+    service._fetch_matrix.side_effect = RuntimeError("OVER_QUERY_LIMIT")
+    assert await service.get_eta(_location(lat=41.009), student, "to_home", destination=homes[0]) == 10
+    assert service._fetch_matrix.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_to_school_shares_one_school_field(hash_redis, mock_db_session):
+    service = _service(mock_db_session, [])
+    school = (41.05, 29.02)
+
+    for idx in range(5):
+        assert await service.get_eta(_location(), SimpleNamespace(id=f"s{idx}"), "to_school", destination=school) == 10
+    assert service._fetch_matrix.await_count == 1
+    mock_db_session.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_refresh_drops_destinations_whose_element_failed(hash_redis, mock_db_session):
+    homes = [(41.01, 29.0), (41.02, 29.0)]
+    service = _service(mock_db_session, homes)
+
+    assert await service.get_eta(_location(), SimpleNamespace(id="s0"), "to_home", destination=homes[0]) == 10
+
+    async def partial_matrix(client, origin, destinations):
+        return [540] + [None] * (len(destinations) - 1)
+
+    service._fetch_matrix.side_effect = partial_matrix
+    assert await service.get_eta(_location(lat=41.009), SimpleNamespace(id="s0"), "to_home", destination=homes[0]) == 9
+
+    stored = hash_redis.hashes[service._key("bus-1", "to_home")]
+    assert "s1" not in stored  # not served as fresh from the new origin
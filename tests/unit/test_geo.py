@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from app.core.geo import douglas_peucker, haversine_matrix, haversine_meters, haversine_one_to_many, nearest_k
+
+
+pytestmark = pytest.mark.unit
+
+POINTS = [(41.0082, 28.9784), (41.0151, 28.9795), (40.9900, 29.0300), (41.1000, 29.0500)]
+
+
+def test_haversine_matrix_matches_scalar_formula():
+    matrix = haversine_matrix(POINTS)
+
+    assert matrix.shape == (4, 4)
+    assert np.allclose(np.diag(matrix), 0.0)
+    assert np.allclose(matrix, matrix.T)
+    for i, (lat1, lng1) in enumerate(POINTS):
+        for j, (lat2, lng2) in enumerate(POINTS):
+            assert matrix[i, j] == pytest.approx(haversine_meters(lat1, lng1, lat2, lng2), rel=1e-9, abs=1e-6)
+
+
+def test_haversine_known_distance():
+    # Istanbul (Sultanahmet) -> Ankara (Kızılay) is ~351 km great-circle.
+    assert haversine_meters(41.0054, 28.9768, 39.9208, 32.8541) == pytest.approx(351_000, rel=0.01)
+
+
+def test_one_to_many_and_nearest_k():
+    origin = (41.0100, 28.9790)
+
+    distances = haversine_one_to_many(origin, POINTS)
+
+    assert distances.shape == (4,)
+    assert list(nearest_k(origin, POINTS, 2)) == list(np.argsort(distances)[:2])
+    assert list(nearest_k(origin, POINTS, 10)) == list(np.argsort(distances))
+    assert nearest_k(origin, [], 3).size == 0
+    assert haversine_one_to_many(origin, []).size == 0
+
+
+def test_douglas_peucker_keeps_corners_and_anchors():
+    # Straight north for ~1 km, then east for ~1 km, 50 points per leg, 1 m jitter.
+    rng = np.random.default_rng(3)
+    north = [(41.0 + i * 0.0002, 29.0) for i in range(50)]
+    east = [(41.0098, 29.0 + i * 0.00024) for i in range(1, 50)]
+    track = np.array(north + east) + rng.normal(0, 0.00001, (99, 2))
+
+    kept = douglas_peucker(track, tolerance_m=10)
+    assert kept.tolist() == [0, 49, 98]
+
+    kept = douglas_peucker(track, tolerance_m=10, keep=[20, 70])
+    assert kept.tolist() == [0, 20, 49, 70, 98]
+    assert douglas_peucker(track[:2], tolerance_m=10).tolist() == [0, 1]
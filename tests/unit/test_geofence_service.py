@@ -0,0 +1,204 @@
+import random
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.geo import haversine_meters
+from app.database import database
+from app.database.models.notification import NotificationType
+from app.services import geofence_service
+from app.services.notification_service import NotificationService
+from app.services.trip_session_service import TripSessionService
+from app.services.geofence_service import (
+    GeofenceEngine,
+    GeofenceIndex,
+    _BusFences,
+    build_stop_fences,
+    build_trip_fences,
+)
+
+
+pytestmark = pytest.mark.unit
+
+
+def _engine_with(fences):
+    engine = GeofenceEngine()
+    fired = []
+    engine._fire = lambda bus_id, state, fence, eta_minutes: (fence.fence_id, eta_minutes)
+    engine._spawn = fired.append
+    engine._buses["bus-1"] = _BusFences("session-1", "from_school", GeofenceIndex(fences), loaded_at=float("inf"))
+    return engine, fired
+
+
+def test_grid_hits_match_brute_force():
+    rng = random.Random(7)
+    homes = {str(i): (41.0 + rng.uniform(0, 0.1), 29.0 + rng.uniform(0, 0.1)) for i in range(300)}
+    fences = build_trip_fences("from_school", homes, None)
+    index = GeofenceIndex(fences)
+
+    for _ in range(500):
+        lat, lng = 41.0 + rng.uniform(0, 0.1), 29.0 + rng.uniform(0, 0.1)
+        expected = {
+            f.fence_id for f in fences
+            if haversine_meters(lat, lng, f.latitude, f.longitude) <= f.radius_m
+        }
+        assert {f.fence_id for f, _ in index.hits(lat, lng)} == expected
+
+
+def test_trip_fence_types():
+    homes = {"s1": (41.0, 29.0)}
+
+    to_school = {f.fence_id: f.notification_type for f in build_trip_fences("to_school", homes, (41.05, 29.05))}
+    assert to_school == {
+        "approach:s1": NotificationType.evden_alim_eta,
+        "arrival:school": NotificationType.okula_varis,
+    }
+
+    from_school = {f.fence_id: f.notification_type for f in build_trip_fences("from_school", homes, (41.05, 29.05))}
+    assert from_school == {
+        "approach:s1": NotificationType.eve_varis_eta,
+        "arrival:s1": NotificationType.eve_birakildi,
+    }
+
+
+def test_fence_fires_once_when_crossed():
+    engine, fired = _engine_with(build_trip_fences("from_school", {"s1": (41.0, 29.0)}, None))
+
+    assert engine.on_location("bus-1", 41.02, 29.0) == 0  # ~2.2 km away
+    assert engine.on_location("bus-1", 41.005, 29.0, speed=36) == 1  # ~550 m: approach only
+    assert engine.on_location("bus-1", 41.004, 29.0) == 0
+    assert engine.on_location("bus-1", 41.0005, 29.0) == 1  # ~55 m: arrival
+
+    assert [fence_id for fence_id, _ in fired] == ["approach:s1", "arrival:s1"]
+    assert fired[0][1] == 1  # ~550 m * detour at 10 m/s
+    assert fired[1][1] is None
+    assert len(engine._buses["bus-1"].index) == 0
+
+
+def test_eta_threshold_fires_approach_before_radius():
+    engine, fired = _engine_with(build_trip_fences("from_school", {"s1": (41.0, 29.0), "s2": (41.1, 29.0)}, None))
+
+    assert engine.wants_etas("bus-1") is True
+    assert engine.on_etas("bus-1", {"s1": 4, "s2": 12}) == 1
+    assert fired == [("approach:s1", 4)]
+    assert engine.on_etas("bus-1", {"s1": 3}) == 0
+    assert engine.wants_etas("unknown-bus") is False
+
+
+def test_dwell_marks_stop_after_staying_in_radius(monkeypatch):
+    homes = {"s1": (41.0, 29.0), "s2": (41.01, 29.0)}
+    engine, fired = _engine_with([])
+    state = engine._buses["bus-1"]
+    state.stops = GeofenceIndex(build_stop_fences(homes))
+    marked = []
+    engine._mark_visited = lambda bus_id, state, student_id: student_id
+    engine._spawn = marked.append
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.geofence_service.time.monotonic", lambda: clock[0])
+    monkeypatch.setattr(geofence_service.settings, "DWELL_DETECTION_ENABLED", True)
+
+    assert engine.on_location("bus-1", 41.0002, 29.0, speed=0) == 0  # ~22 m, timer starts
+    clock[0] += 20
+    assert engine.on_location("bus-1", 41.0001, 29.0, speed=30) == 0  # moving: timer reset
+    assert engine.on_location("bus-1", 41.0001, 29.0, speed=1) == 0
+    clock[0] += 30
+    assert engine.on_location("bus-1", 41.0001, 29.0, speed=1) == 0
+    clock[0] += 20
+    assert engine.on_location("bus-1", 41.0, 29.0001) == 1
+
+    assert marked == ["s1"]
+    assert [f.student_id for f in state.stops.pending()] == ["s2"]
+    clock[0] += 100
+    assert engine.on_location("bus-1", 41.0, 29.0001) == 0
+
+
+class FakeRedis:
+    def __init__(self):
+        self.sets = {}
+
+    async def sismember(self, key, member):
+        return member in self.sets.get(key, set())
+
+    async def sadd(self, key, member):
+        members = self.sets.setdefault(key, set())
+        added = member not in members
+        members.add(member)
+        return int(added)
+
+    async def srem(self, key, member):
+        self.sets.get(key, set()).discard(member)
+
+    async def expire(self, key, seconds):
+        return True
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def notify_env(monkeypatch):
+    redis = FakeRedis()
+    clock = [1000.0]
+    monkeypatch.setattr(geofence_service.redis_manager, "get_redis", AsyncMock(return_value=redis))
+    monkeypatch.setattr(database, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(
+        TripSessionService, "get_route_completed_student_ids", AsyncMock(return_value=["s1", "s2"])
+    )
+    monkeypatch.setattr("app.services.geofence_service.time.monotonic", lambda: clock[0])
+
+    def engine_with(fences):
+        engine = GeofenceEngine()
+        spawned = []
+        engine._spawn = spawned.append
+        engine._buses["bus-1"] = _BusFences("session-1", "to_school", GeofenceIndex(fences), loaded_at=float("inf"))
+        return engine, spawned
+
+    return redis, clock, engine_with
+
+
+@pytest.mark.asyncio
+async def test_failed_notification_retries_only_missing_recipients_after_backoff(notify_env, monkeypatch):
+    redis, clock, engine_with = notify_env
+    notify = AsyncMock(side_effect=[None, RuntimeError("push down"), None])
+    monkeypatch.setattr(NotificationService, "notify_parents_of_student", notify)
+    engine, spawned = engine_with(build_trip_fences("to_school", {}, (41.0, 29.0)))
+    state = engine._buses["bus-1"]
+
+    assert engine.on_location("bus-1", 41.0005, 29.0) == 1  # school arrival
+    await spawned.pop()  # s1 notified, s2 failed
+
+    assert redis.sets["geofence:fired:session-1:arrival:school"] == {"s1"}
+    assert "geofence:fired:session-1" not in redis.sets
+    assert engine.on_location("bus-1", 41.0005, 29.0) == 0  # backing off
+    clock[0] += geofence_service.FIRE_RETRY_BASE_SECONDS
+    assert engine.on_location("bus-1", 41.0005, 29.0) == 1
+    await spawned.pop()
+
+    assert [call.args[0] for call in notify.await_args_list] == ["s1", "s2", "s2"]
+    assert redis.sets["geofence:fired:session-1"] == {"arrival:school"}
+    assert len(state.index) == 0 and state.retries == {}
+
+
+@pytest.mark.asyncio
+async def test_persistent_failure_gives_up_after_max_attempts(notify_env, monkeypatch):
+    redis, clock, engine_with = notify_env
+    notify = AsyncMock(side_effect=RuntimeError("bad target"))
+    monkeypatch.setattr(NotificationService, "notify_parents_of_student", notify)
+    engine, spawned = engine_with(build_trip_fences("from_school", {"s1": (41.0, 29.0)}, None))
+    state = engine._buses["bus-1"]
+
+    for _ in range(geofence_service.FIRE_MAX_ATTEMPTS):
+        clock[0] += 3600
+        assert engine.on_location("bus-1", 41.002, 29.0) == 1  # approach only
+        await spawned.pop()
+
+    assert notify.await_count == geofence_service.FIRE_MAX_ATTEMPTS
+    assert redis.sets["geofence:fired:session-1"] == {"approach:s1"}
+    assert [f.fence_id for f in state.index.pending()] == ["arrival:s1"]
+    clock[0] += 3600
+    assert engine.on_location("bus-1", 41.002, 29.0) == 0
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.database.models.bus_location import BusLocation
+from app.services import latest_location_service as module
+from app.services.latest_location_service import LatestLocationService
+
+
+pytestmark = pytest.mark.unit
+
+
+def _hash(bus_id: str, latitude: float = 41.0) -> dict:
+    return {
+        "id": f"loc-{bus_id}",
+        "bus_id": bus_id,
+        "latitude": str(latitude),
+        "longitude": "29.0",
+        "speed": "",
+        "timestamp": "2026-01-01T07:30:00",
+        "ts_ms": "1767252600000",
+    }
+
+
+class FakePipeline:
+    def __init__(self, store: dict):
+        self.store = store
+        self.keys = []
+
+    def hgetall(self, key):
+        self.keys.append(key)
+
+    async def execute(self):
+        return [self.store.get(key, {}) for key in self.keys]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def fake_latest_redis(monkeypatch):
+    store = {}
+    redis = SimpleNamespace(
+        store=store,
+        hgetall=AsyncMock(side_effect=lambda key: store.get(key, {})),
+        eval=AsyncMock(return_value=1),
+        pipeline=MagicMock(side_effect=lambda transaction=False: FakePipeline(store)),
+    )
+    monkeypatch.setattr(module.redis_manager, "get_redis", AsyncMock(return_value=redis))
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_get_returns_cached_location_without_touching_db(fake_latest_redis, mock_db_session):
+    fake_latest_redis.store["bus:bus-1:latest"] = _hash("bus-1")
+
+    location = await LatestLocationService(mock_db_session).get("bus-1")
+
+    assert location.id == "loc-bus-1"
+    assert location.latitude == 41.0
+    assert location.speed is None
+    assert location.timestamp == datetime(2026, 1, 1, 7, 30)
+    mock_db_session.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_falls_back_to_history_and_backfills(fake_latest_redis, mock_db_session, make_execute_result):
+    row = BusLocation(
+        id="loc-db",
+        bus_id="bus-1",
+        latitude=41.1,
+        longitude=29.1,
+        speed=20,
+        timestamp=datetime(2026, 1, 1, 7, 0),
+    )
+    mock_db_session.execute.return_value = make_execute_result(scalar_one_or_none=row)
+
+    location = await LatestLocationService(mock_db_session).get("bus-1")
+
+    assert location is row
+    args = fake_latest_redis.eval.await_args.args
+    assert args[2] == "bus:bus-1:latest"
+    assert args[3] == int(datetime(2026, 1, 1, 7, 0, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@pytest.mark.asyncio
+async def test_get_many_queries_history_only_for_misses(fake_latest_redis, mock_db_session, make_execute_result):
+    fake_latest_redis.store["bus:bus-1:latest"] = _hash("bus-1")
+    row = BusLocation(
+        id="loc-db",
+        bus_id="bus-2",
+        latitude=40.0,
+        longitude=29.0,
+        speed=None,
+        timestamp=datetime(2026, 1, 1, 7, 0),
+    )
+    mock_db_session.execute.return_value = make_execute_result(all_items=[row])
+
+    latest = await LatestLocationService(mock_db_session).get_many(["bus-1", "bus-2", "bus-3"])
+
+    assert set(latest) == {"bus-1", "bus-2"}
+    assert latest["bus-2"] is row
+    mock_db_session.execute.assert_awaited_once()
+    fake_latest_redis.eval.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_record_sends_epoch_ms_and_flattened_fields(fake_latest_redis):
+    point = {
+        "id": "loc-1",
+        "bus_id": "bus-1",
+        "latitude": 41.0,
+        "longitude": 29.0,
+        "speed": 12.5,
+        "timestamp": datetime(2026, 1, 1, 10, 30, tzinfo=timezone(timedelta(hours=3))),
+    }
+
+    assert await LatestLocationService().record(point) is True
+
+    args = fake_latest_redis.eval.await_args.args
+    fields = dict(zip(args[5::2], args[6::2]))
+    assert fields["timestamp"] == "2026-01-01T07:30:00"
+    assert fields["speed"] == "12.5"
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pydantic
+import pytest
+
+from app.database import database
+from app.database.schemas.bus_location import LocationBatchUpload
+from app.services import location_batch_service
+from app.services.location_batch_service import new_fixes, prepare_batch
+
+
+pytestmark = pytest.mark.unit
+
+NOW = datetime(2026, 1, 5, 9, 0, tzinfo=timezone.utc)
+
+
+def _ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def _upload(offsets, latitudes=None, speeds=None):
+    """Fixes offsets seconds before NOW."""
+    return LocationBatchUpload(
+        timestamps=[_ms(NOW - timedelta(seconds=offset)) for offset in offsets],
+        latitudes=latitudes or [41.0 + i * 0.0001 for i in range(len(offsets))],
+        longitudes=[29.0] * len(offsets),
+        speeds=speeds,
+    )
+
+
+def test_upload_schema_requires_equal_columns():
+    with pytest.raises(pydantic.ValidationError):
+        LocationBatchUpload(timestamps=[1, 2], latitudes=[41.0], longitudes=[29.0, 29.0])
+
+
+def test_prepare_batch_rejects_invalid_and_dedupes_in_batch():
+    upload = _upload(
+        [30, 60, 30, 10, 3 * 24 * 3600, -3600, 5],
+        latitudes=[41.0, 41.1, 41.2, 95.0, 41.0, 41.0, 41.3],
+        speeds=[20.0, None, 20.0, 20.0, 20.0, 20.0, 400.0],
+    )
+
+    batch = prepare_batch(upload, now=NOW)
+
+    # out of range latitude, too old, too far in the future, impossible speed
+    assert batch.rejected == 4
+    assert batch.duplicates == 1
+    assert batch.timestamps.tolist() == [
+        (NOW - timedelta(seconds=60)).replace(tzinfo=None),
+        (NOW - timedelta(seconds=30)).replace(tzinfo=None),
+    ]
+    assert batch.latitudes.tolist() == [41.1, 41.0]  # first fix sent wins
+    assert np.isnan(batch.speeds[0])
+
+
+def test_new_fixes_matches_stored_rows_at_millisecond_precision():
+    batch = prepare_batch(_upload([60, 30, 0]), now=NOW)
+    stored = [(NOW - timedelta(seconds=30)).replace(tzinfo=None) + timedelta(microseconds=400)]
+
+    assert new_fixes(batch.timestamps, stored).tolist() == [True, False, True]
+
+
+@pytest.mark.asyncio
+async def test_upload_copies_only_new_fixes_and_skips_live_channel(monkeypatch):
+    stored = [(NOW - timedelta(seconds=60)).replace(tzinfo=None)]
+    copy = AsyncMock()
+    executed = []
+
+    async def execute(statement, params=None):
+        executed.append(str(statement))
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: stored))
+
+    conn = SimpleNamespace(
+        execute=execute,
+        get_raw_connection=AsyncMock(
+            return_value=SimpleNamespace(driver_connection=SimpleNamespace(copy_records_to_table=copy))
+        ),
+    )
+
+    class Begin:
+        async def __aenter__(self):
+            return conn
+
+        async def __aexit__(self, *exc):
+            return False
+
+    record_latest = AsyncMock(return_value=True)
+    monkeypatch.setattr(database, "engine", SimpleNamespace(begin=Begin))
+    monkeypatch.setattr(location_batch_service.settings, "LOCATION_WRITE_METHOD", "copy")
+    monkeypatch.setattr(location_batch_service.LatestLocationService, "record", record_latest)
+    monkeypatch.setattr(location_batch_service, "prepare_batch", lambda upload: prepare_batch(upload, now=NOW))
+
+    result = await location_batch_service.upload_location_batch("bus-1", _upload([60, 30, 30, 0]))
+
+    assert (result.received, result.accepted, result.duplicates, result.rejected) == (4, 2, 2, 0)
+    assert "pg_advisory_xact_lock" in executed[0]
+    records = copy.await_args.kwargs["records"]
+    assert [record[5] for record in records] == [
+        (NOW - timedelta(seconds=30)).replace(tzinfo=None),
+        NOW.replace(tzinfo=None),
+    ]
+    assert all(record[1] == "bus-1" for record in records)
+    # Only the newest fix is offered to bus:{id}:latest; nothing is published
+    assert record_latest.await_args.args[-1]["timestamp"] == NOW.replace(tzinfo=None)
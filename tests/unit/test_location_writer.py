@@ -0,0 +1,299 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.tasks import location_writer
+
+
+pytestmark = pytest.mark.unit
+
+
+def _point(**overrides):
+    point = {
+        "id": "loc-1",
+        "bus_id": "bus-1",
+        "latitude": 41.0151,
+        "longitude": 28.9795,
+        "speed": 32.5,
+        "timestamp": datetime(2026, 1, 1, 7, 30, tzinfo=timezone.utc),
+    }
+    point.update(overrides)
+    return point
+
+
+def _stream_redis():
+    return SimpleNamespace(
+        xadd=AsyncMock(return_value="1-0"),
+        xack=AsyncMock(return_value=1),
+        eval=AsyncMock(return_value=1),
+    )
+
+
+def test_serialize_and_deserialize_point_round_trip():
+    fields = location_writer._serialize_point(_point(speed=None))
+
+    assert all(isinstance(value, str) for value in fields.values())
+    assert location_writer._deserialize_point(fields) == _point(speed=None)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_location_appends_to_stream_in_stream_mode(monkeypatch):
+    redis = _stream_redis()
+    monkeypatch.setattr(location_writer.settings, "LOCATION_INGEST_MODE", "stream")
+    monkeypatch.setattr(location_writer.redis_manager, "get_redis", AsyncMock(return_value=redis))
+    monkeypatch.setattr(location_writer, "_point_suppressor", location_writer.PointSuppressor())
+
+    await location_writer.enqueue_location(_point())
+
+    redis.xadd.assert_awaited_once()
+    assert redis.xadd.await_args.args[0] == location_writer.settings.LOCATION_STREAM_KEY
+    # Latest-position hash is updated at ingest time, before the DB flush.
+    assert redis.eval.await_args.args[2] == "bus:bus-1:latest"
+    assert location_writer._location_queue.empty()
+
+
+def test_point_suppressor_collapses_stops_and_keeps_heartbeat(monkeypatch):
+    monkeypatch.setattr(location_writer.settings, "LOCATION_HEARTBEAT_SECONDS", 60)
+    suppressor = location_writer.PointSuppressor()
+    start = datetime(2026, 1, 1, 7, 30, tzinfo=timezone.utc)
+
+    def at(seconds, **overrides):
+        return _point(id=f"p{seconds}", timestamp=start + timedelta(seconds=seconds), **overrides)
+
+    kept = [point["id"] for point in suppressor.filter(at(0, speed=0.0))]
+    for seconds in (5, 10, 15):
+        kept += [point["id"] for point in suppressor.filter(at(seconds, speed=0.0))]
+    assert kept == ["p0"]
+
+    # Stationary past the heartbeat: one point, the held one is dropped.
+    kept += [point["id"] for point in suppressor.filter(at(60, speed=0.0))]
+    kept += [point["id"] for point in suppressor.filter(at(70, speed=0.0))]
+    # Pulling away: the last stationary fix is written before the moving one.
+    kept += [point["id"] for point in suppressor.filter(at(75, speed=20.0))]
+    kept += [point["id"] for point in suppressor.filter(at(80, speed=21.0, latitude=41.0155))]
+    # Exact duplicate.
+    kept += [point["id"] for point in suppressor.filter(at(80, speed=21.0, latitude=41.0155))]
+
+    assert kept == ["p0", "p60", "p70", "p75", "p80"]
+
+
+@pytest.mark.asyncio
+async def test_process_stream_messages_acks_only_after_successful_write(monkeypatch):
+    redis = _stream_redis()
+    calls = []
+
+    async def fake_write(batch):
+        calls.append("write")
+        assert not redis.xack.await_count
+
+    monkeypatch.setattr(location_writer, "write_location_batch", fake_write)
+    messages = [("1-0", location_writer._serialize_point(_point()))]
+
+    assert await location_writer._process_stream_messages(redis, messages) is True
+    assert calls == ["write"]
+    redis.xack.assert_awaited_once_with(
+        location_writer.settings.LOCATION_STREAM_KEY,
+        location_writer.settings.LOCATION_STREAM_GROUP,
+        "1-0",
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_stream_messages_leaves_entries_pending_when_write_fails(monkeypatch):
+    redis = _stream_redis()
+    monkeypatch.setattr(
+        location_writer,
+        "write_location_batch",
+        AsyncMock(side_effect=RuntimeError("db down")),
+    )
+    messages = [("1-0", location_writer._serialize_point(_point()))]
+
+    assert await location_writer._process_stream_messages(redis, messages) is False
+    redis.xack.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_process_stream_messages_acks_malformed_entries_without_writing(monkeypatch):
+    redis = _stream_redis()
+    write = AsyncMock()
+    monkeypatch.setattr(location_writer, "write_location_batch", write)
+
+    assert await location_writer._process_stream_messages(redis, [("1-0", {"bus_id": "bus-1"})]) is True
+    write.assert_not_awaited()
+    redis.xack.assert_awaited_once()
+
+
+def test_location_records_match_copy_columns_and_normalize_types():
+    records = location_writer._location_records([_point(speed=32.1)])
+
+    assert len(records) == 1
+    record = dict(zip(location_writer._COPY_COLUMNS, records[0]))
+    assert record["bus_id"] == "bus-1"
+    assert str(record["speed"]) == "32.1"
+    assert str(record["latitude"]) == "41.0151"
+    assert record["timestamp"] == datetime(2026, 1, 1, 7, 30)
+    assert record["timestamp"].tzinfo is None
+    assert record["id"]
+
+
+@pytest.mark.asyncio
+async def test_write_location_batch_dispatches_to_configured_method(monkeypatch):
+    copy_writer = AsyncMock()
+    monkeypatch.setitem(location_writer._WRITE_METHODS, "copy", copy_writer)
+    monkeypatch.setattr(location_writer.settings, "LOCATION_WRITE_METHOD", "copy")
+
+    await location_writer.write_location_batch([_point()])
+    await location_writer.write_location_batch([])
+
+    copy_writer.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_flush_batch_spills_to_disk_when_write_fails(monkeypatch, tmp_path):
+    from app.core.batch_queue import SpillFile
+
+    spill = SpillFile(str(tmp_path / "spill.jsonl"), name="location_spill", max_bytes=1_000_000)
+    monkeypatch.setattr(location_writer, "_location_spill", spill)
+    monkeypatch.setattr(
+        location_writer,
+        "write_location_batch",
+        AsyncMock(side_effect=RuntimeError("db down")),
+    )
+
+    assert await location_writer._flush_batch([_point()]) is False
+
+    [path] = spill.claim()
+    [[record]] = list(SpillFile.read_chunks(path, 10))
+    assert location_writer._deserialize_point(record) == _point()
+
+
+@pytest.mark.asyncio
+async def test_replay_spill_writes_spilled_points_and_releases_file(monkeypatch, tmp_path):
+    from app.core.batch_queue import SpillFile
+
+    spill = SpillFile(str(tmp_path / "spill.jsonl"), name="location_spill", max_bytes=1_000_000)
+    spill.append([location_writer._serialize_point(_point())])
+    write = AsyncMock()
+    monkeypatch.setattr(location_writer, "_location_spill", spill)
+    monkeypatch.setattr(location_writer, "write_location_batch", write)
+
+    await location_writer._replay_spill()
+
+    write.assert_awaited_once_with([_point()])
+    assert spill.size_bytes() == 0
+
+
+class _PrimaryKeyConnection:
+    """asyncpg stand-in: staging table + bus_locations keyed on (id, timestamp)."""
+
+    def __init__(self):
+        self.stored = {}
+        self.staging = []
+
+    def transaction(self):
+        connection = self
+
+        class _Transaction:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                connection.staging = []  # ON COMMIT DELETE ROWS
+                return False
+
+        return _Transaction()
+
+    async def copy_records_to_table(self, table, records, columns):
+        assert table == location_writer._STAGING_TABLE
+        self.staging.extend(records)
+
+    async def execute(self, sql):
+        if not sql.startswith("INSERT"):
+            return "CREATE TABLE"
+        inserted = 0
+        for record in self.staging:
+            if (record[0], record[5]) not in self.stored:
+                self.stored[(record[0], record[5])] = record
+                inserted += 1
+        return f"INSERT 0 {inserted}"
+
+
+@pytest.mark.asyncio
+async def test_redelivered_committed_batch_is_skipped_and_acked(monkeypatch):
+    from app.database import database
+
+    connection = _PrimaryKeyConnection()
+
+    class _Connect:
+        async def __aenter__(self):
+            return SimpleNamespace(
+                get_raw_connection=AsyncMock(return_value=SimpleNamespace(driver_connection=connection))
+            )
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(database, "engine", SimpleNamespace(connect=_Connect))
+    monkeypatch.setattr(location_writer.settings, "LOCATION_WRITE_METHOD", "copy")
+    redis = _stream_redis()
+    messages = [
+        ("1-0", location_writer._serialize_point(_point(id="loc-1"))),
+        ("2-0", location_writer._serialize_point(_point(id="loc-2", latitude=41.02))),
+    ]
+
+    assert await location_writer._process_stream_messages(redis, messages) is True
+    # Crash between COPY commit and XACK: the same entries are delivered again.
+    assert await location_writer._process_stream_messages(redis, messages) is True
+
+    assert sorted(key[0] for key in connection.stored) == ["loc-1", "loc-2"]
+    assert redis.xack.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_orm_batch_keeps_point_ids_and_skips_redelivered_rows(monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+    from app.database import database
+
+    added = []
+
+    class _Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        def add_all(self, rows):
+            added.extend(rows)
+
+        async def commit(self):
+            raise IntegrityError("INSERT", {}, Exception("duplicate key"))
+
+        async def rollback(self):
+            pass
+
+    insert = AsyncMock()
+    monkeypatch.setattr(database, "AsyncSessionLocal", _Session)
+    monkeypatch.setattr(location_writer, "_insert_location_batch", insert)
+    batch = [_point(id="loc-7")]
+
+    await location_writer._orm_location_batch(batch)
+
+    assert [row.id for row in added] == ["loc-7"]
+    insert.assert_awaited_once_with(batch)
+
+
+@pytest.mark.asyncio
+async def test_stream_writer_flags_an_evicting_redis(caplog):
+    evicting = SimpleNamespace(config_get=AsyncMock(return_value={"maxmemory-policy": "allkeys-lru"}))
+    safe = SimpleNamespace(config_get=AsyncMock(return_value={"maxmemory-policy": "volatile-lru"}))
+    managed = SimpleNamespace(config_get=AsyncMock(side_effect=RuntimeError("unknown command 'CONFIG'")))
+
+    await location_writer._check_eviction_policy(safe)
+    await location_writer._check_eviction_policy(managed)
+    assert not [record for record in caplog.records if record.levelname == "ERROR"]
+
+    await location_writer._check_eviction_policy(evicting)
+    assert "allkeys-lru" in caplog.records[-1].getMessage()
@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.core import pubsub_hub as hub_module
+from app.core.pubsub_hub import PubSubHub
+
+
+pytestmark = pytest.mark.unit
+
+
+class FakePubSub:
+    def __init__(self):
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.subscribe = AsyncMock()
+        self.unsubscribe = AsyncMock()
+        self.aclose = AsyncMock()
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=None):
+        try:
+            return await asyncio.wait_for(self.inbox.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+@pytest.fixture
+def fake_pubsub(monkeypatch):
+    pubsub = FakePubSub()
+    redis = SimpleNamespace(pubsub=MagicMock(return_value=pubsub))
+    monkeypatch.setattr(hub_module.redis_manager, "get_redis", AsyncMock(return_value=redis))
+    return pubsub
+
+
+@pytest.mark.asyncio
+async def test_hub_uses_one_redis_subscription_per_channel_and_fans_out(fake_pubsub):
+    hub = PubSubHub()
+    listeners = [await hub.subscribe("bus:1:location") for _ in range(30)]
+
+    fake_pubsub.subscribe.assert_awaited_once_with("bus:1:location")
+    assert hub.listener_count("bus:1:location") == 30
+
+    await fake_pubsub.inbox.put({"type": "message", "channel": "bus:1:location", "data": "frame"})
+    received = await asyncio.wait_for(asyncio.gather(*(queue.get() for queue in listeners)), timeout=1)
+
+    assert received == ["frame"] * 30
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_hub_unsubscribes_when_last_listener_leaves(fake_pubsub):
+    hub = PubSubHub()
+    first = await hub.subscribe("bus:1:location")
+    second = await hub.subscribe("bus:1:location")
+
+    await hub.unsubscribe("bus:1:location", first)
+    fake_pubsub.unsubscribe.assert_not_awaited()
+
+    await hub.unsubscribe("bus:1:location", second)
+    fake_pubsub.unsubscribe.assert_awaited_once_with("bus:1:location")
+    assert hub.listener_count("bus:1:location") == 0
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_hub_drops_oldest_frame_for_slow_listener(fake_pubsub):
+    hub = PubSubHub(queue_size=2)
+    queue = await hub.subscribe("bus:1:location")
+
+    for frame in ("a", "b", "c"):
+        hub._dispatch("bus:1:location", frame)
+
+    assert [queue.get_nowait(), queue.get_nowait()] == ["b", "c"]
+    await hub.close()
@@ -0,0 +1,121 @@
+import fnmatch
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.redis import RedisManager
+
+
+pytestmark = pytest.mark.unit
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for set_tagged/invalidate_tag."""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+        self.expires = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def scan_iter(self, match, count=None):
+        for key in list(self.values):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def delete(self, key):
+        return int(self.values.pop(key, None) is not None)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.ops.append(lambda: self.redis.values.__setitem__(key, value) or True)
+
+    def sadd(self, key, member):
+        self.ops.append(lambda: self.redis.sets.setdefault(key, set()).add(member) or 1)
+
+    def expire(self, key, seconds, nx=False, gt=False):
+        def op():
+            current = self.redis.expires.get(key)
+            if (nx and current is None) or (gt and current is not None and seconds > current):
+                self.redis.expires[key] = seconds
+                return True
+            return False
+        self.ops.append(op)
+
+    def smembers(self, key):
+        self.ops.append(lambda: set(self.redis.sets.get(key, set())))
+
+    def unlink(self, *keys):
+        def op():
+            removed = 0
+            for key in keys:
+                removed += int(self.redis.values.pop(key, None) is not None or self.redis.sets.pop(key, None) is not None)
+            return removed
+        self.ops.append(op)
+
+    async def execute(self):
+        return [op() for op in self.ops]
+
+
+@pytest.fixture
+def manager():
+    manager = RedisManager()
+    manager.redis = FakeRedis()
+    manager.connect = AsyncMock()
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_invalidate_tag_unlinks_only_tagged_keys(manager):
+    await manager.set_tagged("route:bus-1:a", "1", tags=["routes:bus-1", "routes"], ex=1800)
+    await manager.set_tagged("route:bus-1:plan:to_school", "2", tags=["routes:bus-1", "routes"], ex=43200)
+    await manager.set_tagged("route:bus-2:a", "3", tags=["routes:bus-2", "routes"], ex=1800)
+    manager.redis.values["eta:student-1"] = "9"
+
+    deleted = await manager.invalidate_tag("routes:bus-1")
+
+    assert deleted == 2
+    assert set(manager.redis.values) == {"route:bus-2:a", "eta:student-1"}
+    assert "tag:routes:bus-1" not in manager.redis.sets
+
+
+@pytest.mark.asyncio
+async def test_tag_set_keeps_longest_member_ttl(manager):
+    await manager.set_tagged("route:bus-1:plan:to_school", "2", tags=["routes:bus-1"], ex=43200)
+    await manager.set_tagged("route:bus-1:a", "1", tags=["routes:bus-1"], ex=1800)
+
+    assert manager.redis.expires["tag:routes:bus-1"] == 43200
+
+
+@pytest.mark.asyncio
+async def test_invalidate_unknown_tag_is_noop(manager):
+    assert await manager.invalidate_tag("routes:missing") == 0
+
+
+@pytest.mark.asyncio
+async def test_missing_tag_set_falls_back_to_scan(manager):
+    manager.redis.values["route:bus-1:no_origin:to_school:none"] = "1"  # cached before tagging
+    await manager.set_tagged("route:bus-2:a", "2", tags=["routes:bus-2"], ex=1800)
+    del manager.redis.sets["tag:routes:bus-2"]  # evicted
+    manager.redis.values["route:bus-3:a"] = "3"
+
+    deleted = await manager.invalidate_tag(
+        "routes:bus-1", "routes:bus-2",
+        fallback_patterns={"routes:bus-1": "route:bus-1:*", "routes:bus-2": "route:bus-2:*"},
+    )
+
+    assert deleted == 2
+    assert set(manager.redis.values) == {"route:bus-3:a"}
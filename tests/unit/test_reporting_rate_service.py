@@ -0,0 +1,66 @@
+import pytest
+
+from app.services import reporting_rate_service as rate_module
+from app.services.reporting_rate_service import ReportingRateController, desired_interval
+
+
+pytestmark = pytest.mark.unit
+
+
+def test_desired_interval_rules():
+    assert desired_interval(40, 150, watched=True, ingest_load=0) == (2, "near_stop")
+    assert desired_interval(40, 150, watched=False, ingest_load=0.9) == (2, "near_stop")
+    assert desired_interval(1, 2000, watched=True, ingest_load=0) == (30, "parked")
+    assert desired_interval(40, None, watched=False, ingest_load=0) == (15, "unwatched")
+    assert desired_interval(40, 2000, watched=True, ingest_load=0) == (5, "moving")
+    assert desired_interval(40, 2000, watched=True, ingest_load=0.6) == (10, "moving_load")
+    assert desired_interval(1, None, watched=True, ingest_load=0.6) == (30, "parked_load")
+
+
+class NumsubRedis:
+    def __init__(self, counts):
+        self.counts = counts
+
+    async def pubsub_numsub(self, *channels):
+        return [(channel, self.counts.get(channel, 0)) for channel in channels]
+
+
+@pytest.mark.asyncio
+async def test_controller_sends_frame_only_when_interval_changes(monkeypatch):
+    redis = NumsubRedis({"bus:bus-1:location": 1})
+    clock = [1000.0]
+    stop_distance = [None]
+
+    async def get_redis():
+        return redis
+
+    async def load():
+        return 0.0
+
+    monkeypatch.setattr(rate_module.redis_manager, "get_redis", get_redis)
+    monkeypatch.setattr("app.tasks.location_writer.ingest_load", load)
+    monkeypatch.setattr(rate_module.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(rate_module.geofence_engine, "nearest_stop_meters", lambda bus_id, lat, lng: stop_distance[0])
+
+    controller = ReportingRateController("bus-1")
+    assert controller.initial_frame()["interval_seconds"] == 5
+
+    assert await controller.on_location(41.0, 29.0, speed=40) is None  # still 5 s
+    clock[0] += 5
+    stop_distance[0] = 200
+    assert await controller.on_location(41.001, 29.0, speed=40) is None  # within eval window
+    clock[0] += 10
+    assert await controller.on_location(41.002, 29.0, speed=40) == {
+        "type": "control", "interval_seconds": 2, "reason": "near_stop",
+    }
+
+    # No speed reported: derived from the previous fix (~0 m in 10 s -> parked).
+    stop_distance[0] = None
+    clock[0] += 10
+    frame = await controller.on_location(41.002, 29.0)
+    assert frame["interval_seconds"] == 30 and frame["reason"] == "parked"
+
+    redis.counts = {}
+    clock[0] += 30
+    frame = await controller.on_location(41.01, 29.0)  # ~890 m in 30 s
+    assert frame["interval_seconds"] == 15 and frame["reason"] == "unwatched"
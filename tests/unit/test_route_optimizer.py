@@ -0,0 +1,69 @@
+import itertools
+import random
+
+import pytest
+
+from app.services.route_optimizer import distance_matrix, optimize_route, path_length
+
+
+pytestmark = pytest.mark.unit
+
+
+def _random_stops(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [(41.0 + rng.uniform(0, 0.2), 28.9 + rng.uniform(0, 0.3)) for _ in range(count)]
+
+
+def _brute_force_length(stops, origin, destination):
+    dist = distance_matrix([*stops, origin, destination])
+    n = len(stops)
+    return min(
+        path_length([n, *perm, n + 1], dist)
+        for perm in itertools.permutations(range(n))
+    )
+
+
+def test_optimize_route_matches_brute_force_on_small_instance():
+    stops = _random_stops(7)
+    origin, destination = (41.0, 28.9), (41.2, 29.2)
+
+    tour = optimize_route(stops, origin=origin, destination=destination, time_budget_ms=1000)
+
+    assert sorted(tour.order) == list(range(7))
+    assert tour.distance_meters == pytest.approx(_brute_force_length(stops, origin, destination), rel=0.02)
+
+
+def test_optimize_route_never_worse_than_greedy_seed():
+    stops = _random_stops(60, seed=11)
+
+    tour = optimize_route(stops, origin=(41.0, 28.9), destination=(41.1, 29.05), time_budget_ms=2000)
+
+    assert sorted(tour.order) == list(range(60))
+    assert tour.distance_meters <= tour.seed_distance_meters
+    assert tour.improvements > 0
+
+
+def test_optimize_route_keeps_fixed_last_stop_at_the_end():
+    stops = _random_stops(12, seed=3)
+
+    tour = optimize_route(stops, origin=(41.0, 28.9), destination=stops[4], fixed_last=4)
+
+    assert tour.order[-1] == 4
+    assert sorted(tour.order) == list(range(12))
+
+
+def test_optimize_route_returns_seed_when_budget_is_exhausted():
+    stops = _random_stops(40, seed=5)
+
+    tour = optimize_route(stops, origin=(41.0, 28.9), time_budget_ms=0)
+
+    assert tour.timed_out
+    assert sorted(tour.order) == list(range(40))
+    assert tour.distance_meters <= tour.seed_distance_meters
+
+
+def test_optimize_route_without_endpoints_orders_all_stops():
+    tour = optimize_route(_random_stops(5))
+
+    assert sorted(tour.order) == list(range(5))
+    assert optimize_route([]).order == []
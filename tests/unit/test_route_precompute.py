@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, time
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.database import database
+from app.database.models.organization import OrganizationType
+from app.services import route_service
+from app.tasks import route_precompute
+from app.tasks.route_precompute import due_trip_types, precompute_routes, shift_starts
+
+
+pytestmark = pytest.mark.unit
+
+IST = ZoneInfo("Europe/Istanbul")
+
+
+def test_shift_starts_fall_back_to_settings(monkeypatch):
+    monkeypatch.setattr(route_precompute.settings, "DEFAULT_MORNING_SHIFT_START", "07:00")
+    monkeypatch.setattr(route_precompute.settings, "DEFAULT_AFTERNOON_SHIFT_START", "15:30")
+
+    assert shift_starts(None, time(16, 0)) == {"to_school": time(7, 0), "from_school": time(16, 0)}
+
+
+def test_due_trip_types_opens_lead_minutes_before_shift():
+    starts = {"to_school": time(7, 0), "from_school": time(15, 30)}
+
+    assert due_trip_types(starts, datetime(2026, 4, 20, 6, 29, tzinfo=IST), 30) == []
+    assert due_trip_types(starts, datetime(2026, 4, 20, 6, 30, tzinfo=IST), 30) == ["to_school"]
+    assert due_trip_types(starts, datetime(2026, 4, 20, 6, 59, tzinfo=IST), 30) == ["to_school"]
+    assert due_trip_types(starts, datetime(2026, 4, 20, 7, 0, tzinfo=IST), 30) == []
+    assert due_trip_types(starts, datetime(2026, 4, 20, 15, 10, tzinfo=IST), 30) == ["from_school"]
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_precompute_routes_bounds_concurrency_and_counts_failures(monkeypatch):
+    running = 0
+    peak = 0
+    seen = []
+
+    class FakeRouteService:
+        def __init__(self, db):
+            self.db = db
+
+        async def get_optimized_route(self, bus_id, trip_type, refresh=False):
+            nonlocal running, peak
+            assert refresh  # a stale plan must not be derived from
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.005)
+            running -= 1
+            seen.append((bus_id, trip_type))
+            if bus_id == "bus-3":
+                raise RuntimeError("maps quota")
+
+    monkeypatch.setattr(database, "AsyncSessionLocal", _Session)
+    monkeypatch.setattr(route_service, "RouteService", FakeRouteService)
+
+    done = await precompute_routes([f"bus-{i}" for i in range(8)], "to_school", concurrency=3)
+
+    assert done == 7
+    assert peak == 3
+    assert sorted(seen) == sorted((f"bus-{i}", "to_school") for i in range(8))
+
+
+@pytest.mark.asyncio
+async def test_active_bus_ids_follow_the_school_organization_first(monkeypatch):
+    queries = []
+
+    class Session(_Session):
+        async def execute(self, query):
+            queries.append(str(query.compile(compile_kwargs={"literal_binds": True})))
+            return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: []))
+
+    monkeypatch.setattr(database, "AsyncSessionLocal", Session)
+
+    await route_precompute._active_bus_ids("school-org", OrganizationType.school)
+    await route_precompute._active_bus_ids("company-org", OrganizationType.transport_company)
+    await route_precompute._active_bus_ids(route_precompute._NO_ORGANIZATION)
+
+    school, company, orphan = queries
+    assert "schools.organization_id = 'school-org'" in school
+    assert "buses.organization_id" not in school
+    assert "schools.organization_id IS NULL" in company and "buses.organization_id = 'company-org'" in company
+    assert "schools.organization_id IS NULL" in orphan and "buses.organization_id IS NULL" in orphan
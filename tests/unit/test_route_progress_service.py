@@ -0,0 +1,95 @@
+import pytest
+
+from app.services import route_progress_service as progress_module
+from app.services.route_progress_service import RouteProgressService
+
+
+pytestmark = pytest.mark.unit
+
+
+class ProgressRedis:
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+
+    def pipeline(self, transaction=True):
+        return ProgressPipeline(self)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def srem(self, key, member):
+        members = self.sets.get(key, set())
+        if member in members:
+            members.discard(member)
+            return 1
+        return 0
+
+
+class ProgressPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def sadd(self, key, member):
+        members = self.redis.sets.setdefault(key, set())
+        self.results.append(0 if member in members else 1)
+        members.add(member)
+
+    def expire(self, key, seconds):
+        self.results.append(True)
+
+    async def execute(self):
+        return self.results
+
+
+@pytest.fixture
+def progress_redis(monkeypatch):
+    redis = ProgressRedis()
+
+    async def get_redis():
+        return redis
+
+    async def get(key):
+        return redis.values.get(key)
+
+    async def set_value(key, value, ex=None):
+        redis.values[key] = value
+        return True
+
+    async def delete(key):
+        redis.values.pop(key, None)
+        redis.sets.pop(key, None)
+        return 1
+
+    monkeypatch.setattr(progress_module.redis_manager, "get_redis", get_redis)
+    monkeypatch.setattr(progress_module.redis_manager, "get", get)
+    monkeypatch.setattr(progress_module.redis_manager, "set", set_value)
+    monkeypatch.setattr(progress_module.redis_manager, "delete", delete)
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_provisional_visits_are_merged_confirmed_and_reopened(progress_redis):
+    progress = RouteProgressService()
+    await progress.add_visited("bus-1", "to_school", "s1")
+
+    assert await progress.add_provisional("bus-1", "to_school", "s2") is True
+    assert await progress.add_provisional("bus-1", "to_school", "s2") is False
+    assert await progress.get_visited("bus-1", "to_school") == ["s1", "s2"]
+
+    # Driver confirms: moves to the manual list.
+    await progress.add_visited("bus-1", "to_school", "s2")
+    assert await progress.get_provisional("bus-1", "to_school") == []
+    assert await progress.get_visited("bus-1", "to_school") == ["s1", "s2"]
+
+    await progress.add_provisional("bus-1", "to_school", "s3")
+    assert await progress.remove_visited("bus-1", "to_school", "s3") is True
+    assert await progress.remove_visited("bus-1", "to_school", "s3") is False
+    assert await progress.get_visited("bus-1", "to_school") == ["s1", "s2"]
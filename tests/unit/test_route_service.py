@@ -1,3 +1,7 @@
+from types import SimpleNamespace
+
+import pytest
+
 from app.database.schemas.route import RouteStop
 from app.services.route_service import RouteService
 
@@ -49,3 +53,177 @@ def test_order_stops_geographically_keeps_fixed_destination_last_for_from_school
     )
 
     assert ordered[-1].student_id == "student-destination"
+
+
+def test_split_into_direction_segments_respects_waypoint_limit():
+    service = RouteService(db=None)  # type: ignore[arg-type]
+    stops = [_stop(f"student-{i}", 41.0 + i * 0.001, 29.0, str(i)) for i in range(60)]
+
+    segments = service._split_into_direction_segments(stops, (40.99, 29.0), (41.2, 29.1))
+
+    assert all(len(segment) - 2 <= RouteService.MAX_DIRECTIONS_WAYPOINTS for segment in segments)
+    for previous, current in zip(segments, segments[1:]):
+        assert previous[-1] == current[0]
+    visited = [stop.student_id for segment in segments for _, stop in segment[1:] if stop is not None]
+    assert visited == [stop.student_id for stop in stops]
+
+
+@pytest.mark.asyncio
+async def test_chunked_google_route_stitches_segments():
+    import polyline
+
+    calls = []
+
+    def fake_directions(*, origin, destination, waypoints, optimize_waypoints, mode):
+        calls.append(len(waypoints))
+        return [{
+            "waypoint_order": list(reversed(range(len(waypoints)))),
+            "legs": [{"distance": {"value": 100}, "duration": {"value": 10}}] * (len(waypoints) + 1),
+            "overview_polyline": {"points": polyline.encode([origin, destination])},
+        }]
+
+    service = RouteService(db=None)  # type: ignore[arg-type]
+    service.gmaps_client = SimpleNamespace(directions=fake_directions)
+    stops = [_stop(f"student-{i}", 41.0 + i * 0.001, 29.0 + (i % 7) * 0.002, str(i)) for i in range(60)]
+
+    route = await service._optimize_with_google_maps(
+        "bus-1", stops, (40.99, 29.0), (41.2, 29.1), "to_school"
+    )
+
+    assert len(calls) == 3
+    assert max(calls) <= RouteService.MAX_DIRECTIONS_WAYPOINTS
+    assert sorted(stop.student_id for stop in route.stops) == sorted(stop.student_id for stop in stops)
+    assert [stop.sequence_order for stop in route.stops] == list(range(1, 61))
+    # 62 nodes (origin, 60 stops, destination) -> 61 legs across all segments
+    assert route.total_distance_meters == 100 * 61
+    assert route.total_duration_seconds == 10 * 61
+    assert len(polyline.decode(route.overview_polyline)) == 4
+
+
+class _DictRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+        return True
+
+    async def set_tagged(self, key, value, tags, ex=None):
+        return await self.set(key, value, ex=ex)
+
+
+def _planned_route(stops, origin, destination):
+    from datetime import datetime, timezone
+    from app.database.schemas.route import OptimizedRouteResponse, RoutePoint
+
+    for idx, stop in enumerate(stops, 1):
+        stop.sequence_order = idx
+    return OptimizedRouteResponse(
+        bus_id="bus-1",
+        stops=stops,
+        origin=RoutePoint(latitude=origin[0], longitude=origin[1]),
+        destination=RoutePoint(latitude=destination[0], longitude=destination[1]),
+        total_distance_meters=20000,
+        total_duration_seconds=1800,
+        generated_at=datetime.now(timezone.utc),
+        overview_polyline="abc",
+    )
+
+
+def _line_stops():
+    return [_stop(f"student-{i}", 41.0 + i * 0.01, 29.0, str(i)) for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_route_plan_derives_order_after_visit(monkeypatch):
+    import polyline
+
+    redis = _DictRedis()
+    monkeypatch.setattr("app.services.route_service.redis_manager", redis)
+    service = RouteService(db=None)  # type: ignore[arg-type]
+    stops = _line_stops()
+    origin, destination = (40.99, 29.0), (41.1, 29.0)
+    await service._save_route_plan(
+        bus_id="bus-1",
+        trip_type="to_school",
+        route=_planned_route(stops, origin, destination),
+        assigned_student_ids=[stop.student_id for stop in stops],
+        organization_id="org-1",
+    )
+    plan = await service._load_route_plan("bus-1", "to_school")
+
+    derived = await service._derive_route_from_plan(
+        bus_id="bus-1",
+        plan=plan,
+        excludes={"student-0", "student-2"},
+        origin=(41.005, 29.0),
+        trip_type="to_school",
+        current_user_org_id="org-1",
+    )
+
+    assert [stop.student_id for stop in derived.stops] == ["student-1", "student-3", "student-4"]
+    assert [stop.sequence_order for stop in derived.stops] == [1, 2, 3]
+    assert derived.origin.latitude == 41.005
+    assert 0 < derived.total_distance_meters < 20000
+    # Visited stops and the old origin are no longer drawn
+    assert polyline.decode(derived.overview_polyline) == [(41.005, 29.0), (41.01, 29.0), (41.03, 29.0), (41.04, 29.0), (41.1, 29.0)]
+
+    unchanged = await service._derive_route_from_plan(
+        bus_id="bus-1", plan=plan, excludes=set(), origin=origin, trip_type="to_school", current_user_org_id="org-1"
+    )
+    assert unchanged.overview_polyline == "abc"
+
+
+@pytest.mark.asyncio
+async def test_route_plan_requires_recompute_when_student_returns_or_org_differs(monkeypatch):
+    redis = _DictRedis()
+    monkeypatch.setattr("app.services.route_service.redis_manager", redis)
+    service = RouteService(db=None)  # type: ignore[arg-type]
+    stops = _line_stops()
+    origin, destination = (40.99, 29.0), (41.1, 29.0)
+    # Plan was made while student-0 was already visited
+    await service._save_route_plan(
+        bus_id="bus-1",
+        trip_type="to_school",
+        route=_planned_route(stops[1:], origin, destination),
+        assigned_student_ids=[stop.student_id for stop in stops],
+        organization_id="org-1",
+    )
+    plan = await service._load_route_plan("bus-1", "to_school")
+    kwargs = dict(bus_id="bus-1", plan=plan, origin=origin, trip_type="to_school")
+
+    assert await service._derive_route_from_plan(excludes=set(), current_user_org_id=None, **kwargs) is None
+    assert await service._derive_route_from_plan(excludes={"student-0"}, current_user_org_id="org-2", **kwargs) is None
+    assert await service._derive_route_from_plan(excludes={"student-0"}, current_user_org_id="org-1", **kwargs) is not None
+
+
+@pytest.mark.asyncio
+async def test_route_plan_requires_recompute_when_order_drifted(monkeypatch):
+    redis = _DictRedis()
+    monkeypatch.setattr("app.services.route_service.redis_manager", redis)
+    service = RouteService(db=None)  # type: ignore[arg-type]
+    stops = _line_stops()
+    zigzag = [stops[4], stops[0], stops[3], stops[1], stops[2]]
+    origin, destination = (40.99, 29.0), (41.1, 29.0)
+    await service._save_route_plan(
+        bus_id="bus-1",
+        trip_type="to_school",
+        route=_planned_route(zigzag, origin, destination),
+        assigned_student_ids=[stop.student_id for stop in stops],
+        organization_id=None,
+    )
+    plan = await service._load_route_plan("bus-1", "to_school")
+
+    derived = await service._derive_route_from_plan(
+        bus_id="bus-1",
+        plan=plan,
+        excludes={"student-2"},
+        origin=origin,
+        trip_type="to_school",
+        current_user_org_id=None,
+    )
+
+    assert derived is None
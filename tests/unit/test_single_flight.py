@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.core import single_flight as single_flight_module
+from app.core.metrics import metrics
+from app.core.single_flight import SingleFlight
+
+
+pytestmark = pytest.mark.unit
+
+
+class LockRedis:
+    """SET NX/PX, EXISTS and the compare-and-delete release script."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def exists(self, key):
+        return int(key in self.values)
+
+    async def eval(self, script, numkeys, key, token):
+        if self.values.get(key) == token:
+            del self.values[key]
+            return 1
+        return 0
+
+
+@pytest.fixture
+def lock_redis(monkeypatch):
+    redis = LockRedis()
+
+    async def get_redis():
+        return redis
+
+    monkeypatch.setattr(single_flight_module.redis_manager, "get_redis", get_redis)
+    metrics.reset()
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_computation(lock_redis):
+    flight = SingleFlight(poll_interval=0.001)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"minutes": 7}
+
+    async def read_cached():
+        return None
+
+    results = await asyncio.gather(*(flight.run("eta:b1:s1", compute, read_cached) for _ in range(5)))
+
+    assert calls == 1
+    assert results == [{"minutes": 7}] * 5
+    assert metrics.counter("single_flight_coalesced_local_total") == 4
+    assert flight.inflight_count() == 0
+    assert "lock:eta:b1:s1" not in lock_redis.values
+
+
+@pytest.mark.asyncio
+async def test_leader_error_reaches_local_waiters(lock_redis):
+    flight = SingleFlight(poll_interval=0.001)
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("directions down")
+
+    results = await asyncio.gather(
+        *(flight.run("k", compute) for _ in range(3)),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.inflight_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_remote_follower_waits_for_cached_result(lock_redis):
+    # Another worker holds the lock and publishes the result a bit later.
+    lock_redis.values["lock:route:b1"] = "other-worker"
+    cache = {}
+    flight = SingleFlight(poll_interval=0.001)
+
+    async def compute():
+        raise AssertionError("follower must not compute")
+
+    async def read_cached():
+        return cache.get("route:b1")
+
+    async def other_worker():
+        await asyncio.sleep(0.01)
+        cache["route:b1"] = "route"
+        del lock_redis.values["lock:route:b1"]
+
+    result, _ = await asyncio.gather(flight.run("route:b1", compute, read_cached), other_worker())
+
+    assert result == "route"
+    assert metrics.counter("single_flight_coalesced_remote_total") == 1
+
+
+@pytest.mark.asyncio
+async def test_remote_follower_computes_when_leader_gives_up(lock_redis):
+    lock_redis.values["lock:route:b1"] = "other-worker"
+    flight = SingleFlight(poll_interval=0.001)
+
+    async def compute():
+        return "own"
+
+    async def read_cached():
+        return None
+
+    async def other_worker_fails():
+        await asyncio.sleep(0.005)
+        del lock_redis.values["lock:route:b1"]
+
+    result, _ = await asyncio.gather(flight.run("route:b1", compute, read_cached), other_worker_fails())
+
+    assert result == "own"
+    assert metrics.counter("single_flight_fallback_total") == 1
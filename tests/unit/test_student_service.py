@@ -210,7 +210,7 @@ async def test_delete_student_rejects_when_attendance_logs_exist(
 
 
 @pytest.mark.asyncio
-async def test_invalidate_route_caches_deletes_patterns_for_all_assigned_buses(
+async def test_invalidate_route_caches_invalidates_tags_for_all_assigned_buses(
     mock_db_session, make_execute_result, fake_redis
 ):
     assignments = [
@@ -220,12 +220,15 @@ async def test_invalidate_route_caches_deletes_patterns_for_all_assigned_buses(
     mock_db_session.execute.return_value = make_execute_result(all_items=assignments)
     service = StudentService(mock_db_session)
 
-    original_delete_pattern = redis_manager.delete_pattern
-    redis_manager.delete_pattern = fake_redis.delete_pattern
+    original_invalidate_tag = redis_manager.invalidate_tag
+    redis_manager.invalidate_tag = fake_redis.invalidate_tag
     try:
         await service._invalidate_route_caches_for_student("student-1")
     finally:
-        redis_manager.delete_pattern = original_delete_pattern
+        redis_manager.invalidate_tag = original_invalidate_tag
 
-    fake_redis.delete_pattern.assert_any_await("route:bus-1:*")
-    fake_redis.delete_pattern.assert_any_await("route:bus-2:*")
+    fake_redis.invalidate_tag.assert_awaited_once_with(
+        "routes:bus-1",
+        "routes:bus-2",
+        fallback_patterns={"routes:bus-1": "route:bus-1:*", "routes:bus-2": "route:bus-2:*"},
+    )
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import polyline
+import pytest
+
+from app.services import track_service
+
+
+pytestmark = pytest.mark.unit
+
+START = datetime(2026, 1, 5, 7, 10)
+
+
+def _rows(count):
+    return [
+        (START + timedelta(seconds=10 * i), Decimal("41.0") + Decimal(i) / 10000, Decimal("29.0"), Decimal("30.5") if i else None)
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def cursor_batches(monkeypatch):
+    batches = []
+
+    async def fake_stream(bus_id, start, end, bucket_seconds):
+        for batch in batches:
+            yield batch
+
+    monkeypatch.setattr(track_service, "stream_track_rows", fake_stream)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_ndjson_streams_one_line_per_point(cursor_batches):
+    rows = _rows(5)
+    cursor_batches.extend([rows[:3], rows[3:]])
+
+    chunks = [chunk async for chunk in track_service.track_ndjson("bus-1", START, START, 10)]
+
+    assert len(chunks) == 2  # one write per cursor batch
+    lines = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert lines[0] == {"t": "2026-01-05T07:10:00", "lat": 41.0, "lng": 29.0, "speed": None}
+    assert lines[4]["t"] == "2026-01-05T07:10:40" and lines[4]["speed"] == 30.5
+
+
+@pytest.mark.asyncio
+async def test_polyline_chunks_carry_timing(cursor_batches, monkeypatch):
+    monkeypatch.setattr(track_service, "POLYLINE_CHUNK_POINTS", 4)
+    rows = _rows(10)
+    cursor_batches.extend([rows[:3], rows[3:7], rows[7:]])
+
+    lines = [json.loads(chunk) async for chunk in track_service.track_polyline("bus-1", START, START, 10)]
+
+    assert [line["points"] for line in lines] == [4, 4, 2]
+    assert lines[1]["from"] == "2026-01-05T07:10:40"
+    assert lines[1]["offsets"] == [0.0, 10.0, 20.0, 30.0]
+    decoded = [point for line in lines for point in polyline.decode(line["polyline"])]
+    assert decoded == [(float(lat), float(lng)) for _, lat, lng, _ in rows]
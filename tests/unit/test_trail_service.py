@@ -0,0 +1,153 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+
+from app.services import trail_service
+from app.services.trail_service import TRAIL_DTYPE, TrailBuffer, TrailStore, to_trail_seconds
+
+
+pytestmark = pytest.mark.unit
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def rpush(self, key, value):
+        self.ops.append(("rpush", key, value))
+
+    def ltrim(self, key, start, end):
+        self.ops.append(("ltrim", key, start, end))
+
+    def lset(self, key, index, value):
+        self.ops.append(("lset", key, index, value))
+
+    def expire(self, key, seconds):
+        self.ops.append(("expire", key, seconds))
+
+    async def execute(self):
+        for op in self.ops:
+            if op[0] == "rpush":
+                self.redis.lists.setdefault(op[1], []).append(op[2])
+            elif op[0] == "ltrim":
+                self.redis.lists[op[1]] = self.redis.lists[op[1]][op[2]:]
+            elif op[0] == "lset":
+                self.redis.lists[op[1]][op[2]] = op[3]
+            else:
+                self.redis.ttls[op[1]] = op[2]
+        self.ops = []
+
+
+class FakeRedis:
+    def __init__(self):
+        self.lists = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(trail_service.redis_manager, "get_redis", AsyncMock(return_value=fake))
+    return fake
+
+
+def test_ring_buffer_wraps_and_returns_oldest_first():
+    buffer = TrailBuffer(capacity=4)
+    for t in range(6):
+        assert buffer.append(t, 41.0 + t * 0.001, 29.0, None if t == 3 else 30.0)
+
+    rows = buffer.snapshot()
+
+    assert len(buffer) == 4
+    assert rows["t"].tolist() == [2, 3, 4, 5]
+    assert np.isnan(rows["speed"][1])
+    assert buffer.snapshot(since=4)["t"].tolist() == [4, 5]
+    # Late points never move the live trail backwards
+    assert buffer.append(1, 41.0, 29.0, 10.0) is None
+    assert buffer.last_t == 5
+
+
+def test_memory_footprint_for_1000_buses():
+    store = TrailStore()
+    capacity = store.capacity
+    now = to_trail_seconds(datetime.now(timezone.utc))
+    for bus in range(1000):
+        buffer = store._buffer(f"bus-{bus}")
+        for i in range(capacity):
+            buffer.append(now + i, 41.0, 29.0, 30.0)
+
+    assert TRAIL_DTYPE.itemsize == 16
+    assert capacity == 450  # 900 s window / 2 s near-stop interval
+    assert store.nbytes == 1000 * capacity * 16  # 7.2 MB of array data
+    overhead = sum(sys.getsizeof(buffer) + sys.getsizeof(buffer.rows) - buffer.nbytes for buffer in store.buffers.values())
+    assert store.nbytes + overhead < 7.25 * 2**20
+
+
+@pytest.mark.asyncio
+async def test_record_mirrors_to_redis_and_other_workers_read_it(redis, monkeypatch):
+    monkeypatch.setattr(trail_service.settings, "TRAIL_WINDOW_SECONDS", 15)
+    writer = TrailStore(capacity=3)
+    start = datetime.now(timezone.utc) - timedelta(seconds=20)
+    for i in range(5):
+        await writer.record("bus-1", start + timedelta(seconds=5 * i), 41.0 + i * 0.0001, 29.0, 20.0 + i)
+
+    assert len(redis.lists["bus:bus-1:trail"]) == 3
+    assert redis.ttls["bus:bus-1:trail"] == 15
+
+    reader = TrailStore(capacity=3)  # a worker that never saw the bus
+    rows = await reader.get("bus-1")
+    points = trail_service.trail_points(rows)
+
+    assert rows.tolist() == writer.buffers["bus-1"].snapshot().tolist()
+    assert [point["speed"] for point in points] == [22.0, 23.0, 24.0]
+    assert points[-1]["lat"] == pytest.approx(41.0004, abs=1e-5)
+
+
+@pytest.mark.asyncio
+async def test_get_drops_points_outside_window_and_prunes_idle_buses(redis, monkeypatch):
+    monkeypatch.setattr(trail_service.settings, "TRAIL_WINDOW_SECONDS", 600)
+    store = TrailStore(capacity=16)
+    now = datetime.now(timezone.utc)
+    await store.record("bus-1", now - timedelta(seconds=900), 41.0, 29.0)
+    await store.record("bus-1", now - timedelta(seconds=30), 41.001, 29.0)
+    await store.record("bus-2", now - timedelta(seconds=700), 41.0, 29.0)
+
+    assert len(await store.get("bus-1")) == 1
+    assert len(await store.get("bus-1", window_seconds=1000)) == 2
+    assert len(await store.get("bus-2")) == 0
+    assert store.prune() == 1
+    assert set(store.buffers) == {"bus-1"}
+
+
+@pytest.mark.asyncio
+async def test_fast_fixes_are_downsampled_so_the_whole_window_is_kept(redis, monkeypatch):
+    monkeypatch.setattr(trail_service.settings, "TRAIL_WINDOW_SECONDS", 900)
+    store = TrailStore()
+    now = datetime.now(timezone.utc)
+    for second in range(900, -1, -1):  # 1 Hz for 15 minutes
+        await store.record("bus-1", now - timedelta(seconds=second), 41.0 + second * 1e-5, 29.0, 30.0)
+
+    rows = await store.get("bus-1")
+    span = int(rows["t"][-1] - rows["t"][0])
+
+    assert span >= 890
+    assert np.diff(rows["t"][:-1]).min() >= store.min_spacing
+    assert rows["t"][-1] == to_trail_seconds(now)  # the head is the latest fix
+    # The Redis mirror follows the replacements
+    assert trail_service.unpack_rows(redis.lists["bus:bus-1:trail"]).tolist() == rows.tolist()